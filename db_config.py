@@ -1 +1,47 @@
-database_path = 'quiz.db'
\ No newline at end of file
+database_path = 'quiz.db'
+
+# SQLite settings applied to every connection.
+# WAL lets quiz sessions keep reading while another session writes its results,
+# and busy_timeout (milliseconds) makes a writer wait for the lock instead of failing straight away
+journal_mode = 'wal'
+synchronous = 'normal'
+cache_size = -64000 # negative means KiB, so 64 MB of page cache per connection
+mmap_size = 268435456 # 256 MB
+busy_timeout = 5000
+
+# 'thread' gives every thread its own connection,
+# 'pool' shares up to max_connections between threads, closing ones idle for stale_timeout seconds
+connection_mode = 'thread'
+max_connections = 8
+stale_timeout = 300
+
+# quiz results are saved in one transaction per batch instead of one per answer.
+# a batch is written once it holds this many results, once this many seconds
+# have passed since the last write, and always at the end of the session.
+# a timer writes a waiting batch even if no more answers arrive, so a crash loses
+# at most the answers from the last result_flush_seconds, and never more than result_batch_size - 1
+result_batch_size = 10
+result_flush_seconds = 10
+
+# load every question into memory once and build quizzes from there, with no database round trips.
+# the bank reloads after question changes in this program straight away, and checks
+# for changes made by other programs at most every question_bank_check_seconds seconds
+question_bank = False
+question_bank_check_seconds = 5
+
+# without the bank, questions looked up by id and each category's question ids are kept in LRU caches,
+# holding at most this many questions and categories. changes in this program clear them straight away,
+# and entries expire after question_cache_seconds so changes made by other programs are seen too
+question_cache_size = 10000
+category_cache_size = 1000
+question_cache_seconds = 60
+# the category catalog is checked against question_version at most every question_version_check_seconds seconds,
+# and every question cache is cleared when another program has changed the questions
+question_version_check_seconds = 5
+
+# old quiz sessions are moved out of the result table into an archive database, attached to every connection.
+# None keeps the archive next to the database, as quiz_archive.db for quiz.db.
+# sessions that ended more than archive_retention_days ago are moved, archive_batch_size results at most per transaction
+archive_database_path = None
+archive_retention_days = 365
+archive_batch_size = 1000
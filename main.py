@@ -1,7 +1,14 @@
+import importlib
+import threading
 import ui
+import quizcategoryindex
 import quizrunner
-import quizdatabase
-import uuid
+import quizschema
+import db_config
+
+# quizdatabase, quizbank and quizengine pull in peewee, which takes longer to import than the rest of the program put together, and uuid pulls in platform.
+# the menu doesn't need them, so they are imported where they are used, and loaded on a background thread while the user reads the menu
+DEFERRED_MODULES = ['quizdatabase', 'quizbank', 'quizengine', 'uuid']
 
 
 def main():
@@ -11,7 +18,13 @@ def main():
     3. Quit
     """
 
-    quizdatabase.create_table()
+    if quizschema.is_schema_current(db_config.database_path):
+        # the usual start: one pragma read showed the tables are already there, so the menu can be shown straight away
+        preload_deferred_modules()
+    else:
+        # a new or older database has to be created or migrated before anything else
+        import quizdatabase
+        quizdatabase.create_table()
 
     ui.instructions()
 
@@ -23,17 +36,32 @@ def main():
 
 
         if choice == '1':
-            # get the list of categories to display
-            category_list = quizdatabase.get_category_list()
-            category_string = ui.format_list(category_list)
-
-            # get category selection, questions in that category, and number of questions desired from user input
-            category_selection = ui.select_category(category_list, category_string)
-            category_questions = quizdatabase.get_questions_by_category(category_selection)
-            number_of_questions = ui.select_number_of_questions(category_selection, category_questions)
-
-            # configure the quiz based on user's selected category & number of questions
-            quiz_questions = prepare_quiz_questions(category_questions, number_of_questions)
+            import quizbank
+            import quizdatabase
+            import uuid
+
+            # questions come from the in-memory question bank if db_config.question_bank is on, otherwise from the database
+            question_source = quizbank.get_question_source()
+
+            # index the categories once, so the picker can page through and search thousands of them
+            category_index = quizcategoryindex.CategoryIndex(question_source.get_category_list())
+
+            # get category selection, how many questions are in that category, and number of questions desired from user input
+            category_selection = ui.pick_category(category_index)
+            category_question_count = question_source.count_questions_by_category(category_selection)
+
+            # a random quiz, a quiz built from a difficulty profile, or an adaptive quiz that follows how the user is doing
+            quiz_mode = ui.select_quiz_mode()
+            difficulty_profile = None
+            if quiz_mode == 'profile':
+                difficulty_counts = question_source.count_questions_by_difficulty(category_selection)
+                difficulty_profile = ui.select_difficulty_profile(category_selection, difficulty_counts)
+                number_of_questions = sum(profile_count for profile_count, difficulties in difficulty_profile)
+            else:
+                number_of_questions = ui.select_number_of_questions(category_selection, category_question_count)
+
+            # configure the quiz based on user's selected category, number of questions and quiz mode
+            quiz_questions = prepare_quiz_questions(category_selection, number_of_questions, difficulty_profile, adaptive=(quiz_mode == 'adaptive'))
             session_id = uuid.uuid1() # generate random session ID
 
             run_quiz(quiz_questions, session_id)
@@ -60,69 +88,88 @@ def main():
             print('Not a valid selection, please try again')
 
 
+def preload_deferred_modules():
+    """Start importing DEFERRED_MODULES on a background thread, so they are usually ready by the time the user picks from the menu.
+    Python's import lock makes any import of them on the main thread wait for the background import to finish."""
+    def import_deferred_modules():
+        for module_name in DEFERRED_MODULES:
+            importlib.import_module(module_name)
+
+    threading.Thread(target=import_deferred_modules, daemon=True).start()
+
+
 def run_quiz(questions, session_id):
     """Takes a list of questions based on the user's settings.
-    Displays each question for the user and records the result in the database."""
+    Displays each question for the user and records the result in the database.
+    The QuizSession engine does the grading, timing and saving, this function only handles input and output."""
+    import quizengine
 
-    for question in questions:
-        start_time = quizrunner.get_timestamp() # the time that the question is printed
+    with quizengine.QuizSession(questions, session_id) as quiz_session:
+        while True:
+            # the engine shuffles the answers for each question, and returns None once the quiz is over
+            next_question = quiz_session.next_question()
+            if next_question is None:
+                break
 
-        answer_list = quizrunner.create_answer_list(question)
+            question, answer_list_shuffled = next_question
+            question_string = ui.format_quiz_question(question)
+            if isinstance(questions, quizengine.AdaptiveQuestions):
+                # show adaptive quiz takers how hard the quiz has become
+                question_string = ui.format_difficulty(question.difficulty) + question_string
+            answer_list_string = ui.format_list(answer_list_shuffled)
 
-        # in an unshuffled answer list, position 0 always contains the correct answer
-        # due to the design of the questions table in the quiz database
-        correct_answer = answer_list[0] # take correct answer out of unshuffled answer list for grading
+            # take user's input - a number - and use it to get the answer they selected 
+            # by changing it to a valid index for the shuffled answer list
+            # the answer timer starts from here, once the question has been formatted
+            quiz_session.question_shown()
+            user_answer_index = ui.answer_quiz_question(question_string, answer_list_string, answer_list_shuffled)
 
-        # shuffle quiz answers, then display them for user input
-        answer_list_shuffled = quizrunner.shuffle_list(answer_list)
-        question_string = ui.format_quiz_question(question)
-        answer_list_string = ui.format_list(answer_list_shuffled)
+            # grade the user's answer and queue its result. if the user answered correctly, the question points are added
+            graded_answer = quiz_session.answer(user_answer_index)
+            print(quizrunner.format_grade_message(graded_answer.correct_answer, graded_answer.user_answer, graded_answer.is_correct))
 
-        # take user's input - a number - and use it to get the answer they selected 
-        # by changing it to a valid index for the shuffled answer list
-        user_answer_index = ui.answer_quiz_question(question_string, answer_list_string, answer_list_shuffled)
-        user_answer = answer_list_shuffled[user_answer_index]
 
-        # grade the user's answer. if the user answered correctly, the question points are added. otherwise, 0 is added
-        is_correct = quizrunner.grade_question(correct_answer, user_answer)
+def prepare_quiz_questions(category, number_of_questions, difficulty_profile=None, adaptive=False):
+    """Picks the user's requested number of questions from a category.
+    With a difficulty profile, a list of (number of questions, difficulties), each part of the profile is picked at random from its difficulties.
+    With adaptive=True, returns an AdaptiveQuestions that run_quiz() asks one at a time, getting harder or easier after each answer.
+    Otherwise the questions are picked at random from the whole category."""
+    import quizbank
+    import quizengine
 
-        end_time = quizrunner.get_timestamp() # the time after the user has answered, just before the next question is printed
+    question_source = quizbank.get_question_source()
 
-        # save to the results database
-        quizdatabase.create_question_result(start_time, end_time, user_answer, question.points, is_correct, session_id, question.id)
+    if adaptive:
+        return quizengine.AdaptiveQuestions(category, number_of_questions, question_source=question_source)
 
+    if difficulty_profile:
+        # each part of the profile is sampled from the category's cached per difficulty id pools
+        return question_source.get_random_questions_by_difficulty_profile(category, difficulty_profile)
 
-def prepare_quiz_questions(questions, number_of_questions):
-    """Shuffles a list of questions, then trims the list down to the user's requested number of questions."""
-    # prepare the list of questions by randomizing the list
-    # then trimming the list down to the user's requested number of questions
-    questions_randomized = quizrunner.shuffle_list(questions)
-    questions_trimmed = quizrunner.trim_list(questions_randomized, number_of_questions)
+    # question ids are sampled, so only the questions that will be asked are loaded
+    # and they already come back in random order
+    questions = question_source.get_random_questions_by_category(category, number_of_questions)
 
-    return questions_trimmed
+    return questions
 
 
 def get_results():
-    # get the most recent session results
-    last_session_id = quizdatabase.get_last_session_id()
-    last_session_results = quizdatabase.get_results_by_session(last_session_id)
+    import quizdatabase
 
-    # get the category using one of the questions from the last session results
-    question = quizdatabase.get_question_by_id(last_session_results[0].questionid)
-    last_session_category = question.category
+    # get the most recent session, and its running totals from the session summary table
+    last_session_id = quizdatabase.get_last_session_id()
+    summary = quizdatabase.get_session_summary(last_session_id)
 
     # get the user's score and the total points available
-    score = quizrunner.calculate_total_score(last_session_results)
-    points_available = quizrunner.calculate_total_available_points(last_session_results)
+    score = summary.score
+    points_available = summary.availablepoints
     percentage = quizrunner.calculate_score_percentage(score, points_available)
 
     # get the user's quiz time
-    total_quiz_time_seconds = quizrunner.calculate_total_quiz_time(last_session_results)
-    total_quiz_time_minutes = quizrunner.convert_to_minutes(total_quiz_time_seconds)
+    total_quiz_time_minutes = quizrunner.convert_milliseconds_to_minutes(summary.totaltime)
 
     # return a formatted string with this information
-    return ui.display_results(last_session_category, score, points_available, percentage, total_quiz_time_minutes)
-
+    return ui.display_results(summary.category, score, points_available, percentage, total_quiz_time_minutes)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,259 @@
+import argparse
+import datetime
+import os
+import sys
+
+import db_config
+import quizarchive
+import quizdatabase
+import quizduplicates
+import quizexporter
+import quizgrader
+import quizimporter
+
+
+def rebuild_summaries(args):
+    """Refill the session_summary table from the results saved so far."""
+    session_count = quizdatabase.rebuild_session_summaries()
+    print(f'Rebuilt summaries for {session_count} quiz sessions.')
+
+
+def import_questions(args):
+    """Stream a question bank file into the question table, printing progress as each chunk is saved."""
+    def print_progress(report):
+        print(f'{report.imported_count} questions imported so far ({report.rows_per_second():.0f} rows per second)')
+
+    report = quizimporter.import_questions(args.path, file_format=args.format, chunk_size=args.chunk_size,
+                                           rejected_path=args.rejected, rebuild_indexes=args.rebuild_indexes,
+                                           progress=print_progress, allow_duplicates=args.allow_duplicates)
+    print(report)
+    if report.rejected_count and args.rejected:
+        print(f'Rejected rows were written to {args.rejected}.')
+
+
+def export_results(args):
+    """Write results out for analytics, optionally only those added since the last export with the same name."""
+    start = datetime.date.fromisoformat(args.start) if args.start else None
+    end = datetime.date.fromisoformat(args.end) if args.end else None
+
+    exported_count = quizexporter.export_results_to_path(args.path, file_format=args.format, page_size=args.page_size,
+                                                        with_question=args.with_question, start=start, end=end,
+                                                        checkpoint_name=args.since_last, include_archive=args.include_archive)
+    print(f'Exported {exported_count} results.', file=sys.stderr)
+
+
+def question_report(args):
+    """Print the most missed, slowest and never asked questions for each category."""
+    categories = [args.category] if args.category else quizdatabase.get_category_list()
+
+    for category in categories:
+        print(f'\n{category}')
+
+        print('  Most missed:')
+        for question_stats in quizdatabase.get_most_missed_questions(category, args.limit):
+            print(f'    {question_stats.miss_rate() * 100:5.1f}% missed of {question_stats.attempts} - {question_stats.questionid.question}')
+
+        print('  Slowest:')
+        for question_stats in quizdatabase.get_slowest_questions(category, args.limit):
+            print(f'    {question_stats.mean_time():7.0f} ms mean, {question_stats.time_standard_deviation():.0f} ms std dev - {question_stats.questionid.question}')
+
+        print('  Never asked:')
+        for question in quizdatabase.get_never_asked_questions(category, args.limit):
+            print(f'    {question.id}. {question.question}')
+
+
+def rebuild_question_stats(args):
+    """Refill the question_stats table from the results saved so far."""
+    question_count = quizdatabase.rebuild_question_stats()
+    print(f'Rebuilt stats for {question_count} questions.')
+
+
+def leaderboard(args):
+    """Print the best quiz sessions, for one category or overall."""
+    entries = quizdatabase.get_leaderboard(args.category, args.limit)
+    title = f'Leaderboard for {args.category}' if args.category else 'Leaderboard for every category'
+    print(title)
+    for rank, entry in enumerate(entries, start=1):
+        print(f'{rank}. {entry}')
+
+
+def rebuild_leaderboard(args):
+    """Rank every summarized session again."""
+    entry_count = quizdatabase.rebuild_leaderboard()
+    print(f'Rebuilt the leaderboard with {entry_count} quiz sessions.')
+
+
+def search_questions(args):
+    """Print the questions whose wording or answers best match the search text."""
+    questions = quizdatabase.search_questions(args.text, args.category, args.limit)
+    if not questions:
+        print('No questions matched.')
+    for question in questions:
+        print(f'{question.id}. [{question.category}] {question.question} - {question.answercorrect}')
+
+
+def rebuild_search_index(args):
+    """Rebuild the question search index from the question table."""
+    quizdatabase.rebuild_question_search()
+    print('Rebuilt the question search index.')
+
+
+def analytics_report(args):
+    """Print accuracy and response time per category per day, accuracy by difficulty, and the spread of session scores."""
+    # numpy is only needed here, so the other commands work without it
+    import quizanalytics
+
+    start = datetime.date.fromisoformat(args.start) if args.start else None
+    end = datetime.date.fromisoformat(args.end) if args.end else None
+    questions = quizanalytics.load_question_columns()
+    results = quizanalytics.load_result_columns(start, end, include_archive=args.include_archive)
+
+    print('Accuracy by category and day:')
+    for stats in quizanalytics.get_category_day_stats(results, questions):
+        if args.category is None or stats.category == args.category:
+            print(f'  {stats.day} {stats.category}: {stats.answered} answered, {stats.accuracy * 100:.1f}% correct, '
+                  f'{stats.score_percentage:.1f}% of points, {stats.mean_response_time:.0f} ms mean')
+
+    print('Accuracy by difficulty:')
+    for difficulty_accuracy in quizanalytics.get_difficulty_accuracy(results, questions):
+        if args.category is None or difficulty_accuracy.category == args.category:
+            accuracy = f'{difficulty_accuracy.accuracy * 100:.1f}% correct' if difficulty_accuracy.accuracy is not None else 'never answered'
+            print(f'  {difficulty_accuracy.category} difficulty {difficulty_accuracy.difficulty}: {difficulty_accuracy.answered} answered, {accuracy}')
+
+    print('Session scores:')
+    for score_bin in quizanalytics.get_score_distribution(args.bins, args.category, start, end):
+        print(f'  {score_bin.low:5.1f}% to {score_bin.high:5.1f}%: {score_bin.sessions} sessions')
+
+
+def archive_results(args):
+    """Move the results of old sessions into the archive database, printing progress after each batch."""
+    def print_progress(report):
+        print(f'{report.session_count} sessions ({report.result_count} results) archived so far')
+
+    report = quizarchive.archive_old_sessions(args.days, args.batch_size, args.pause, progress=print_progress)
+    print(f'Archived {report.session_count} sessions ({report.result_count} results) to {quizdatabase.get_archive_path()}.')
+
+
+def grade_sheets(args):
+    """Grade answer sheet files and save their results, printing progress as each chunk is saved."""
+    def print_progress(report):
+        print(f'{report.graded_count} answers graded so far ({report.rows_per_second():.0f} rows per second)')
+
+    report = quizgrader.grade_answer_sheets(args.paths, file_format=args.format, chunk_size=args.chunk_size,
+                                            rejected_path=args.rejected, progress=print_progress)
+    print(report)
+    if report.rejected_count and args.rejected:
+        print(f'Rejected rows were written to {args.rejected}.')
+
+
+def compact_database(args):
+    """Rewrite the database file without its free pages, printing how much smaller it got."""
+    database_path = quizdatabase.db.database
+    size_before = os.path.getsize(database_path)
+    quizdatabase.vacuum_database()
+    size_after = os.path.getsize(database_path)
+    print(f'Compacted {database_path} from {size_before / 1e6:.1f} MB to {size_after / 1e6:.1f} MB.')
+
+
+def find_duplicates(args):
+    """Fingerprint any questions that haven't been yet, then print each pair of duplicate or nearly duplicate questions."""
+    matches = quizduplicates.find_duplicates(args.processes, args.threshold)
+    if not matches:
+        print('No duplicate questions found.')
+    for match in matches[:args.limit]:
+        print(f'Question {match.duplicate_id} duplicates question {match.question_id} ({match.similarity * 100:.0f}% similar)')
+    if len(matches) > args.limit:
+        print(f'... and {len(matches) - args.limit} more.')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintenance commands for the quiz database.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    rebuild_summaries_parser = subparsers.add_parser('rebuild-summaries', help='rebuild the session_summary table from the result table')
+    rebuild_summaries_parser.set_defaults(run=rebuild_summaries)
+
+    import_questions_parser = subparsers.add_parser('import-questions', help='bulk load questions from a CSV or JSON lines file')
+    import_questions_parser.add_argument('path', help='CSV file with a header row, or JSON lines file, with one question per row')
+    import_questions_parser.add_argument('--format', choices=quizimporter.FILE_FORMATS, help='file format, guessed from the extension if not given')
+    import_questions_parser.add_argument('--chunk-size', type=int, default=5000, help='questions saved per transaction')
+    import_questions_parser.add_argument('--rejected', help='file to write rejected rows to, as JSON lines')
+    import_questions_parser.add_argument('--rebuild-indexes', action='store_true', help='drop the question indexes during the load and rebuild them at the end')
+    import_questions_parser.add_argument('--allow-duplicates', action='store_true', help='import rows that duplicate a saved question or an earlier row')
+    import_questions_parser.set_defaults(run=import_questions)
+
+    export_results_parser = subparsers.add_parser('export-results', help='stream results to CSV, JSON lines or column chunks')
+    export_results_parser.add_argument('path', help="file to write, or '-' for standard output")
+    export_results_parser.add_argument('--format', choices=quizexporter.FILE_FORMATS, default='csv', help='output format')
+    export_results_parser.add_argument('--page-size', type=int, default=10000, help='results read per query')
+    export_results_parser.add_argument('--with-question', action='store_true', help='add question category and difficulty columns')
+    export_results_parser.add_argument('--start', help='only results that ended on or after this date, YYYY-MM-DD')
+    export_results_parser.add_argument('--end', help='only results that ended before this date, YYYY-MM-DD')
+    export_results_parser.add_argument('--since-last', metavar='NAME', help='only results added since the last export with this name')
+    export_results_parser.add_argument('--include-archive', action='store_true', help='also export results moved to the archive database')
+    export_results_parser.set_defaults(run=export_results)
+
+    question_report_parser = subparsers.add_parser('question-report', help='most missed, slowest and never asked questions per category')
+    question_report_parser.add_argument('--category', help='only report on this category')
+    question_report_parser.add_argument('--limit', type=int, default=10, help='questions listed in each section')
+    question_report_parser.set_defaults(run=question_report)
+
+    rebuild_question_stats_parser = subparsers.add_parser('rebuild-question-stats', help='rebuild the question_stats table from the result table')
+    rebuild_question_stats_parser.set_defaults(run=rebuild_question_stats)
+
+    leaderboard_parser = subparsers.add_parser('leaderboard', help='show the best quiz sessions')
+    leaderboard_parser.add_argument('--category', help='only sessions in this category')
+    leaderboard_parser.add_argument('--limit', type=int, default=100, help='sessions to show')
+    leaderboard_parser.set_defaults(run=leaderboard)
+
+    rebuild_leaderboard_parser = subparsers.add_parser('rebuild-leaderboard', help='rebuild the leaderboard from the session_summary table')
+    rebuild_leaderboard_parser.set_defaults(run=rebuild_leaderboard)
+
+    search_questions_parser = subparsers.add_parser('search-questions', help='full text search over question and answer text')
+    search_questions_parser.add_argument('text', help='words to search for, the last one can be the start of a word')
+    search_questions_parser.add_argument('--category', help='only search this category')
+    search_questions_parser.add_argument('--limit', type=int, default=20, help='most questions to show')
+    search_questions_parser.set_defaults(run=search_questions)
+
+    rebuild_search_index_parser = subparsers.add_parser('rebuild-search-index', help='rebuild the question search index from the question table')
+    rebuild_search_index_parser.set_defaults(run=rebuild_search_index)
+
+    analytics_report_parser = subparsers.add_parser('analytics-report', help='accuracy, response times and score spread over the full result history')
+    analytics_report_parser.add_argument('--category', help='only report on this category')
+    analytics_report_parser.add_argument('--start', help='only results that ended on or after this date, YYYY-MM-DD')
+    analytics_report_parser.add_argument('--end', help='only results that ended before this date, YYYY-MM-DD')
+    analytics_report_parser.add_argument('--bins', type=int, default=10, help='score ranges in the session score spread')
+    analytics_report_parser.add_argument('--include-archive', action='store_true', help='also read results moved to the archive database')
+    analytics_report_parser.set_defaults(run=analytics_report)
+
+    archive_results_parser = subparsers.add_parser('archive-results', help='move the results of old sessions into the archive database')
+    archive_results_parser.add_argument('--days', type=int, help=f'archive sessions that ended more than this many days ago, {db_config.archive_retention_days} if not given')
+    archive_results_parser.add_argument('--batch-size', type=int, help=f'results read per batch, each batch moved in one transaction, {db_config.archive_batch_size} if not given')
+    archive_results_parser.add_argument('--pause', type=float, default=0.0, help='seconds to wait between batches')
+    archive_results_parser.set_defaults(run=archive_results)
+
+    grade_sheets_parser = subparsers.add_parser('grade-sheets', help='grade answer sheets from paper and offline quizzes and save their results')
+    grade_sheets_parser.add_argument('paths', nargs='+', help='CSV files with a header row, or JSON lines files, with one answer per row')
+    grade_sheets_parser.add_argument('--format', choices=quizimporter.FILE_FORMATS, help='file format, guessed from each extension if not given')
+    grade_sheets_parser.add_argument('--chunk-size', type=int, default=10000, help='answers graded and saved per transaction')
+    grade_sheets_parser.add_argument('--rejected', help='file to write rejected rows to, as JSON lines')
+    grade_sheets_parser.set_defaults(run=grade_sheets)
+
+    compact_database_parser = subparsers.add_parser('compact-database', help='give space freed by migrations, archiving and deletes back to the file system')
+    compact_database_parser.set_defaults(run=compact_database)
+
+    find_duplicates_parser = subparsers.add_parser('find-duplicates', help='list duplicate and nearly duplicate questions')
+    find_duplicates_parser.add_argument('--processes', type=int, help='processes used to fingerprint questions, one per CPU if not given')
+    find_duplicates_parser.add_argument('--threshold', type=float, default=quizduplicates.NEAR_DUPLICATE_THRESHOLD,
+                                        help='share of words two questions must have in common, from 0 to 1')
+    find_duplicates_parser.add_argument('--limit', type=int, default=100, help='pairs to show')
+    find_duplicates_parser.set_defaults(run=find_duplicates)
+
+    args = parser.parse_args()
+
+    quizdatabase.create_table()
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
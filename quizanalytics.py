@@ -0,0 +1,202 @@
+import collections
+import datetime
+
+import numpy as np
+
+import quizdatabase
+import quizexporter
+import quizrunner
+from quizdatabase import Question
+from quizdatabase import Result
+from quizdatabase import SessionSummary
+
+
+SECONDS_PER_DAY = 86400
+
+# the result columns read for analytics, in the order they are stacked into one array per chunk
+RESULT_FIELDS = [Result.questionid, Result.timestampend, Result.iscorrect, Result.points, Result.responsetime]
+
+# every question's category and difficulty, as arrays indexed by question id. category_codes index into categories,
+# and are -1 for an id with no question, so results can be joined to their question with one array lookup
+QuestionColumns = collections.namedtuple('QuestionColumns', ['categories', 'category_codes', 'difficulties'])
+
+# one NumPy array per result column, all the same length
+ResultColumns = collections.namedtuple('ResultColumns', ['question_ids', 'timestamps', 'is_correct', 'points', 'response_times'])
+
+# accuracy and mean response time (milliseconds) for one category on one day
+CategoryDayStats = collections.namedtuple('CategoryDayStats', ['category', 'day', 'answered', 'accuracy', 'score_percentage', 'mean_response_time'])
+
+# the share of answers that were correct at one difficulty in a category
+DifficultyAccuracy = collections.namedtuple('DifficultyAccuracy', ['category', 'difficulty', 'answered', 'accuracy'])
+
+# the number of sessions that scored from low up to high percent, including high only in the top bin
+ScoreBin = collections.namedtuple('ScoreBin', ['low', 'high', 'sessions'])
+
+
+def load_question_columns():
+    """Returns the QuestionColumns for every question, read in one query."""
+    query = Question.select(Question.id, Question.category, Question.difficulty)
+    cursor = quizdatabase.db.execute(query)
+
+    question_ids = []
+    category_names = []
+    difficulties = []
+    for question_id, category, difficulty in cursor:
+        question_ids.append(question_id)
+        category_names.append(category)
+        difficulties.append(difficulty)
+
+    categories, codes = np.unique(np.array(category_names, dtype=object), return_inverse=True) if category_names else ([], [])
+    size = max(question_ids, default=0) + 1
+    category_codes = np.full(size, -1, dtype=np.int64)
+    category_codes[question_ids] = codes
+    difficulty_by_id = np.zeros(size, dtype=np.int64)
+    difficulty_by_id[question_ids] = difficulties
+
+    return QuestionColumns(list(categories), category_codes, difficulty_by_id)
+
+
+def load_result_columns(start=None, end=None, fetch_size=100000, include_archive=False):
+    """Returns the ResultColumns for every result, or those with timestampend in [start, end).
+    start and end can be dates, datetimes or timestamps, like quizexporter.export_results().
+    With include_archive, results moved to the archive database are read too.
+    The columns are allocated once from a COUNT(*) over the same range, then rows are read fetch_size at a time
+    straight off the cursor and copied into them, so peak memory is the final arrays plus one chunk.
+    The count and the reads share one read transaction, so results saved meanwhile can't make them disagree."""
+    start = quizexporter.to_timestamp(start)
+    end = quizexporter.to_timestamp(end)
+
+    queries = []
+    # the archive has to be attached before the transaction starts
+    for result_model in quizdatabase.get_result_models(include_archive):
+        query = result_model.select(*[getattr(result_model, field.name) for field in RESULT_FIELDS])
+        if start is not None:
+            query = query.where(result_model.timestampend >= start)
+        if end is not None:
+            query = query.where(result_model.timestampend < end)
+        queries.append(query)
+
+    with quizdatabase.db.atomic():
+        size = sum(query.count() for query in queries)
+        results = ResultColumns(
+            question_ids=np.empty(size, dtype=np.int64),
+            timestamps=np.empty(size, dtype=np.float64),
+            is_correct=np.empty(size, dtype=np.int64),
+            points=np.empty(size, dtype=np.int64),
+            response_times=np.empty(size, dtype=np.int64),
+        )
+
+        position = 0
+        for query in queries:
+            cursor = quizdatabase.db.execute(query)
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                # float64 holds both the whole number columns and the timestamps, which can have fractions of a second
+                chunk = np.array(rows, dtype=np.float64)
+                for column, values in zip(results, chunk.T):
+                    column[position:position + len(rows)] = values
+                position += len(rows)
+
+    return results
+
+
+def join_questions(results, questions):
+    """Returns (category codes, difficulties) for each result, looked up from its question id.
+    Results for questions that no longer exist get category code -1."""
+    question_ids = results.question_ids
+    in_range = question_ids < len(questions.category_codes)
+    safe_ids = np.where(in_range, question_ids, 0)
+    category_codes = np.where(in_range, questions.category_codes[safe_ids], -1)
+    return category_codes, questions.difficulties[safe_ids]
+
+
+def total_by_group(group_keys, group_count, results):
+    """Returns (answered, correct, earned points, available points, total response time) arrays with one entry per group,
+    summing every result into the group at its key."""
+    earned_points = quizrunner.calculate_earned_points(results.is_correct, results.points)
+    answered = np.bincount(group_keys, minlength=group_count)
+    correct = np.bincount(group_keys, weights=results.is_correct, minlength=group_count)
+    earned = np.bincount(group_keys, weights=earned_points, minlength=group_count)
+    available = np.bincount(group_keys, weights=results.points, minlength=group_count)
+    response_time = np.bincount(group_keys, weights=results.response_times, minlength=group_count)
+    return answered, correct, earned, available, response_time
+
+
+def select_results(results, mask):
+    return ResultColumns(*[column[mask] for column in results])
+
+
+def get_category_day_stats(results, questions):
+    """Returns a CategoryDayStats for every category and day with answers, ordered by category then day.
+    Days are UTC dates of timestampend. The score percentage is worked out with the same rules as a quiz session's."""
+    category_codes, _ = join_questions(results, questions)
+    known = category_codes >= 0
+    results = select_results(results, known)
+    category_codes = category_codes[known]
+
+    day_numbers = np.floor(results.timestamps / SECONDS_PER_DAY).astype(np.int64)
+    days, day_codes = np.unique(day_numbers, return_inverse=True)
+    group_keys = category_codes * len(days) + day_codes
+    answered, correct, earned, available, response_time = total_by_group(group_keys, len(questions.categories) * len(days), results)
+
+    # work out every group's numbers as arrays, then turn them into plain Python values once
+    group_keys = np.flatnonzero(answered)
+    category_codes, day_codes = np.divmod(group_keys, len(days))
+    answered = answered[group_keys]
+    accuracies = correct[group_keys] / answered
+    score_percentages = quizrunner.calculate_score_percentage(earned[group_keys], available[group_keys])
+    mean_response_times = response_time[group_keys] / answered
+
+    epoch = datetime.date(1970, 1, 1)
+    day_dates = [epoch + datetime.timedelta(days=day_number) for day_number in days.tolist()]
+    return [CategoryDayStats(questions.categories[category_code], day_dates[day_code], *values)
+            for category_code, day_code, *values in zip(category_codes.tolist(), day_codes.tolist(), answered.tolist(),
+                                                        accuracies.tolist(), score_percentages.tolist(), mean_response_times.tolist())]
+
+
+def get_difficulty_accuracy(results, questions):
+    """Returns a DifficultyAccuracy for every difficulty from 1 to 5 in every category with answers, in order,
+    so each category's rows are its accuracy curve. Difficulties with no answers have accuracy None."""
+    category_codes, difficulties = join_questions(results, questions)
+    known = category_codes >= 0
+    results = select_results(results, known)
+
+    difficulty_count = quizrunner.MAX_DIFFICULTY - quizrunner.MIN_DIFFICULTY + 1
+    group_keys = category_codes[known] * difficulty_count + (difficulties[known] - quizrunner.MIN_DIFFICULTY)
+    answered, correct, _, _, _ = total_by_group(group_keys, len(questions.categories) * difficulty_count, results)
+
+    curves = []
+    for category_code, category in enumerate(questions.categories):
+        category_answered = answered[category_code * difficulty_count:(category_code + 1) * difficulty_count]
+        if not category_answered.any():
+            continue
+        for offset in range(difficulty_count):
+            group_key = category_code * difficulty_count + offset
+            accuracy = correct[group_key] / answered[group_key] if answered[group_key] else None
+            curves.append(DifficultyAccuracy(category, quizrunner.MIN_DIFFICULTY + offset, int(answered[group_key]), accuracy))
+    return curves
+
+
+def get_score_distribution(bin_count=10, category=None, start=None, end=None):
+    """Returns bin_count ScoreBins covering 0 to 100 percent, counting the sessions whose score percentage falls in each.
+    Only sessions whose last answer ended in [start, end) are counted when start or end is given, like load_result_columns().
+    Sessions come from the session_summary table, so the result table isn't scanned."""
+    start = quizexporter.to_timestamp(start)
+    end = quizexporter.to_timestamp(end)
+
+    query = SessionSummary.select(SessionSummary.score, SessionSummary.availablepoints).where(SessionSummary.availablepoints > 0)
+    if category is not None:
+        query = query.where(SessionSummary.category == category)
+    if start is not None:
+        query = query.where(SessionSummary.timestampend >= start)
+    if end is not None:
+        query = query.where(SessionSummary.timestampend < end)
+
+    rows = list(quizdatabase.db.execute(query))
+    totals = np.array(rows, dtype=np.float64).reshape(-1, 2)
+    percentages = quizrunner.calculate_score_percentage(totals[:, 0], totals[:, 1])
+    session_counts, edges = np.histogram(percentages, bins=bin_count, range=(0, 100))
+
+    return [ScoreBin(float(edges[number]), float(edges[number + 1]), int(session_counts[number])) for number in range(bin_count)]
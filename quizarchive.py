@@ -0,0 +1,100 @@
+import collections
+import datetime
+import time
+
+from peewee import Tuple
+from peewee import fn
+
+import db_config
+import quizdatabase
+from quizdatabase import ArchivedResult
+from quizdatabase import QuizDBError
+from quizdatabase import Result
+
+
+# what an archive run moved
+ArchiveReport = collections.namedtuple('ArchiveReport', ['session_count', 'result_count'])
+
+
+def get_retention_cutoff(retention_days, now=None):
+    """Returns the timestamp retention_days before now. Sessions that ended before it are archived."""
+    now = now if now is not None else datetime.datetime.now()
+    return (now - datetime.timedelta(days=retention_days)).timestamp()
+
+
+def get_old_session_keys(session_keys, cutoff):
+    """Returns the session keys, of those given, whose every result ended before cutoff."""
+    query = (Result
+             .select(Result.session)
+             .where(Result.session.in_(session_keys))
+             .group_by(Result.session)
+             .having(fn.MAX(Result.timestampend) < cutoff))
+    return [session_key for (session_key,) in query.tuples()]
+
+
+def move_sessions(session_keys):
+    """Move every result of the given sessions, by session key, into the archive, in the caller's transaction.
+    Returns the number of results moved. The sessions' rows stay in the session table, which the archived results still refer to.
+    Results keep their ids and are copied with INSERT OR IGNORE, so if a run stops between the archive and the main database
+    committing, the next run finishes the move without copying anything twice.
+    Nothing is deleted unless every result is in the archive afterwards: if an archived result from another session
+    already has one of the ids, QuizDBError is raised and the caller's transaction rolls back."""
+    result_fields = Result._meta.sorted_fields
+    archived_fields = [getattr(ArchivedResult, field.name) for field in result_fields]
+    moving = Result.select(Result.id, Result.session).where(Result.session.in_(session_keys))
+
+    (ArchivedResult
+     .insert_from(Result.select(*result_fields).where(Result.session.in_(session_keys)), archived_fields)
+     .on_conflict_ignore()
+     .execute())
+
+    result_count = moving.count()
+    archived_count = ArchivedResult.select().where(Tuple(ArchivedResult.id, ArchivedResult.session).in_(moving)).count()
+    if archived_count != result_count:
+        raise QuizDBError(f'Error: Only {archived_count} of {result_count} results could be archived, '
+                          f'the archive already holds other results with the same ids.')
+    return Result.delete().where(Result.session.in_(session_keys)).execute()
+
+
+def archive_old_sessions(retention_days=None, batch_size=None, pause_seconds=0.0, progress=None):
+    """Move the results of every session that ended more than retention_days ago into the archive database,
+    so the result table only holds recent sessions. Session summaries, question stats and the leaderboard stay where they are.
+    The old results are walked in the result(timestampend) index, batch_size at a time. Each batch's sessions are moved
+    in their own short write transaction, and pause_seconds between batches gives live quizzes room to save their results.
+    progress, if given, is called with the ArchiveReport so far after every batch. Returns an ArchiveReport."""
+    retention_days = retention_days if retention_days is not None else db_config.archive_retention_days
+    batch_size = batch_size if batch_size is not None else db_config.archive_batch_size
+    cutoff = get_retention_cutoff(retention_days)
+
+    quizdatabase.attach_archive(create=True)
+    with quizdatabase.db.atomic():
+        # results saved before the result table had an AUTOINCREMENT key may have reused archived ids
+        quizdatabase.reserve_result_ids()
+
+    session_count = 0
+    result_count = 0
+    last_row = None
+    while True:
+        # reading the next batch doesn't block writers, only the move below takes the write lock
+        query = Result.select(Result.timestampend, Result.id, Result.session).where(Result.timestampend < cutoff)
+        if last_row is not None:
+            query = query.where(Tuple(Result.timestampend, Result.id) > Tuple(last_row[0], last_row[1]))
+        rows = list(query.order_by(Result.timestampend, Result.id).limit(batch_size).tuples())
+        if not rows:
+            break
+        last_row = rows[-1]
+
+        session_keys = list({session_key for _, _, session_key in rows})
+        with quizdatabase.db.atomic('IMMEDIATE'):
+            # a session still being answered when the batch was read is left alone
+            old_session_keys = get_old_session_keys(session_keys, cutoff)
+            if old_session_keys:
+                result_count += move_sessions(old_session_keys)
+                session_count += len(old_session_keys)
+
+        if progress:
+            progress(ArchiveReport(session_count, result_count))
+        if pause_seconds:
+            time.sleep(pause_seconds)
+
+    return ArchiveReport(session_count, result_count)
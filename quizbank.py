@@ -0,0 +1,196 @@
+import sys
+import threading
+import time
+
+import db_config
+import quizdatabase
+import quizrunner
+from quizdatabase import Question
+from quizdatabase import QuizDBError
+
+
+# the question columns held in memory, in the order they are read
+BANK_FIELDS = [Question.id, Question.question, Question.answercorrect, Question.answerincorrecta, Question.answerincorrectb,
+               Question.answerincorrectc, Question.difficulty, Question.points, Question.category]
+
+
+class BankQuestion:
+    """A read-only question held in the question bank, with the same attributes as a Question model
+    so the quiz engine and ui can use either. __slots__ keeps each one to a fixed size with no dict or ORM state."""
+    __slots__ = ('id', 'question', 'answercorrect', 'answerincorrecta', 'answerincorrectb', 'answerincorrectc', 'difficulty', 'points', 'category')
+
+    def __init__(self, id, question, answercorrect, answerincorrecta, answerincorrectb, answerincorrectc, difficulty, points, category):
+        self.id = id
+        self.question = question
+        self.answercorrect = answercorrect
+        self.answerincorrecta = answerincorrecta
+        self.answerincorrectb = answerincorrectb
+        self.answerincorrectc = answerincorrectc
+        self.difficulty = difficulty
+        self.points = points
+        self.category = category
+
+    def __eq__(self, other):
+        return isinstance(other, BankQuestion) and self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __str__(self):
+        question_info = f'ID. {self.id} Difficulty: {self.difficulty}, Points: {self.points}, Category: {self.category}'
+        question_and_answers = f'Q: {self.question}, A: {self.answercorrect}; {self.answerincorrecta}; {self.answerincorrectb}; {self.answerincorrectc}'
+        return f'{question_info}\n{question_and_answers}\n'
+
+
+class QuestionBank:
+    """Every question loaded into memory once, so building and running a quiz needs no database round trips.
+    It has the same question lookup functions as quizdatabase, and raises the same QuizDBErrors.
+    Category and answer strings are interned, so the many repeats of 'True', 'False' or a category name are stored once.
+    The bank reloads itself after a question change in this process (through quizdatabase.question_change_hooks),
+    and after a change by another process, which is spotted by checking question_version every check_seconds."""
+
+    def __init__(self, check_seconds=None):
+        self.check_seconds = check_seconds if check_seconds is not None else db_config.question_bank_check_seconds
+        self.questions_by_id = {}
+        self.category_pools = {}
+        # category: tuple of every question id in it, built with the pools so random picks don't rebuild it each time
+        self.category_ids = {}
+        self.version = None
+        self.is_stale = True
+        self.last_check_time = 0.0
+        self.load_count = 0
+        self.reload_lock = threading.Lock()
+
+    def load(self, fetch_size=10000):
+        """Read every question from the database into the bank.
+        The new questions and pools are built on the side and swapped in at the end, so lookups running
+        at the same time see either the old bank or the new one."""
+        self.is_stale = False
+        version = quizdatabase.get_question_version()
+        questions_by_id = {}
+        category_pools = {}
+        intern = sys.intern
+
+        # plain cursor rows, a bank can hold a million questions and peewee's models are what the bank exists to avoid
+        cursor = quizdatabase.db.execute(Question.select(*BANK_FIELDS).order_by(Question.id))
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            for question_id, question, answercorrect, answerincorrecta, answerincorrectb, answerincorrectc, difficulty, points, category in rows:
+                category = intern(category)
+                questions_by_id[question_id] = BankQuestion(question_id, question, intern(answercorrect), intern(answerincorrecta),
+                                                            intern(answerincorrectb), intern(answerincorrectc), difficulty, points, category)
+                pools = category_pools.get(category)
+                if pools is None:
+                    pools = category_pools[category] = {difficulty: [] for difficulty in range(quizrunner.MIN_DIFFICULTY, quizrunner.MAX_DIFFICULTY + 1)}
+                pools[difficulty].append(question_id)
+
+        category_ids = {category: tuple(question_id for question_ids in pools.values() for question_id in question_ids)
+                        for category, pools in category_pools.items()}
+
+        self.questions_by_id = questions_by_id
+        self.category_pools = category_pools
+        self.category_ids = category_ids
+        self.version = version
+        self.last_check_time = time.monotonic()
+        self.load_count += 1
+
+    def mark_stale(self):
+        """Make the next lookup reload the bank. Registered as a question change hook."""
+        self.is_stale = True
+
+    def reload_if_changed(self):
+        """Reload the bank if it has never been loaded, a question changed in this process,
+        or question_version has moved on since the last load. The database is only checked every check_seconds."""
+        if not self.is_stale and time.monotonic() - self.last_check_time < self.check_seconds:
+            return
+
+        with self.reload_lock:
+            if not self.is_stale:
+                self.last_check_time = time.monotonic()
+                if quizdatabase.get_question_version() == self.version:
+                    return
+            self.load()
+
+    def get_category_catalog(self):
+        """Returns a dict of each category and the number of questions in it."""
+        catalog = {category: len(question_ids) for category, question_ids in self.category_ids.items()}
+        if not catalog:
+            raise QuizDBError('Error: There are no categories in the database.')
+        return catalog
+
+    def get_category_list(self):
+        return list(self.get_category_catalog())
+
+    def count_questions_by_category(self, category):
+        """Returns the number of questions in a category. Raises error if there are no questions in the category."""
+        question_count = len(self.category_ids.get(category, ()))
+
+        if not question_count:
+            raise QuizDBError(f'Error: There are no questions with category: {category} in the database.')
+
+        return question_count
+
+    def get_difficulty_pools(self, category):
+        """Returns a dict of each difficulty from 1 to 5 and the ids of the questions with it in a category.
+        The lists belong to the bank, so don't change them."""
+        pools = self.category_pools.get(category)
+        if pools is None:
+            return {difficulty: [] for difficulty in range(quizrunner.MIN_DIFFICULTY, quizrunner.MAX_DIFFICULTY + 1)}
+        return pools
+
+    def count_questions_by_difficulty(self, category):
+        return {difficulty: len(question_ids) for difficulty, question_ids in self.get_difficulty_pools(category).items()}
+
+    def get_question_ids_by_category(self, category):
+        return list(self.category_ids.get(category, ()))
+
+    def get_question_by_id(self, question_id):
+        """Returns one question. Raises error if the question is not in the bank."""
+        question = self.questions_by_id.get(question_id)
+
+        if question is None:
+            raise QuizDBError(f'Error: Unable to get question with id {question_id} from database.')
+
+        return question
+
+    def get_questions_by_ids(self, question_ids):
+        """Returns the questions with the given ids, in the same order as the ids. Raises error if any id is not in the bank."""
+        questions_by_id = self.questions_by_id
+        missing_ids = [question_id for question_id in question_ids if question_id not in questions_by_id]
+        if missing_ids:
+            raise QuizDBError(f'Error: Unable to get questions with ids {missing_ids} from database.')
+
+        return [questions_by_id[question_id] for question_id in question_ids]
+
+    def get_random_questions_by_category(self, category, number_of_questions):
+        """Returns number_of_questions questions picked uniformly at random from a category, in random order.
+        Raises error if the category doesn't have that many questions."""
+        # sampled straight from the bank's tuple, without copying it
+        question_ids = self.category_ids.get(category, ())
+        return self.get_questions_by_ids(quizdatabase.sample_question_ids(question_ids, number_of_questions, category))
+
+    def get_random_questions_by_difficulty_profile(self, category, difficulty_profile):
+        """Picks questions for a difficulty profile, like quizdatabase.get_random_questions_by_difficulty_profile()."""
+        return self.get_questions_by_ids(quizdatabase.sample_difficulty_profile(self.get_difficulty_pools(category), category, difficulty_profile))
+
+    def get_random_question_id_by_difficulty(self, category, difficulty, exclude_ids=()):
+        """Returns a random question id from a category's pool for one difficulty, skipping any id in exclude_ids,
+        or None if every question at that difficulty is excluded."""
+        return quizdatabase.pick_question_id(self.get_difficulty_pools(category)[difficulty], exclude_ids)
+
+
+# the bank shared by everything in this process, loaded the first time it is used
+question_bank = QuestionBank()
+quizdatabase.question_change_hooks.append(question_bank.mark_stale)
+
+
+def get_question_source():
+    """Returns where the quiz should get its questions: the in-memory question bank when db_config.question_bank is on,
+    otherwise the quizdatabase module. Both have the same lookup functions."""
+    if not db_config.question_bank:
+        return quizdatabase
+
+    question_bank.reload_if_changed()
+    return question_bank
@@ -0,0 +1,313 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+
+# main.py is the console program, named so it doesn't clash with main() below
+import main as quizmain
+import quizbank
+import quizcategoryindex
+import quizdatabase
+import quizengine
+import quizloadtest
+import quizrunner
+from quizdatabase import Result
+
+
+# (questions, categories, results) for each data size the suite can run at
+SCALES = {
+    'small': (1000, 10, 10000),
+    'medium': (100000, 100, 1000000),
+    'large': (1000000, 1000, 10000000),
+}
+
+RESULTS_PER_SESSION = 10
+
+# a benchmark only counts as a regression if it is this much slower than the baseline, in milliseconds,
+# as well as slower by the tolerance, so sub-millisecond noise is not reported
+NOISE_FLOOR_MS = 0.05
+
+# the folder holding main.py, so startup benchmarks can run it in a new process
+PROGRAM_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# what main() asks once the menu is ready, which is the end of startup
+FIRST_PROMPT = b'Enter your choice: '
+
+
+def seed_results(result_count, question_count, chunk_size=50000):
+    """Add result_count made up results for random questions, RESULTS_PER_SESSION to a session,
+    with timestamps that increase session by session. Session summaries are rebuilt at the end."""
+    random_generator = random.Random(1)
+    fields = [Result.timestampstart, Result.timestampend, Result.responsetime, Result.answercode, Result.points, Result.iscorrect, Result.session, Result.questionid]
+    start_timestamp = 1600000000
+    for chunk_start in range(0, result_count, chunk_size):
+        numbers = range(chunk_start, min(chunk_start + chunk_size, result_count))
+        with quizdatabase.db.atomic():
+            session_keys = quizdatabase.get_session_keys({f'bench-session-{number // RESULTS_PER_SESSION}' for number in numbers})
+            rows = []
+            for number in numbers:
+                question_id = random_generator.randint(1, question_count)
+                timestamp_start = start_timestamp + number * 10
+                response_time = random_generator.randint(1000, 30000)
+                is_correct = random_generator.randint(0, 1)
+                # the correct answer is code 0, and a wrong answer is one of the three others
+                answer_code = 0 if is_correct else random_generator.randint(1, 3)
+                rows.append((timestamp_start, timestamp_start + response_time // 1000, response_time, answer_code,
+                             (question_id - 1) % 100 + 1, is_correct, session_keys[f'bench-session-{number // RESULTS_PER_SESSION}'], question_id))
+            quizdatabase.bulk_insert(Result, fields, rows)
+    quizdatabase.rebuild_session_summaries()
+
+
+def prepare_database(scale, database_dir):
+    """Bind quizdatabase to the benchmark database for a scale, filling it with made up data the first time.
+    The file is kept, so later runs at the same scale skip the slow part."""
+    question_count, category_count, result_count = SCALES[scale]
+    database_path = os.path.join(database_dir, f'bench_{scale}.db')
+    quizdatabase.configure_database(database_path)
+    quizdatabase.create_table()
+
+    if quizdatabase.Question.select().count() < question_count:
+        print(f'Adding {question_count} questions to {database_path}...', file=sys.stderr)
+        quizloadtest.seed_questions(question_count, category_count)
+    if Result.select().count() < result_count:
+        print(f'Adding {result_count} results to {database_path}...', file=sys.stderr)
+        seed_results(result_count, question_count)
+
+    return database_path
+
+
+def time_function(function, min_seconds=0.2, max_runs=1000):
+    """Call function repeatedly until min_seconds have passed or max_runs calls have been made.
+    Returns a dict with the number of runs and the median and fastest call in milliseconds."""
+    run_times = []
+    total_start = time.perf_counter()
+    while len(run_times) < max_runs and (time.perf_counter() - total_start < min_seconds or not run_times):
+        start = time.perf_counter()
+        function()
+        run_times.append(time.perf_counter() - start)
+
+    return {
+        'runs': len(run_times),
+        'median_ms': statistics.median(run_times) * 1000,
+        'min_ms': min(run_times) * 1000,
+    }
+
+
+def run_main_to_first_prompt(database_path):
+    """Start the console program in a new Python process against database_path, and wait until the main menu asks for a choice.
+    Timing this measures everything a kiosk restart pays for before the user can do anything."""
+    code = f'import db_config; db_config.database_path = {database_path!r}; import main; main.main()'
+    process = subprocess.Popen([sys.executable, '-c', code], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, cwd=PROGRAM_DIR)
+    try:
+        output = b''
+        while FIRST_PROMPT not in output:
+            output_chunk = process.stdout.read1(4096)
+            if not output_chunk:
+                raise RuntimeError('main.py exited before showing the main menu.')
+            output += output_chunk
+    finally:
+        process.kill()
+        process.wait()
+
+
+def get_startup_import_times(module_name='main'):
+    """Import a module in a new Python process with -X importtime.
+    Returns a list of (module, milliseconds including the modules it imports), slowest first."""
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module_name}'], capture_output=True, text=True, cwd=PROGRAM_DIR, check=True)
+    import_times = []
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, imported_module = line[len('import time:'):].split('|')
+        import_times.append((imported_module.strip(), int(cumulative_us) / 1000))
+
+    return sorted(import_times, key=lambda import_time: import_time[1], reverse=True)
+
+
+def get_benchmarks(scale, only=None):
+    """Returns (name, function, max_runs) for every benchmark, using data from the current database.
+    Functions that scan whole tables run fewer times. If only is given, the analytics benchmarks
+    are left out unless named in it, so their columns are not loaded for nothing."""
+    random_generator = random.Random(2)
+    question_count, category_count, result_count = SCALES[scale]
+    categories = quizdatabase.get_category_list()
+    category = categories[0]
+    question_ids = quizdatabase.get_question_ids_by_category(category)[:20]
+    session_id = quizdatabase.get_last_session_id()
+    difficulty_profile = quizrunner.parse_difficulty_profile('2 easy, 5 medium, 3 hard')
+
+    def get_category_catalog_cold():
+        quizdatabase.invalidate_category_catalog()
+        quizdatabase.get_category_catalog()
+
+    def get_questions_by_category_cold():
+        quizdatabase.invalidate_question_caches()
+        quizdatabase.get_questions_by_category(category)
+
+    def adaptive_question_pick():
+        adaptive_questions = quizengine.AdaptiveQuestions(category, 10)
+        adaptive_questions.pick_next(None)
+
+    category_index = quizcategoryindex.CategoryIndex(categories)
+
+    question_bank = quizbank.QuestionBank()
+    question_bank.load()
+
+    def create_question_result():
+        quizdatabase.create_question_result(1, 2, 'Benchmark answer', 1, True, 'bench-writes', random_generator.randint(1, question_count))
+
+    def result_writer_session():
+        with quizdatabase.ResultWriter('bench-writer') as result_writer:
+            for _ in range(RESULTS_PER_SESSION):
+                result_writer.add(1, 2, 'Benchmark answer', 1, True, random_generator.randint(1, question_count))
+
+    return [
+        ('get_all_questions', quizdatabase.get_all_questions, 3),
+        ('get_category_catalog_cold', get_category_catalog_cold, 100),
+        ('get_category_list', quizdatabase.get_category_list, 1000),
+        ('CategoryIndex', lambda: quizcategoryindex.CategoryIndex(categories), 100),
+        ('CategoryIndex.get_page', lambda: category_index.get_page('load test category 1', 1, 20), 1000),
+        ('count_questions_by_category', lambda: quizdatabase.count_questions_by_category(category), 1000),
+        ('get_questions_by_category', lambda: quizdatabase.get_questions_by_category(category), 20),
+        ('get_questions_by_category_cold', get_questions_by_category_cold, 20),
+        ('get_question_ids_by_category', lambda: quizdatabase.get_question_ids_by_category(category), 100),
+        ('get_random_questions_by_category', lambda: quizdatabase.get_random_questions_by_category(category, 10), 100),
+        ('get_difficulty_pools', lambda: quizdatabase.get_difficulty_pools(category), 1000),
+        ('get_random_questions_by_difficulty_profile', lambda: quizdatabase.get_random_questions_by_difficulty_profile(category, difficulty_profile), 100),
+        ('adaptive_question_pick', adaptive_question_pick, 1000),
+        ('question_bank_load', question_bank.load, 3),
+        ('question_bank.get_random_questions_by_category', lambda: question_bank.get_random_questions_by_category(category, 10), 1000),
+        ('question_bank.get_random_questions_by_difficulty_profile', lambda: question_bank.get_random_questions_by_difficulty_profile(category, difficulty_profile), 1000),
+        ('search_questions', lambda: quizdatabase.search_questions(f'right {random_generator.randint(0, question_count - 1)}'), 1000),
+        ('search_questions_in_category', lambda: quizdatabase.search_questions('right 1', category=category), 100),
+        ('get_questions_by_ids', lambda: quizdatabase.get_questions_by_ids(question_ids), 1000),
+        ('get_question_by_id', lambda: quizdatabase.get_question_by_id(random_generator.randint(1, question_count)), 1000),
+        ('convert_is_correct_to_number', lambda: quizdatabase.convert_is_correct_to_number(True), 1000),
+        ('create_question_result', create_question_result, 200),
+        ('result_writer_session', result_writer_session, 200),
+        ('get_last_session_id', quizdatabase.get_last_session_id, 1000),
+        ('get_results_by_session', lambda: quizdatabase.get_results_by_session(session_id), 1000),
+        ('get_session_summary', lambda: quizdatabase.get_session_summary(session_id), 1000),
+        ('rebuild_session_summaries', quizdatabase.rebuild_session_summaries, 1),
+    ] + get_analytics_benchmarks(only) + [
+        ('main.get_results', quizmain.get_results, 1000),
+        ('main.time_to_first_prompt', lambda: run_main_to_first_prompt(quizdatabase.db.database), 10),
+        ('main.prepare_quiz_questions', lambda: quizmain.prepare_quiz_questions(category, 10), 100),
+    ]
+
+
+def get_analytics_benchmarks(only=None):
+    """Returns (name, function, max_runs) for the analytics benchmarks, or only those named in only.
+    The question and result columns are loaded up front, outside the timings, and only when a
+    benchmark that reads them is going to run; at the large scale that is millions of rows."""
+    analytics_names = ['analytics.load_result_columns', 'analytics.get_category_day_stats',
+                       'analytics.get_difficulty_accuracy', 'analytics.get_score_distribution']
+    selected_names = [name for name in analytics_names if not only or name in only]
+    if not selected_names:
+        return []
+
+    # numpy is only needed for the analytics benchmarks
+    import quizanalytics
+    if {'analytics.get_category_day_stats', 'analytics.get_difficulty_accuracy'} & set(selected_names):
+        analytics_questions = quizanalytics.load_question_columns()
+        analytics_results = quizanalytics.load_result_columns()
+
+    analytics_benchmarks = {
+        'analytics.load_result_columns': (quizanalytics.load_result_columns, 1),
+        'analytics.get_category_day_stats': (lambda: quizanalytics.get_category_day_stats(analytics_results, analytics_questions), 3),
+        'analytics.get_difficulty_accuracy': (lambda: quizanalytics.get_difficulty_accuracy(analytics_results, analytics_questions), 3),
+        'analytics.get_score_distribution': (quizanalytics.get_score_distribution, 3),
+    }
+    return [(name, *analytics_benchmarks[name]) for name in selected_names]
+
+
+def run_benchmarks(scale, database_dir='.', only=None):
+    """Fill (or reuse) the database for a scale and time every benchmark. Returns a machine readable dict."""
+    database_path = prepare_database(scale, database_dir)
+    timings = {}
+    for name, function, max_runs in get_benchmarks(scale, only):
+        if only and name not in only:
+            continue
+        timings[name] = time_function(function, max_runs=max_runs)
+        print(f"{name}: median {timings[name]['median_ms']:.3f} ms over {timings[name]['runs']} runs", file=sys.stderr)
+
+    return {
+        'scale': scale,
+        'sizes': dict(zip(['questions', 'categories', 'results'], SCALES[scale])),
+        'database': database_path,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'timings': timings,
+    }
+
+
+def compare_to_baseline(report, baseline, tolerance=0.25):
+    """Returns a list of (name, baseline ms, current ms) for every benchmark whose median is more than
+    tolerance (a fraction) slower than the baseline."""
+    regressions = []
+    for name, timing in report['timings'].items():
+        baseline_timing = baseline['timings'].get(name)
+        if baseline_timing is None:
+            continue
+        baseline_ms = baseline_timing['median_ms']
+        current_ms = timing['median_ms']
+        if current_ms > baseline_ms * (1 + tolerance) and current_ms - baseline_ms > NOISE_FLOOR_MS:
+            regressions.append((name, baseline_ms, current_ms))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time quizdatabase and the quiz paths in main at production data sizes.')
+    parser.add_argument('--scale', choices=list(SCALES), default='small', help='how much made up data to benchmark against')
+    parser.add_argument('--database-dir', default='.', help='folder for the benchmark databases, which are kept between runs')
+    parser.add_argument('--baseline', help='baseline file, benchmark_baseline_<scale>.json if not given')
+    parser.add_argument('--save-baseline', action='store_true', help='save this run as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='fraction slower than the baseline that counts as a regression')
+    parser.add_argument('--output', help='also write this run to a JSON file')
+    parser.add_argument('--only', nargs='*', help='only run these benchmarks')
+    parser.add_argument('--import-times', action='store_true', help='show the slowest imports when main.py starts, then stop')
+    args = parser.parse_args()
+
+    if args.import_times:
+        for module_name, import_ms in get_startup_import_times()[:15]:
+            print(f'{import_ms:8.2f} ms  {module_name}')
+        return
+
+    report = run_benchmarks(args.scale, args.database_dir, args.only)
+    baseline_path = args.baseline or f'benchmark_baseline_{args.scale}.json'
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if args.save_baseline:
+        with open(baseline_path, 'w') as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+        print(f'Saved baseline to {baseline_path}.')
+        return
+
+    if not os.path.exists(baseline_path):
+        print(f'No baseline at {baseline_path}, run with --save-baseline to create one.')
+        return
+
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+
+    regressions = compare_to_baseline(report, baseline, args.tolerance)
+    for name, baseline_ms, current_ms in regressions:
+        print(f'REGRESSION {name}: {baseline_ms:.3f} ms -> {current_ms:.3f} ms')
+    if regressions:
+        sys.exit(1)
+    print(f'No regressions against {baseline_path}.')
+
+
+if __name__ == '__main__':
+    main()
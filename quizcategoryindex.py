@@ -0,0 +1,40 @@
+import bisect
+
+
+# sorts after any character that can appear in a category name, so prefix + PREFIX_END is past every name starting with prefix
+PREFIX_END = '\U0010ffff'
+
+
+class CategoryIndex:
+    """Category names sorted once, ignoring case, so the category picker can page through them and search them by prefix.
+    Finding the categories that start with a prefix is two binary searches, and a page is one slice,
+    so each search or page costs O(log n + page size) however many categories there are."""
+
+    def __init__(self, categories):
+        self.categories = sorted(categories, key=str.casefold)
+        self.keys = [category.casefold() for category in self.categories]
+
+    def __len__(self):
+        return len(self.categories)
+
+    def prefix_range(self, prefix):
+        """Returns (start, end) positions of the categories starting with prefix, ignoring case.
+        An empty prefix matches every category."""
+        key = prefix.casefold()
+        start = bisect.bisect_left(self.keys, key)
+        end = bisect.bisect_left(self.keys, key + PREFIX_END, start)
+        return start, end
+
+    def count_prefix(self, prefix):
+        start, end = self.prefix_range(prefix)
+        return end - start
+
+    def page_count(self, prefix, page_size):
+        """Returns how many pages the categories starting with prefix fill. There is always at least one page, even if it's empty."""
+        return max(1, -(-self.count_prefix(prefix) // page_size))
+
+    def get_page(self, prefix, page_number, page_size):
+        """Returns one page, counting from 0, of the categories starting with prefix."""
+        start, end = self.prefix_range(prefix)
+        page_start = start + page_number * page_size
+        return self.categories[page_start:min(page_start + page_size, end)]
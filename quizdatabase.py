@@ -1,6 +1,34 @@
 from peewee import *
+from playhouse.pool import PooledSqliteDatabase
+from playhouse.sqlite_ext import AutoIncrementField
+from playhouse.sqlite_ext import FTS5Model
+from playhouse.sqlite_ext import RowIDField
+from playhouse.sqlite_ext import SearchField
+import collections
+import datetime
+import os
+import random
+import re
+import threading
+import time
+
+import db_config
+import quizrunner
+import quizschema
+
+# the models are bound to this proxy, and configure_database() points it at a real database
+db = DatabaseProxy()
+
+# functions called with no arguments after questions are inserted, changed or deleted.
+# used to throw away anything cached from the question table
+question_change_hooks = []
+
+
+def notify_questions_changed():
+    """Run every question change hook. Bulk writes that bypass Question.save() should call this when they commit."""
+    for hook in question_change_hooks:
+        hook()
 
-db = SqliteDatabase('quiz.db')
 
 class Question(Model):
     question = CharField(null=False)
@@ -14,6 +42,20 @@ class Question(Model):
 
     class Meta: 
         database = db
+        indexes = (
+            # category lookups when building a quiz, optionally narrowed by difficulty
+            (('category', 'difficulty'), False),
+        )
+
+    def save(self, *args, **kwargs):
+        rows_saved = super().save(*args, **kwargs)
+        notify_questions_changed()
+        return rows_saved
+
+    def delete_instance(self, *args, **kwargs):
+        rows_deleted = super().delete_instance(*args, **kwargs)
+        notify_questions_changed()
+        return rows_deleted
 
     def __str__(self):
         question_info = f'ID. {self.id} Difficulty: {self.difficulty}, Points: {self.points}, Category: {self.category}'
@@ -21,21 +63,54 @@ class Question(Model):
         return f'{question_info}\n{question_and_answers}\n'
 
 
+class Session(Model):
+    """One row per quiz session, giving the session id a small integer key.
+    Results store the key, so the session id text is kept once per session instead of once per answer."""
+    sessionid = CharField(null=False, unique=True)
+    # 1 once the session answered every question, so rebuild_leaderboard() only ranks finished sessions
+    # the SQL default lets sessions be added with a plain INSERT of their sessionid, as migrations and get_session_keys() do
+    completed = IntegerField(null=False, default=0, constraints=[SQL('DEFAULT 0'), Check('completed IN (0, 1)')])
+
+    class Meta: 
+        database = db
+
+
 class Result(Model):
+    # AUTOINCREMENT, so an id is never handed out again once its result has been archived, see reserve_result_ids()
+    id = AutoIncrementField()
+    # wall clock times the question was asked and answered, for ordering and date ranges
     timestampstart = IntegerField(null=False)
     timestampend = IntegerField(null=False)
-    useranswer = CharField(null=False)
+    # milliseconds from the question being shown to the answer arriving, timed on the monotonic clock
+    responsetime = IntegerField(null=False, default=0)
+    # the answer given, as its place in quizrunner.create_answer_list(question): 0 is the correct answer, 1 to 3 the incorrect ones.
+    # an answer that isn't one of the question's options has no code, and its text is kept in useranswer instead
+    answercode = SmallIntegerField(null=True, constraints=[Check('answercode BETWEEN 0 AND 3')])
+    useranswer = CharField(null=True)
     points = IntegerField(null=False)
     iscorrect = IntegerField(null=False, default=0, constraints=[Check('iscorrect IN (0, 1)')])
-    sessionid = CharField(null=False)
+    session = ForeignKeyField(Session, column_name='sessionid')
     questionid = ForeignKeyField(Question)
 
     class Meta: 
         database = db
+        indexes = (
+            # finding the most recent session
+            (('timestampend',), False),
+            # loading every result for a session
+            (('sessionid',), False),
+        )
+
+    def get_user_answer(self):
+        """Returns the text of the answer given, looked up from the question's options by answercode."""
+        if self.answercode is None:
+            return self.useranswer
+        return quizrunner.create_answer_list(self.questionid)[self.answercode]
 
     def __str__(self):
-        question_info = f'{self.id}. Session: {self.sessionid}, Question ID: {self.questionid}, Time: {self.timestampstart} to {self.timestampend}'
-        user_answer_info = f'User Answer: {self.useranswer}, Points Earned: {self.pointsearned}'
+        question_info = (f'{self.id}. Session: {self.session.sessionid}, Question ID: {self.questionid}, Time: {self.timestampstart} to {self.timestampend}, '
+                         f'Response Time: {self.responsetime} ms')
+        user_answer_info = f'User Answer: {self.get_user_answer()}, Points Earned: {self.pointsearned}'
         if (self.iscorrect == 0):
             is_correct_string = 'No'
         else:
@@ -43,14 +118,572 @@ class Result(Model):
         return f'{question_info}\n{user_answer_info}, Correct: {is_correct_string}.\n'
 
 
+class SessionSummary(Model):
+    """One row per quiz session, kept up to date as results are saved
+    so a session's score can be read with a single primary key lookup.
+    totaltime is the sum of the results' response times, in milliseconds."""
+    sessionid = CharField(primary_key=True)
+    category = CharField(null=True)
+    score = IntegerField(null=False, default=0)
+    availablepoints = IntegerField(null=False, default=0)
+    totaltime = IntegerField(null=False, default=0)
+    questioncount = IntegerField(null=False, default=0)
+    timestampstart = IntegerField(null=False)
+    timestampend = IntegerField(null=False)
+
+    class Meta: 
+        database = db
+        table_name = 'session_summary'
+
+    def __str__(self):
+        session_info = f'Session: {self.sessionid}, Category: {self.category}, Time: {self.timestampstart} to {self.timestampend}'
+        score_info = f'Score: {self.score} of {self.availablepoints}, Questions: {self.questioncount}, Total Time: {self.totaltime}'
+        return f'{session_info}\n{score_info}\n'
+
+
+class ExportCheckpoint(Model):
+    """The last result id written by a named export, so the next run can export only newer results."""
+    name = CharField(primary_key=True)
+    lastresultid = IntegerField(null=False)
+    exportedat = DateTimeField(null=False)
+
+    class Meta: 
+        database = db
+        table_name = 'export_checkpoint'
+
+
+class QuestionStats(Model):
+    """Running totals of how each question has been answered, kept up to date as results are saved,
+    so item statistics never need a scan of the result table. Times are response times in milliseconds."""
+    questionid = ForeignKeyField(Question, primary_key=True)
+    attempts = IntegerField(null=False, default=0)
+    correctcount = IntegerField(null=False, default=0)
+    totaltime = IntegerField(null=False, default=0)
+    totaltimesquared = IntegerField(null=False, default=0)
+    lastasked = IntegerField(null=True)
+
+    class Meta: 
+        database = db
+        table_name = 'question_stats'
+
+    def miss_rate(self):
+        """Returns the fraction of attempts that were answered incorrectly."""
+        if not self.attempts:
+            return 0.0
+        return (self.attempts - self.correctcount) / self.attempts
+
+    def mean_time(self):
+        """Returns the mean time taken to answer, in milliseconds."""
+        if not self.attempts:
+            return 0.0
+        return self.totaltime / self.attempts
+
+    def time_standard_deviation(self):
+        """Returns the population standard deviation of the time taken to answer, in milliseconds."""
+        if not self.attempts:
+            return 0.0
+        variance = self.totaltimesquared / self.attempts - self.mean_time() ** 2
+        return max(variance, 0.0) ** 0.5
+
+    def __str__(self):
+        return (f'Question ID: {self.questionid_id}, Attempts: {self.attempts}, Correct: {self.correctcount}, '
+                f'Missed: {self.miss_rate() * 100:.1f}%, Mean Time: {self.mean_time():.0f} ms, Last Asked: {self.lastasked}')
+
+
+class LeaderboardEntry(Model):
+    """One row per completed quiz session, ranked by percentage, then score, then fastest total time.
+    The indexes below are in ranking order, so reading the top of a leaderboard never sorts the table.
+    totaltime is in milliseconds, like the session summary it comes from."""
+    sessionid = CharField(primary_key=True)
+    category = CharField(null=True)
+    percentage = FloatField(null=False)
+    score = IntegerField(null=False)
+    totaltime = IntegerField(null=False)
+    completedat = IntegerField(null=False)
+
+    class Meta: 
+        database = db
+        table_name = 'leaderboard'
+
+    def __str__(self):
+        return f'{self.percentage:.2f}% ({self.score} points) in {self.totaltime / quizrunner.MILLISECONDS_PER_SECOND:.1f} seconds, Category: {self.category}, Session: {self.sessionid}'
+
+
+# leaderboards are read best first, so the indexes are built in that order
+LeaderboardEntry.add_index(LeaderboardEntry.percentage.desc(), LeaderboardEntry.score.desc(), LeaderboardEntry.totaltime, name='leaderboard_ranking')
+LeaderboardEntry.add_index(LeaderboardEntry.category, LeaderboardEntry.percentage.desc(), LeaderboardEntry.score.desc(), LeaderboardEntry.totaltime, name='leaderboard_category_ranking')
+
+
+class QuestionVersion(Model):
+    """A single row counting changes to the question table. Triggers bump the count on every insert, update and delete,
+    so a program holding questions in memory can tell they are out of date, even if another process changed them."""
+    id = IntegerField(primary_key=True)
+    version = IntegerField(null=False, default=0)
+
+    class Meta: 
+        database = db
+        table_name = 'question_version'
+
+
+class QuestionSignature(Model):
+    """Duplicate detection data for one question, see quizduplicates.
+    texthash is a hash of the normalized question and correct answer, equal for exact duplicates,
+    and minhash is the question's packed MinHash signature, used to estimate how alike two questions are."""
+    questionid = ForeignKeyField(Question, primary_key=True)
+    texthash = BigIntegerField(null=False, index=True)
+    minhash = BlobField(null=False)
+
+    class Meta: 
+        database = db
+        table_name = 'question_signature'
+
+
+class QuestionBand(Model):
+    """One row per question per LSH band. Questions sharing a bandkey agree on every MinHash value in that band,
+    so looking up a question's bandkeys finds its likely near duplicates without comparing it to every question."""
+    bandkey = BigIntegerField(null=False, index=True)
+    questionid = ForeignKeyField(Question, index=True)
+
+    class Meta: 
+        database = db
+        table_name = 'question_band'
+        primary_key = False
+
+
+class QuestionSearch(FTS5Model):
+    """FTS5 full text index over the question and answer text. It is an external content table,
+    so the text is only stored once, in the question table, and triggers keep the index in step with it.
+    The prefix option adds 2 and 3 letter prefix indexes, so searching for the start of a word stays fast.
+    category is stored but not searched, so a search narrowed to one category is filtered without joining to the question table."""
+    rowid = RowIDField()
+    question = SearchField()
+    answercorrect = SearchField()
+    answerincorrecta = SearchField()
+    answerincorrectb = SearchField()
+    answerincorrectc = SearchField()
+    category = SearchField(unindexed=True)
+
+    class Meta: 
+        database = db
+        table_name = 'question_search'
+        options = {'content': 'question', 'content_rowid': 'id', 'prefix': '2 3'}
+
+
+# the name the archive database is attached under
+ARCHIVE_SCHEMA = 'archive'
+
+
+class ArchivedResult(Model):
+    """A result moved out of the result table by quizarchive, into the attached archive database.
+    It has the same columns as Result and keeps its original id. session and questionid are plain integers
+    because SQLite can't enforce a foreign key across database files."""
+    timestampstart = IntegerField(null=False)
+    timestampend = IntegerField(null=False)
+    responsetime = IntegerField(null=False, default=0)
+    answercode = SmallIntegerField(null=True)
+    useranswer = CharField(null=True)
+    points = IntegerField(null=False)
+    iscorrect = IntegerField(null=False, default=0)
+    session = IntegerField(null=False, column_name='sessionid')
+    questionid = IntegerField(null=False, column_name='questionid_id')
+
+    class Meta: 
+        database = db
+        schema = ARCHIVE_SCHEMA
+        table_name = 'result'
+        indexes = (
+            (('timestampend',), False),
+            (('sessionid',), False),
+        )
+
+
+# every table in the quiz database, in the order they are created. ArchivedResult lives in the archive database
+MODELS = [Question, Session, Result, SessionSummary, ExportCheckpoint, QuestionStats, LeaderboardEntry, QuestionVersion, QuestionSearch, QuestionSignature, QuestionBand]
+
+# how much a match in each QuestionSearch column counts towards a search result's rank, in column order.
+# a match in the question's own wording matters most, then the correct answer. category is never matched
+SEARCH_COLUMN_WEIGHTS = [4.0, 2.0, 1.0, 1.0, 1.0, 0.0]
+
+
 class QuizDBError(Exception):
     """Custom exception primarily used to prevent empty lists & null values from being returned."""
     pass
 
 
+CONNECTION_MODES = ['thread', 'pool']
+
+
+def get_pragmas():
+    """Returns the SQLite pragmas from db_config, applied to every new connection."""
+    return {
+        'journal_mode': db_config.journal_mode,
+        'synchronous': db_config.synchronous,
+        'cache_size': db_config.cache_size,
+        'mmap_size': db_config.mmap_size,
+        'busy_timeout': db_config.busy_timeout,
+    }
+
+
+def configure_database(database_path=None, connection_mode=None, **pragmas):
+    """Bind the models to a SQLite database, using db_config for anything not passed in.
+    In 'thread' mode every thread opens and keeps its own connection.
+    In 'pool' mode connections are shared from a pool of up to db_config.max_connections,
+    and are returned to it by db.close() or a db.connection_context() block.
+    Extra keyword arguments override single pragmas. Returns the database."""
+    database_path = database_path if database_path is not None else db_config.database_path
+    connection_mode = connection_mode if connection_mode is not None else db_config.connection_mode
+    database_pragmas = get_pragmas()
+    database_pragmas.update(pragmas)
+
+    if connection_mode == 'thread':
+        database = SqliteDatabase(database_path, pragmas=database_pragmas)
+    elif connection_mode == 'pool':
+        database = PooledSqliteDatabase(database_path, pragmas=database_pragmas, max_connections=db_config.max_connections, stale_timeout=db_config.stale_timeout)
+    else:
+        raise QuizDBError(f'Error: Unknown connection mode {connection_mode}, expected one of {CONNECTION_MODES}.')
+
+    if db.obj is not None and not db.is_closed():
+        db.close()
+    db.initialize(database)
+    # cached questions belong to the database that was bound before
+    notify_questions_changed()
+    attach_archive()
+    return database
+
+
+def get_archive_path():
+    """Returns the archive database file: db_config.archive_database_path, or the database file with _archive added to its name."""
+    if db_config.archive_database_path is not None:
+        return db_config.archive_database_path
+    database_root, extension = os.path.splitext(db.database)
+    return f'{database_root}_archive{extension or ".db"}'
+
+
+def attach_archive(create=False):
+    """Attach the archive database as the 'archive' schema on this and every new connection, so ArchivedResult can be used.
+    A missing archive file is only made, with its result table, when create is True.
+    Returns True if the archive is attached."""
+    archive_path = get_archive_path()
+    if not create and not os.path.exists(archive_path):
+        return False
+
+    # SQLite can't attach a database in the middle of a transaction, peewee attaches it to the next connection instead
+    if db.in_transaction():
+        return ARCHIVE_SCHEMA in get_attached_schemas()
+
+    db.attach(archive_path, ARCHIVE_SCHEMA)
+    if create:
+        ArchivedResult.create_table(safe=True)
+    return True
+
+
+def detach_archive():
+    """Stop attaching the archive database."""
+    db.detach(ARCHIVE_SCHEMA)
+
+
+def get_attached_schemas():
+    """Returns the names of the databases open on this connection, starting with 'main'."""
+    return [row[1] for row in db.execute_sql('PRAGMA database_list').fetchall()]
+
+
+def get_result_models(include_archive=True):
+    """Returns the models to read results from: Result, followed by ArchivedResult if include_archive is True
+    and there is an archive database. A session's results are always all in one of them."""
+    if include_archive and attach_archive():
+        return [Result, ArchivedResult]
+    return [Result]
+
+
+configure_database()
+
+
+SCHEMA_VERSION = quizschema.SCHEMA_VERSION
+
+
 def create_table():
-    """Create Question and Result tables."""
-    db.create_tables([Question, Result])
+    """Create the quiz tables, then migrate an existing database up to the current schema version.
+    A database already at the current version is left alone after one pragma read, without running any DDL."""
+    if get_schema_version() == SCHEMA_VERSION:
+        return
+
+    db.create_tables(MODELS)
+    migrate_schema()
+
+
+def get_schema_version():
+    """Returns the schema version stored in the database file. A database that was never migrated is version 0."""
+    return db.pragma('user_version')
+
+
+def add_lookup_indexes():
+    """Migration 1: add the result(timestampend), result(sessionid) and question(category, difficulty) indexes
+    to databases created before the indexes were part of the models."""
+    Question._schema.create_indexes(safe=True)
+    Result._schema.create_indexes(safe=True)
+
+
+def add_session_summaries():
+    """Migration 2: fill the session_summary table from the results already in the database."""
+    SessionSummary.create_table(safe=True)
+    return True
+
+
+def drop_question_indexes():
+    """Drop the secondary indexes on the question table, and the triggers that keep the search index up to date,
+    to speed up a very large bulk load. Put them back with create_question_indexes() when the load is done."""
+    Question._schema.drop_indexes(safe=True)
+    drop_question_search_triggers()
+
+
+def create_question_indexes():
+    """Build any missing secondary indexes on the question table.
+    If the search triggers were dropped, they are put back and the search index is rebuilt from the question table."""
+    Question._schema.create_indexes(safe=True)
+    if not has_question_search_triggers():
+        create_question_search_triggers()
+        rebuild_question_search()
+
+
+# the columns copied into the search index, in QuestionSearch column order
+SEARCH_COLUMNS = ['question', 'answercorrect', 'answerincorrecta', 'answerincorrectb', 'answerincorrectc', 'category']
+
+
+def create_question_search_triggers():
+    """Add the triggers that copy every question insert, update and delete into the question_search index."""
+    columns = ', '.join(SEARCH_COLUMNS)
+    new_values = ', '.join(f'new.{column}' for column in SEARCH_COLUMNS)
+    old_values = ', '.join(f'old.{column}' for column in SEARCH_COLUMNS)
+    # an external content FTS5 table forgets a row by being sent the row's old values with the special 'delete' command
+    forget_old_row = f"INSERT INTO question_search(question_search, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+    add_new_row = f'INSERT INTO question_search(rowid, {columns}) VALUES (new.id, {new_values});'
+
+    db.execute_sql(f'CREATE TRIGGER IF NOT EXISTS question_search_insert AFTER INSERT ON question BEGIN {add_new_row} END')
+    db.execute_sql(f'CREATE TRIGGER IF NOT EXISTS question_search_delete AFTER DELETE ON question BEGIN {forget_old_row} END')
+    db.execute_sql(f'CREATE TRIGGER IF NOT EXISTS question_search_update AFTER UPDATE OF {columns} ON question BEGIN {forget_old_row} {add_new_row} END')
+
+
+def drop_question_search_triggers():
+    for event in ['insert', 'delete', 'update']:
+        db.execute_sql(f'DROP TRIGGER IF EXISTS question_search_{event}')
+
+
+def has_question_search_triggers():
+    return db.execute_sql("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'question_search_insert'").fetchone() is not None
+
+
+def rebuild_question_search():
+    """Rebuild the whole question_search index from the question table."""
+    QuestionSearch.rebuild()
+
+
+def add_export_checkpoints():
+    """Migration 3: add the export_checkpoint table used by incremental result exports."""
+    ExportCheckpoint.create_table(safe=True)
+
+
+def add_question_stats():
+    """Migration 4: add the question_stats table and fill it from the results already in the database."""
+    QuestionStats.create_table(safe=True)
+    return True
+
+
+def add_leaderboard():
+    """Migration 5: add the leaderboard table and fill it from the session summaries already in the database."""
+    LeaderboardEntry.create_table(safe=True)
+    return True
+
+
+def add_question_version():
+    """Migration 6: add the question_version row and the triggers that bump it whenever a question changes."""
+    QuestionVersion.create_table(safe=True)
+    QuestionVersion.insert(id=1, version=0).on_conflict_ignore().execute()
+    for event in ['INSERT', 'UPDATE', 'DELETE']:
+        db.execute_sql(f'CREATE TRIGGER IF NOT EXISTS question_version_{event.lower()} AFTER {event} ON question '
+                       f'BEGIN UPDATE question_version SET version = version + 1 WHERE id = 1; END')
+
+
+def add_question_search():
+    """Migration 7: add the question_search full text index, fill it from the questions already in the database
+    and add the triggers that keep it up to date."""
+    QuestionSearch.create_table(safe=True)
+    rebuild_question_search()
+    create_question_search_triggers()
+
+
+def add_question_signatures():
+    """Migration 8: add the question_signature and question_band tables used to find duplicate questions,
+    and triggers that throw a question's signature away when its text changes or it is deleted.
+    Existing questions are signed by quizduplicates.find_duplicates(), not here, because signing a large bank takes a while."""
+    QuestionSignature.create_table(safe=True)
+    QuestionBand.create_table(safe=True)
+    forget_signature = (f'DELETE FROM question_signature WHERE {QuestionSignature.questionid.column_name} = old.id; '
+                        f'DELETE FROM question_band WHERE {QuestionBand.questionid.column_name} = old.id;')
+    db.execute_sql(f'CREATE TRIGGER IF NOT EXISTS question_signature_delete AFTER DELETE ON question BEGIN {forget_signature} END')
+    db.execute_sql(f'CREATE TRIGGER IF NOT EXISTS question_signature_update AFTER UPDATE OF question, answercorrect ON question BEGIN {forget_signature} END')
+
+
+def add_response_times():
+    """Migration 9: add result.responsetime, filled for older results from their wall clock timestamps,
+    and have the session summaries, question stats and leaderboard totalled again so their times are in milliseconds too."""
+    if 'responsetime' not in [column.name for column in db.get_columns('result')]:
+        db.execute_sql('ALTER TABLE result ADD COLUMN responsetime INTEGER NOT NULL DEFAULT 0')
+        # the timestamps are seconds, stored as whole or real numbers
+        db.execute_sql('UPDATE result SET responsetime = CAST(ROUND((timestampend - timestampstart) * 1000) AS INTEGER)')
+    return True
+
+
+def move_result_table_aside(result_model):
+    """Rename a result table to result_old, in the same database, and make an empty one in the current layout in its place.
+    The caller copies the rows across and drops result_old."""
+    schema = result_model._meta.schema
+    table = f'"{schema}"."result"' if schema else '"result"'
+    # the indexes move with the renamed table, and have to go before the new table can make its own
+    db.execute_sql(f'ALTER TABLE {table} RENAME TO "result_old"')
+    for index in db.get_indexes('result_old', schema):
+        if not index.name.startswith('sqlite_autoindex'):
+            db.execute_sql(f'DROP INDEX "{schema}"."{index.name}"' if schema else f'DROP INDEX "{index.name}"')
+    result_model.create_table()
+
+
+def compact_result_table(result_model):
+    """Rebuild an old result table, Result or ArchivedResult, in the layout with session keys and answer codes.
+    Every session id in it gets a row in the session table, and every answer that is one of its question's options
+    is stored as that option's code. Results keep their ids. A table already in the new layout is left alone."""
+    schema = result_model._meta.schema
+    table = f'"{schema}"."result"' if schema else '"result"'
+    old_table = f'"{schema}"."result_old"' if schema else '"result_old"'
+    if 'answercode' in [column.name for column in db.get_columns('result', schema)]:
+        return
+
+    # number the sessions in the order they started
+    db.execute_sql(f'INSERT OR IGNORE INTO "main"."session" (sessionid) SELECT sessionid FROM {table} GROUP BY sessionid ORDER BY MIN(id)')
+
+    move_result_table_aside(result_model)
+
+    answer_code = ('CASE old.useranswer WHEN q.answercorrect THEN 0 WHEN q.answerincorrecta THEN 1 '
+                   'WHEN q.answerincorrectb THEN 2 WHEN q.answerincorrectc THEN 3 END')
+    db.execute_sql(f'INSERT INTO {table} (id, timestampstart, timestampend, responsetime, answercode, useranswer, points, iscorrect, sessionid, questionid_id) '
+                   f'SELECT old.id, old.timestampstart, old.timestampend, old.responsetime, {answer_code}, '
+                   f'CASE WHEN {answer_code} IS NULL THEN old.useranswer END, old.points, old.iscorrect, s.id, old.questionid_id '
+                   f'FROM {old_table} AS old '
+                   f'JOIN "main"."session" AS s ON s.sessionid = old.sessionid '
+                   f'LEFT JOIN "main"."question" AS q ON q.id = old.questionid_id')
+    db.execute_sql(f'DROP TABLE {old_table}')
+
+
+def add_session_keys():
+    """Migration 10: add the session table, and rebuild the result table, and the archive's if one is attached,
+    to store each result's session as a session key and its answer as an answer code instead of as text.
+    The space freed is only given back to the file system by vacuum_database() afterwards."""
+    Session.create_table(safe=True)
+    for result_model in get_result_models():
+        compact_result_table(result_model)
+
+
+def reserve_result_ids():
+    """Move the result table's AUTOINCREMENT counter past the highest id in the archive, if one is attached,
+    so a new result can never be given the id of an archived one. The archive keeps results' ids,
+    and quizexporter's checkpoints rely on ids only ever going up."""
+    if ARCHIVE_SCHEMA not in get_attached_schemas():
+        return
+    highest_archived_id = ArchivedResult.select(fn.MAX(ArchivedResult.id)).scalar()
+    if highest_archived_id is None:
+        return
+
+    row = db.execute_sql("SELECT seq FROM sqlite_sequence WHERE name = 'result'").fetchone()
+    if row is None:
+        db.execute_sql("INSERT INTO sqlite_sequence (name, seq) VALUES ('result', ?)", (highest_archived_id,))
+    elif row[0] < highest_archived_id:
+        db.execute_sql("UPDATE sqlite_sequence SET seq = ? WHERE name = 'result'", (highest_archived_id,))
+
+
+def add_result_autoincrement():
+    """Migration 11: rebuild the result table with an AUTOINCREMENT key. A plain INTEGER PRIMARY KEY hands the highest ids
+    out again once their results have been archived, and the archive already holds results with those ids."""
+    (table_sql,) = db.execute_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'result'").fetchone()
+    if 'AUTOINCREMENT' not in table_sql.upper():
+        move_result_table_aside(Result)
+        db.execute_sql('INSERT INTO "result" (id, timestampstart, timestampend, responsetime, answercode, useranswer, points, iscorrect, sessionid, questionid_id) '
+                       'SELECT id, timestampstart, timestampend, responsetime, answercode, useranswer, points, iscorrect, sessionid, questionid_id FROM "result_old"')
+        db.execute_sql('DROP TABLE "result_old"')
+    reserve_result_ids()
+
+
+def add_session_completed():
+    """Migration 12: add session.completed, so rebuilding the leaderboard leaves out sessions that were never finished.
+    Sessions already on the leaderboard are the ones known to be finished, older sessions have nothing to tell and stay off it.
+    The leaderboard is rebuilt, dropping sessions an earlier rebuild ranked without them being finished."""
+    if 'completed' not in [column.name for column in db.get_columns('session')]:
+        db.execute_sql("ALTER TABLE session ADD COLUMN completed INTEGER NOT NULL DEFAULT 0 CHECK (completed IN (0, 1))")
+    db.execute_sql('UPDATE session SET completed = 1 WHERE sessionid IN (SELECT sessionid FROM leaderboard)')
+    return True
+
+
+# (version, step) pairs, applied in order to bring an older database up to date
+MIGRATIONS = [
+    (1, add_lookup_indexes),
+    (2, add_session_summaries),
+    (3, add_export_checkpoints),
+    (4, add_question_stats),
+    (5, add_leaderboard),
+    (6, add_question_version),
+    (7, add_question_search),
+    (8, add_question_signatures),
+    (9, add_response_times),
+    (10, add_session_keys),
+    (11, add_result_autoincrement),
+    (12, add_session_completed),
+]
+
+
+def migrate_schema():
+    """Run every migration step newer than the stored schema version.
+    Each step runs in its own transaction together with the version bump.
+    A step that returns True needs the session summaries, question stats and leaderboard totalled again.
+    They are rebuilt once, in the last step's transaction, because the rebuilds read the results through the current models
+    and an older result table only matches them once every step has run."""
+    current_version = get_schema_version()
+    if current_version > SCHEMA_VERSION:
+        raise QuizDBError(f'Error: Database schema version {current_version} is newer than this program supports ({SCHEMA_VERSION}).')
+
+    rebuild_needed = False
+    for version, migration in MIGRATIONS:
+        if version > current_version:
+            with db.atomic():
+                rebuild_needed = migration() or rebuild_needed
+                if rebuild_needed and version == SCHEMA_VERSION:
+                    rebuild_session_summaries()
+                    rebuild_question_stats()
+                    rebuild_leaderboard()
+                db.pragma('user_version', version)
+            current_version = version
+
+
+def vacuum_database():
+    """Rewrite the database file without its free pages. Rows that were deleted, or tables rebuilt by a migration,
+    leave pages that SQLite reuses but never gives back to the file system until this runs.
+    It needs the database to itself for as long as it takes to copy every table."""
+    db.execute_sql('VACUUM')
+
+
+def explain_query_plan(query):
+    """Returns the lines of SQLite's EXPLAIN QUERY PLAN output for a peewee query."""
+    sql, params = query.sql()
+    cursor = db.execute_sql(f'EXPLAIN QUERY PLAN {sql}', params)
+    return [row[-1] for row in cursor.fetchall()]
+
+
+def get_hot_query_plans():
+    """Returns the query plan for each of the lookups the quiz runs on every session, keyed by name.
+    Used to check that the lookup indexes are actually being used."""
+    hot_queries = {
+        'category_catalog': category_catalog_query(),
+        'last_session': last_session_query(),
+        'results_by_session': results_by_session_query(''),
+        'questions_by_category': questions_by_category_query(''),
+    }
+    return {name: explain_query_plan(query) for name, query in hot_queries.items()}
 
 
 def get_all_questions():
@@ -67,31 +700,169 @@ def get_all_questions():
     return questions_list
 
 
-def get_category_list():
-    """Select all questions from the question table.
-    Put each question category into a set to eliminate duplicates,
-    then into a list for indexing. Return that list."""
-    questions = Question.select()
-    categories_set = set()
-    for question in questions:
-        categories_set.add(question.category)
-    categories_list = []
-    for category in categories_set:
-        categories_list.append(category)
+# how often a cache was asked for a key and had it, or didn't, and how many entries it holds now
+CacheStats = collections.namedtuple('CacheStats', ['hits', 'misses', 'size'])
+
+
+class LRUCache:
+    """A bounded cache that throws away the least recently used entry once it holds max_size,
+    and treats entries older than ttl_seconds as missing. Safe to share between threads.
+    Values are read outside the lock, so a value loaded while clear() runs could be stale.
+    lookup() hands out a generation for that: store() ignores values loaded before the last clear()."""
+
+    def __init__(self, max_size, ttl_seconds):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        # key: (value, monotonic time it expires), least recently used first
+        self.entries = collections.OrderedDict()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, keys):
+        """Returns ({key: value} for each of keys that is cached and not expired, generation to pass to store())."""
+        now = time.monotonic()
+        found = {}
+        with self.lock:
+            for key in keys:
+                entry = self.entries.get(key)
+                if entry is not None and entry[1] > now:
+                    self.entries.move_to_end(key)
+                    found[key] = entry[0]
+                    self.hits += 1
+                else:
+                    if entry is not None:
+                        del self.entries[key]
+                    self.misses += 1
+            return found, self.generation
+
+    def store(self, values, generation):
+        """Cache a dict of key: value, loaded after lookup() returned generation, unless the cache has been cleared since."""
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self.lock:
+            if generation != self.generation:
+                return
+            for key, value in values.items():
+                self.entries[key] = (value, expires_at)
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def get_or_load(self, key, load):
+        """Returns the cached value for key, or calls load(key) and caches what it returns."""
+        found, generation = self.lookup([key])
+        if key in found:
+            return found[key]
+        value = load(key)
+        self.store({key: value}, generation)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.generation += 1
+
+    def get_stats(self):
+        with self.lock:
+            return CacheStats(self.hits, self.misses, len(self.entries))
+
+
+# questions by id, and each category's question ids, for quizzes built without the question bank
+question_cache = LRUCache(db_config.question_cache_size, db_config.question_cache_seconds)
+category_ids_cache = LRUCache(db_config.category_cache_size, db_config.question_cache_seconds)
+
+
+def invalidate_question_caches():
+    """Forget every cached question and category id list so the next lookups read them from the database again."""
+    question_cache.clear()
+    category_ids_cache.clear()
 
-    if not categories_list:
-        raise QuizDBError(f'Error: There are no categories in the database.')
 
+question_change_hooks.append(invalidate_question_caches)
+
+
+def get_question_cache_stats():
+    """Returns a dict of the CacheStats for the question cache, the category id cache and the difficulty pool cache."""
+    return {'questions': question_cache.get_stats(), 'category_ids': category_ids_cache.get_stats(), 'difficulty_pools': difficulty_pools_cache.get_stats()}
+
+
+# the question_version this process's question caches were built at, and the monotonic time it was last read
+_seen_question_version = None
+_question_version_check_time = 0.0
+
+
+def check_question_version():
+    """Run the question change hooks if question_version has moved since this process last read it,
+    so questions changed by another program, like quizadmin import-questions, aren't hidden by the caches.
+    question_version is read at most every db_config.question_version_check_seconds seconds."""
+    global _seen_question_version, _question_version_check_time
+    now = time.monotonic()
+    if now - _question_version_check_time < db_config.question_version_check_seconds:
+        return
+    _question_version_check_time = now
+
+    question_version = get_question_version()
+    if _seen_question_version is not None and question_version != _seen_question_version:
+        notify_questions_changed()
+    _seen_question_version = question_version
+
+
+# process-level cache of {category: number of questions}, built on first use and thrown away
+# by invalidate_category_catalog() whenever questions change, here or, through check_question_version(), elsewhere
+_category_catalog = None
+
+
+def invalidate_category_catalog():
+    """Forget the cached category catalog so the next lookup reads it from the database again."""
+    global _category_catalog
+    _category_catalog = None
+
+
+question_change_hooks.append(invalidate_category_catalog)
+
+
+def category_catalog_query():
+    """Query for each category and its question count. Scans only the question(category, difficulty) index."""
+    return (Question
+            .select(Question.category, fn.COUNT(Question.id))
+            .group_by(Question.category)
+            .order_by(Question.category))
+
+
+def get_category_catalog():
+    """Returns a dict of each category and the number of questions in it.
+    SQLite groups the categories using the question(category, difficulty) index,
+    and the result is cached until questions are inserted, changed or deleted, in this program or another one."""
+    global _category_catalog
+    check_question_version()
+    if _category_catalog is None:
+        catalog = dict(category_catalog_query().tuples())
+
+        if not catalog:
+            raise QuizDBError(f'Error: There are no categories in the database.')
+
+        _category_catalog = catalog
+
+    return dict(_category_catalog)
+
+
+def get_category_list():
+    """Returns a list of every distinct category, for indexing, from the category catalog."""
+    categories_list = list(get_category_catalog())
     return categories_list
 
 
+def questions_by_category_query(category):
+    """Query for all questions under a category. Uses the question(category, difficulty) index."""
+    return Question.select().where(Question.category == category)
+
+
 def get_questions_by_category(category):
     """Select all questions under a category from the Question table.
-    Put each question in a list, then return that list."""
-    questions = Question.select().where(Question.category == category).execute()
-    questions_list = []
-    for question in questions:
-        questions_list.append(question)
+    Put each question in a list, then return that list.
+    The category's ids and its questions come from the question caches, so only questions not cached yet are read."""
+    questions_list = get_questions_by_ids(get_question_ids_by_category(category))
 
     if not questions_list:
         raise QuizDBError(f'Error: There are no questions with category: {category} in the database.')
@@ -99,10 +870,168 @@ def get_questions_by_category(category):
     return questions_list
 
 
+def count_questions_by_category(category):
+    """Returns the number of questions in a category, read from the cached category catalog.
+    Raises error if there are no questions in the category."""
+    question_count = get_category_catalog().get(category, 0)
+
+    if not question_count:
+        raise QuizDBError(f'Error: There are no questions with category: {category} in the database.')
+
+    return question_count
+
+
+def load_question_ids_by_category(category):
+    """Returns a tuple of the id of every question in a category, read from the question(category, difficulty) index."""
+    # plain cursor rows, a category can hold many thousands of ids and peewee's row wrappers would cost more than the query
+    cursor = db.execute(Question.select(Question.id).where(Question.category == category))
+    return tuple(question_id for (question_id,) in cursor.fetchall())
+
+
+def get_question_ids_by_category(category):
+    """Returns the id of every question in a category.
+    Only the question(category, difficulty) index is read, no question rows or models are loaded,
+    and the ids are cached in category_ids_cache until questions change."""
+    return list(category_ids_cache.get_or_load(category, load_question_ids_by_category))
+
+
+# category: {difficulty: list of question ids}, filled a whole category at a time from the question(category, difficulty) index.
+# bounded and expiring like category_ids_cache, and cleared by invalidate_difficulty_pools() whenever questions change
+difficulty_pools_cache = LRUCache(db_config.category_cache_size, db_config.question_cache_seconds)
+
+
+def invalidate_difficulty_pools():
+    """Forget the cached difficulty pools so the next lookup reads them from the database again."""
+    difficulty_pools_cache.clear()
+
+
+question_change_hooks.append(invalidate_difficulty_pools)
+
+
+def load_difficulty_pools(category):
+    """Read the ids of a category's questions, split by difficulty, in one query on the question(category, difficulty) index."""
+    pools = {difficulty: [] for difficulty in range(quizrunner.MIN_DIFFICULTY, quizrunner.MAX_DIFFICULTY + 1)}
+    cursor = db.execute(Question.select(Question.difficulty, Question.id).where(Question.category == category))
+    for difficulty, question_id in cursor.fetchall():
+        pools[difficulty].append(question_id)
+    return pools
+
+
+def get_difficulty_pools(category):
+    """Returns a dict of each difficulty from 1 to 5 and the ids of the questions with it in a category.
+    The pools are cached in difficulty_pools_cache until questions change, in this program or, through check_question_version(), another one.
+    The lists are shared with the cache, so don't change them."""
+    check_question_version()
+    return difficulty_pools_cache.get_or_load(category, load_difficulty_pools)
+
+
+def count_questions_by_difficulty(category):
+    """Returns a dict of each difficulty from 1 to 5 and the number of questions with it in a category."""
+    return {difficulty: len(question_ids) for difficulty, question_ids in get_difficulty_pools(category).items()}
+
+
+def get_question_ids_by_difficulty(category, difficulty):
+    """Returns the id of every question in a category with one difficulty, from the cached difficulty pools."""
+    return list(get_difficulty_pools(category)[difficulty])
+
+
+def sample_question_ids(question_ids, number_of_questions, category):
+    """Returns number_of_questions ids picked uniformly at random from question_ids, in random order.
+    Raises error if there aren't that many. Shared with quizbank, which passes ids from its own pools."""
+    if not (0 < number_of_questions <= len(question_ids)):
+        raise QuizDBError(f'Error: Cannot pick {number_of_questions} questions from {len(question_ids)} in category: {category}.')
+    return random.sample(question_ids, number_of_questions)
+
+
+def sample_difficulty_profile(pools, category, difficulty_profile):
+    """Returns question ids picked at random from a category's difficulty pools for each part of a difficulty profile, in the profile's order.
+    Raises error if a part of the profile asks for more questions than the pools have at those difficulties.
+    Shared with quizbank, which passes its own pools."""
+    sampled_ids = []
+    for number_of_questions, difficulties in difficulty_profile:
+        question_ids = [question_id for difficulty in difficulties for question_id in pools[difficulty]]
+        if not (0 < number_of_questions <= len(question_ids)):
+            raise QuizDBError(f'Error: Cannot pick {number_of_questions} questions from {len(question_ids)} '
+                              f'with difficulty {", ".join(str(difficulty) for difficulty in difficulties)} in category: {category}.')
+        sampled_ids.extend(random.sample(question_ids, number_of_questions))
+    return sampled_ids
+
+
+def pick_question_id(question_ids, exclude_ids=()):
+    """Returns a random id from question_ids that isn't in exclude_ids, or None if every one of them is excluded.
+    Shared with quizbank, which passes ids from its own pools."""
+    # a few random picks almost always miss the handful of questions already asked, without copying the pool
+    for _ in range(8):
+        if len(question_ids) <= len(exclude_ids):
+            break
+        question_id = random.choice(question_ids)
+        if question_id not in exclude_ids:
+            return question_id
+
+    remaining_ids = [question_id for question_id in question_ids if question_id not in exclude_ids]
+    return random.choice(remaining_ids) if remaining_ids else None
+
+
+def get_random_questions_by_difficulty_profile(category, difficulty_profile):
+    """Takes a list of (number of questions, difficulties), like quizrunner.parse_difficulty_profile() returns,
+    and picks that many questions at random from each part of the profile. The questions are returned in the profile's order.
+    Raises error if a part of the profile asks for more questions than the category has at those difficulties."""
+    return get_questions_by_ids(sample_difficulty_profile(get_difficulty_pools(category), category, difficulty_profile))
+
+
+def get_random_question_id_by_difficulty(category, difficulty, exclude_ids=()):
+    """Returns a random question id from a category's pool for one difficulty, skipping any id in exclude_ids,
+    or None if every question at that difficulty is excluded."""
+    return pick_question_id(get_difficulty_pools(category)[difficulty], exclude_ids)
+
+
+def get_questions_by_ids(question_ids):
+    """Select the questions with the given ids, returned in the same order as the ids.
+    Questions are taken from question_cache where they can be, and the rest are read in bulk and cached.
+    The cached questions are shared, so don't change them without saving.
+    Raises error if any id is not in the database."""
+    questions_by_id, generation = question_cache.lookup(question_ids)
+    missing_ids = [question_id for question_id in dict.fromkeys(question_ids) if question_id not in questions_by_id]
+    loaded_questions = {}
+    # keep each IN (...) well under SQLite's limit on bound parameters
+    for batch in chunked(missing_ids, 500):
+        for question in Question.select().where(Question.id.in_(batch)):
+            loaded_questions[question.id] = question
+    question_cache.store(loaded_questions, generation)
+    questions_by_id.update(loaded_questions)
+
+    missing_ids = [question_id for question_id in question_ids if question_id not in questions_by_id]
+    if missing_ids:
+        raise QuizDBError(f'Error: Unable to get questions with ids {missing_ids} from database.')
+
+    return [questions_by_id[question_id] for question_id in question_ids]
+
+
+def get_random_questions_by_category(category, number_of_questions):
+    """Returns number_of_questions questions picked uniformly at random from a category, in random order.
+    Ids are sampled from the cached category ids and only the picked questions are loaded as models.
+    Raises error if the category doesn't have that many questions."""
+    # sampled straight from the cached tuple, without copying it
+    question_ids = category_ids_cache.get_or_load(category, load_question_ids_by_category)
+    return get_questions_by_ids(sample_question_ids(question_ids, number_of_questions, category))
+
+
+def get_question_version():
+    """Returns the question_version count, which changes whenever any question is inserted, updated or deleted.
+    Returns 0 for a database without the question_version row."""
+    question_version = QuestionVersion.get_or_none(QuestionVersion.id == 1)
+    return question_version.version if question_version else 0
+
+
 def get_question_by_id(question_id):
-    """Select one question from the question table
+    """Select one question from the question table, or from question_cache if it was looked up recently.
     Return question or raise error if question not found."""
-    question = Question.get_or_none(id=question_id)
+    found, generation = question_cache.lookup([question_id])
+    question = found.get(question_id)
+    if question is None:
+        question = Question.get_or_none(id=question_id)
+        if question:
+            question_cache.store({question_id: question}, generation)
 
     if not question:
         raise QuizDBError(f'Error: Unable to get question with id {question_id} from database.')
@@ -130,37 +1059,664 @@ def convert_is_correct_to_number(is_correct):
     return is_correct_number
 
 
-def create_question_result(timestamp_start, timestamp_end, user_answer, points, is_correct, session_id, question_id):
-    """Create a new question result, then save that result to the Result table."""
+def bulk_insert(model, fields, rows, replace=False):
+    """Insert many rows of values, one tuple per row in the same order as fields, with a single executemany().
+    peewee writes the INSERT statement once, instead of building SQL for every batch as insert_many() does.
+    With replace, rows that clash with an existing row's key replace it. Call inside a transaction."""
+    insert_query = model.replace_many if replace else model.insert_many
+    insert_sql, _ = insert_query([[None] * len(fields)], fields=fields).sql()
+    cursor = db.cursor()
+    cursor.executemany(insert_sql, rows)
+    return cursor.rowcount
+
+
+def bulk_insert_questions(fields, rows):
+    """Insert many questions in one transaction, like bulk_insert(Question, fields, rows), and add them to the search index.
+    The row by row search trigger is several times slower than indexing the new rows with one INSERT ... SELECT,
+    so the trigger is dropped and put back inside the same transaction, and no other connection ever sees it missing.
+    When the triggers are already dropped for a big load, the rows are left for create_question_indexes() to index.
+    Returns the ids given to the new questions, in the same order as rows."""
+    with db.atomic():
+        # question.id is an INTEGER PRIMARY KEY, so SQLite numbers new rows on from the largest id
+        (last_id,) = db.execute_sql('SELECT coalesce(max(id), 0) FROM question').fetchone()
+        new_ids = range(last_id + 1, last_id + 1 + len(rows))
+
+        if not has_question_search_triggers():
+            bulk_insert(Question, fields, rows)
+            return new_ids
+
+        db.execute_sql('DROP TRIGGER question_search_insert')
+        bulk_insert(Question, fields, rows)
+
+        columns = ', '.join(SEARCH_COLUMNS)
+        db.execute_sql(f'INSERT INTO question_search(rowid, {columns}) SELECT id, {columns} FROM question WHERE id > ?', (last_id,))
+        create_question_search_triggers()
+
+    return new_ids
+
+
+def build_result_row(timestamp_start, timestamp_end, user_answer, points, is_correct, session_id, question_id, response_time=None, answer_code=None):
+    """Returns a dict of Result fields for one answered question, ready to be passed to save_results().
+    The row holds the session id and answer text as given; save_results() swaps them for the keys that are stored.
+    response_time is in milliseconds. Without one, it is worked out from the wall clock timestamps.
+    answer_code is the answer's place in quizrunner.create_answer_list(question), if the caller already knows it."""
     is_correct_number = convert_is_correct_to_number(is_correct)
+    if response_time is None:
+        response_time = round((timestamp_end - timestamp_start) * quizrunner.MILLISECONDS_PER_SECOND)
+
+    return {
+        Result.timestampstart: timestamp_start,
+        Result.timestampend: timestamp_end,
+        Result.responsetime: response_time,
+        Result.answercode: answer_code,
+        Result.useranswer: user_answer,
+        Result.points: points,
+        Result.iscorrect: is_correct_number,
+        Result.session: session_id,
+        Result.questionid: question_id,
+    }
+
+
+def get_answer_code(answer_list, user_answer):
+    """Returns the place of user_answer in answer_list, made by quizrunner.create_answer_list(), or None if it isn't one of the answers."""
+    user_answer = Result.useranswer.db_value(user_answer)
+    for answer_code, answer in enumerate(answer_list):
+        if answer == user_answer:
+            return answer_code
+    return None
+
+
+def get_session_keys(session_ids):
+    """Returns a dict of session id text to its session table key, for each of the given session ids.
+    Session ids not seen before are added, so this runs inside the caller's write transaction."""
+    session_ids = list({Session.sessionid.db_value(session_id) for session_id in session_ids})
+    for batch in chunked(session_ids, 100):
+        Session.insert_many([(session_id,) for session_id in batch], fields=[Session.sessionid]).on_conflict_ignore().execute()
+
+    session_keys = {}
+    for batch in chunked(session_ids, 100):
+        session_keys.update(Session.select(Session.sessionid, Session.id).where(Session.sessionid.in_(batch)).tuples())
+    return session_keys
+
+
+def encode_result_rows(result_rows):
+    """Returns the rows from build_result_row() as they are stored in the result table: the session id swapped for its session key,
+    and the answer swapped for its answer code. The options of questions whose answers have no code yet are read in one query.
+    An answer that isn't one of its question's options, or whose question doesn't exist, keeps its text."""
+    session_keys = get_session_keys(result_row[Result.session] for result_row in result_rows)
+
+    question_ids = list({result_row[Result.questionid] for result_row in result_rows if result_row[Result.answercode] is None})
+    answer_lists = {}
+    for batch in chunked(question_ids, 100):
+        query = Question.select(Question.id, Question.answercorrect, Question.answerincorrecta, Question.answerincorrectb, Question.answerincorrectc)
+        for question_id, *answer_list in query.where(Question.id.in_(batch)).tuples():
+            answer_lists[question_id] = answer_list
+
+    encoded_rows = []
+    for result_row in result_rows:
+        answer_code = result_row[Result.answercode]
+        if answer_code is None:
+            answer_code = get_answer_code(answer_lists.get(result_row[Result.questionid], []), result_row[Result.useranswer])
+        encoded_rows.append({
+            **result_row,
+            Result.answercode: answer_code,
+            Result.useranswer: result_row[Result.useranswer] if answer_code is None else None,
+            Result.session: session_keys[Session.sessionid.db_value(result_row[Result.session])],
+        })
+    return encoded_rows
+
 
-    result = Result(timestampstart = timestamp_start, timestampend = timestamp_end, useranswer = user_answer, points=points, iscorrect = is_correct_number, sessionid = session_id, questionid = question_id)
-    result.save()
+def save_results(result_rows):
+    """Insert a list of result rows, made by build_result_row(), in a single transaction.
+    The write lock is taken up front so that concurrent writers queue on busy_timeout.
+    Returns the number of seconds spent waiting for the write lock."""
+    if not result_rows:
+        return 0.0
+
+    lock_wait_start = time.perf_counter()
+    with db.atomic('IMMEDIATE'):
+        lock_wait_seconds = time.perf_counter() - lock_wait_start
+
+        # one executemany for the whole batch. the values still go through each field's db_value(), as insert_many() would
+        encoded_rows = encode_result_rows(result_rows)
+        fields = list(encoded_rows[0])
+        bulk_insert(Result, fields, [[field.db_value(encoded_row[field]) for field in fields] for encoded_row in encoded_rows])
+
+        update_session_summaries(result_rows)
+        update_question_stats(result_rows)
+
+    return lock_wait_seconds
+
+
+def update_session_summaries(result_rows):
+    """Add a batch of result rows to the running totals in the session_summary table.
+    Rows are totalled per session first, so each session costs one upsert per batch."""
+    summaries = {}
+    first_question_ids = {}
+    for result_row in result_rows:
+        session_id = SessionSummary.sessionid.db_value(result_row[Result.session])
+        earned_points = result_row[Result.points] if result_row[Result.iscorrect] == 1 else 0
+        question_time = result_row[Result.responsetime]
+
+        summary = summaries.get(session_id)
+        if summary is None:
+            first_question_ids[session_id] = result_row[Result.questionid]
+            summary = summaries[session_id] = {
+                SessionSummary.sessionid: session_id,
+                SessionSummary.category: None,
+                SessionSummary.score: 0,
+                SessionSummary.availablepoints: 0,
+                SessionSummary.totaltime: 0,
+                SessionSummary.questioncount: 0,
+                SessionSummary.timestampstart: result_row[Result.timestampstart],
+                SessionSummary.timestampend: result_row[Result.timestampend],
+            }
+        summary[SessionSummary.score] += earned_points
+        summary[SessionSummary.availablepoints] += result_row[Result.points]
+        summary[SessionSummary.totaltime] += question_time
+        summary[SessionSummary.questioncount] += 1
+        summary[SessionSummary.timestampstart] = min(summary[SessionSummary.timestampstart], result_row[Result.timestampstart])
+        summary[SessionSummary.timestampend] = max(summary[SessionSummary.timestampend], result_row[Result.timestampend])
+
+    # look up the category of each session's first question in one query
+    question_ids = list(set(first_question_ids.values()))
+    categories = {}
+    # keep each IN (...) well under SQLite's limit on bound parameters
+    for batch in chunked(question_ids, 500):
+        categories.update(Question.select(Question.id, Question.category).where(Question.id.in_(batch)).tuples())
+    for session_id, question_id in first_question_ids.items():
+        summaries[session_id][SessionSummary.category] = categories.get(question_id)
+
+    for batch in chunked(list(summaries.values()), 100):
+        (SessionSummary
+         .insert_many(batch)
+         .on_conflict(
+             conflict_target=[SessionSummary.sessionid],
+             update={
+                 SessionSummary.category: fn.COALESCE(SessionSummary.category, EXCLUDED.category),
+                 SessionSummary.score: SessionSummary.score + EXCLUDED.score,
+                 SessionSummary.availablepoints: SessionSummary.availablepoints + EXCLUDED.availablepoints,
+                 SessionSummary.totaltime: SessionSummary.totaltime + EXCLUDED.totaltime,
+                 SessionSummary.questioncount: SessionSummary.questioncount + EXCLUDED.questioncount,
+                 SessionSummary.timestampstart: fn.MIN(SessionSummary.timestampstart, EXCLUDED.timestampstart),
+                 SessionSummary.timestampend: fn.MAX(SessionSummary.timestampend, EXCLUDED.timestampend),
+             })
+         .execute())
+
+
+def update_question_stats(result_rows):
+    """Add a batch of result rows to the running totals in the question_stats table.
+    Rows are totalled per question first, so each question costs one upsert per batch."""
+    stats = {}
+    for result_row in result_rows:
+        question_id = result_row[Result.questionid]
+        question_time = result_row[Result.responsetime]
+
+        question_stats = stats.get(question_id)
+        if question_stats is None:
+            question_stats = stats[question_id] = {
+                QuestionStats.questionid: question_id,
+                QuestionStats.attempts: 0,
+                QuestionStats.correctcount: 0,
+                QuestionStats.totaltime: 0,
+                QuestionStats.totaltimesquared: 0,
+                QuestionStats.lastasked: result_row[Result.timestampend],
+            }
+        question_stats[QuestionStats.attempts] += 1
+        question_stats[QuestionStats.correctcount] += result_row[Result.iscorrect]
+        question_stats[QuestionStats.totaltime] += question_time
+        question_stats[QuestionStats.totaltimesquared] += question_time ** 2
+        question_stats[QuestionStats.lastasked] = max(question_stats[QuestionStats.lastasked], result_row[Result.timestampend])
+
+    for batch in chunked(list(stats.values()), 100):
+        (QuestionStats
+         .insert_many(batch)
+         .on_conflict(
+             conflict_target=[QuestionStats.questionid],
+             update={
+                 QuestionStats.attempts: QuestionStats.attempts + EXCLUDED.attempts,
+                 QuestionStats.correctcount: QuestionStats.correctcount + EXCLUDED.correctcount,
+                 QuestionStats.totaltime: QuestionStats.totaltime + EXCLUDED.totaltime,
+                 QuestionStats.totaltimesquared: QuestionStats.totaltimesquared + EXCLUDED.totaltimesquared,
+                 QuestionStats.lastasked: fn.MAX(fn.COALESCE(QuestionStats.lastasked, EXCLUDED.lastasked), EXCLUDED.lastasked),
+             })
+         .execute())
+
+
+def create_question_result(timestamp_start, timestamp_end, user_answer, points, is_correct, session_id, question_id, response_time=None, answer_code=None):
+    """Create a new question result, then save that result to the Result table."""
+    result_row = build_result_row(timestamp_start, timestamp_end, user_answer, points, is_correct, session_id, question_id, response_time, answer_code)
+    save_results([result_row])
+
+
+class ResultFlusher:
+    """One background thread that flushes every watched ResultWriter whose batch has waited flush_seconds,
+    so a quiz taker who stops answering doesn't leave results unsaved. It sleeps until the next batch is due,
+    and opens a single connection only while it has something to write."""
+
+    def __init__(self):
+        self.writers = set()
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def watch(self, result_writer):
+        """Flush result_writer once its queued results have waited flush_seconds, unless it is flushed before then."""
+        with self.condition:
+            self.writers.add(result_writer)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='result-flusher', daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def forget(self, result_writer):
+        with self.condition:
+            self.writers.discard(result_writer)
+
+    def get_due_writers(self):
+        """Wait until at least one watched writer's batch is due, and return those that are."""
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                due_writers = [result_writer for result_writer in self.writers if result_writer.is_flush_due(now)]
+                if due_writers:
+                    return due_writers
+                due_times = [result_writer.last_flush_time + result_writer.flush_seconds for result_writer in self.writers]
+                self.condition.wait(min(due_times) - now if due_times else None)
+
+    def run(self):
+        while True:
+            due_writers = self.get_due_writers()
+            with db.connection_context():
+                for result_writer in due_writers:
+                    try:
+                        result_writer.flush()
+                    except (DatabaseError, QuizDBError):
+                        # the results stay queued and watched, for the writer's own next flush or this thread's next round
+                        pass
+
+
+# the flusher shared by every ResultWriter in this process
+result_flusher = ResultFlusher()
+
+
+class ResultWriter:
+    """Collects the results for one quiz session and saves them in batches instead of one commit per answer.
+    Results are flushed once batch_size are waiting or flush_seconds have passed since the last flush,
+    and always when the writer is closed. Use it as a context manager so the last batch is never forgotten.
+    With background_flush, result_flusher saves a batch that has waited flush_seconds even if no more answers arrive,
+    so a crash loses at most the answers from the last flush_seconds, and never more than batch_size - 1 of them.
+    Without it, the caller schedules those flushes itself, like quizserver does on its event loop."""
+
+    def __init__(self, session_id, batch_size=None, flush_seconds=None, background_flush=True):
+        self.session_id = session_id
+        self.batch_size = batch_size if batch_size is not None else db_config.result_batch_size
+        self.flush_seconds = flush_seconds if flush_seconds is not None else db_config.result_flush_seconds
+        self.background_flush = background_flush
+        self.pending_rows = []
+        self.last_flush_time = time.monotonic()
+        # guards pending_rows, which the caller and result_flusher can both swap out. the write itself runs without it
+        self.lock = threading.Lock()
+        # how many flushes wrote something, and how long they waited for the write lock in total
+        self.flush_count = 0
+        self.lock_wait_seconds = 0.0
+
+    def add(self, timestamp_start, timestamp_end, user_answer, points, is_correct, question_id, response_time=None, answer_code=None, autoflush=True):
+        """Queue one answered question, flushing if the size or time threshold has been reached.
+        With autoflush=False the result is only queued, and the caller checks is_flush_due() itself,
+        so an event loop can queue without blocking and run just the flush on a database thread."""
+        result_row = build_result_row(timestamp_start, timestamp_end, user_answer, points, is_correct, self.session_id, question_id, response_time, answer_code)
+        with self.lock:
+            self.pending_rows.append(result_row)
+
+        if autoflush and self.is_flush_due():
+            self.flush()
+        elif self.background_flush:
+            result_flusher.watch(self)
+
+    def is_flush_due(self, now=None):
+        """Returns True once batch_size results are waiting or flush_seconds have passed since the last flush."""
+        waited_seconds = (now if now is not None else time.monotonic()) - self.last_flush_time
+        return len(self.pending_rows) >= self.batch_size or waited_seconds >= self.flush_seconds
+
+    def flush(self):
+        """Save every queued result in one transaction. Results queued while it is being written wait for the next flush."""
+        with self.lock:
+            result_rows = self.pending_rows
+            self.pending_rows = []
+            self.last_flush_time = time.monotonic()
+            result_flusher.forget(self)
+        if not result_rows:
+            return
+
+        try:
+            lock_wait_seconds = save_results(result_rows)
+        except Exception:
+            # put them back in front of anything queued since, so a later flush can still save them
+            with self.lock:
+                self.pending_rows[:0] = result_rows
+            if self.background_flush:
+                result_flusher.watch(self)
+            raise
+        with self.lock:
+            self.lock_wait_seconds += lock_wait_seconds
+            self.flush_count += 1
+
+    def close(self):
+        """Save anything still queued. Call at the end of the session."""
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # save what was answered even if the session ended with an error
+        self.close()
+
+
+def last_session_query():
+    """Query for the most recent result. Walks the result(timestampend) index backwards instead of sorting the table."""
+    return Result.select(Session.sessionid).join(Session).order_by(Result.timestampend.desc()).limit(1)
 
 
 def get_last_session_id():
-    """Gets all results in descending order by most recent timestamp.
-    Selects the first result from that list, and takes the session ID from that result. 
+    """Gets the most recent result by timestamp, and takes the session ID from that result. 
     Returns session ID."""
-    results = Result.select().order_by(Result.timestampend.desc())
+    first_result = last_session_query().first()
 
-    if not results:
+    if not first_result:
         raise QuizDBError(f'Error: There are no results saved in the database.')
 
-    first_result = results[0]
-    session_id = first_result.sessionid
+    session_id = first_result.session.sessionid
     return session_id
+
+
+def results_by_session_query(session_id):
+    """Query for all results in a session, with their session and question rows. Finds the session's key
+    in the session(sessionid) index, then its results in the result(sessionid) index."""
+    return (Result
+            .select(Result, Session, Question)
+            .join(Session)
+            .join_from(Result, Question, JOIN.LEFT_OUTER)
+            .where(Session.sessionid == session_id))
     
 
 def get_results_by_session(session_id):
     """Select all results by session id from the Result table.
     Put each result in a list, then return that list."""
-    results = Result.select().where(Result.sessionid == session_id)
+    results = results_by_session_query(session_id)
     results_list = []
     for result in results:
         results_list.append(result)
 
-    if not results:
+    if not results_list:
         raise QuizDBError(f'Error: There are no results saved in the database for session id: {session_id}.')
 
-    return results_list
\ No newline at end of file
+    return results_list
+
+
+def get_session_summary(session_id):
+    """Returns the session_summary row for a session.
+    Raises error if the session has no results saved."""
+    summary = SessionSummary.get_or_none(SessionSummary.sessionid == session_id)
+
+    if not summary:
+        raise QuizDBError(f'Error: There is no summary saved in the database for session id: {session_id}.')
+
+    return summary
+
+
+def session_totals_query(result_model):
+    """Query for one row of session_summary values per session in a result table, Result or ArchivedResult."""
+    earned_points = Case(None, [(result_model.iscorrect == 1, result_model.points)], 0)
+    return (result_model
+            .select(
+                Session.sessionid,
+                fn.MIN(Question.category),
+                fn.SUM(earned_points),
+                fn.SUM(result_model.points),
+                fn.SUM(result_model.responsetime),
+                fn.COUNT(result_model.id),
+                fn.MIN(result_model.timestampstart),
+                fn.MAX(result_model.timestampend))
+            .join(Session, on=(result_model.session == Session.id))
+            .join_from(result_model, Question, JOIN.LEFT_OUTER, on=(result_model.questionid == Question.id))
+            .group_by(result_model.session))
+
+
+def rebuild_session_summaries():
+    """Throw away the session_summary table and total it again from every row in the Result table,
+    and in the archive if there is one. Returns the number of sessions summarized."""
+    fields = [
+        SessionSummary.sessionid,
+        SessionSummary.category,
+        SessionSummary.score,
+        SessionSummary.availablepoints,
+        SessionSummary.totaltime,
+        SessionSummary.questioncount,
+        SessionSummary.timestampstart,
+        SessionSummary.timestampend,
+    ]
+
+    result_models = get_result_models()
+    with db.atomic():
+        SessionSummary.delete().execute()
+        for result_model in result_models:
+            # sessions are archived whole, so a session already summarized is one left over from an interrupted archive run
+            SessionSummary.insert_from(session_totals_query(result_model), fields).on_conflict_ignore().execute()
+        session_count = SessionSummary.select().count()
+
+    return session_count
+
+
+def get_export_checkpoint(name):
+    """Returns the last result id exported under a checkpoint name, or 0 if that export has never run."""
+    checkpoint = ExportCheckpoint.get_or_none(ExportCheckpoint.name == name)
+
+    if not checkpoint:
+        return 0
+
+    return checkpoint.lastresultid
+
+
+def save_export_checkpoint(name, last_result_id):
+    """Record the last result id written by a named export."""
+    (ExportCheckpoint
+     .insert(name=name, lastresultid=last_result_id, exportedat=datetime.datetime.now())
+     .on_conflict(
+         conflict_target=[ExportCheckpoint.name],
+         update={ExportCheckpoint.lastresultid: EXCLUDED.lastresultid, ExportCheckpoint.exportedat: EXCLUDED.exportedat})
+     .execute())
+
+
+def question_totals_query(result_model):
+    """Query for one row of question_stats values per question in a result table, Result or ArchivedResult."""
+    question_time = result_model.responsetime
+    return (result_model
+            .select(
+                result_model.questionid,
+                fn.COUNT(result_model.id),
+                fn.SUM(result_model.iscorrect),
+                fn.SUM(question_time),
+                fn.SUM(question_time * question_time),
+                fn.MAX(result_model.timestampend))
+            .group_by(result_model.questionid))
+
+
+def rebuild_question_stats():
+    """Throw away the question_stats table and total it again from every row in the Result table,
+    and in the archive if there is one. Returns the number of questions with stats."""
+    fields = [
+        QuestionStats.questionid,
+        QuestionStats.attempts,
+        QuestionStats.correctcount,
+        QuestionStats.totaltime,
+        QuestionStats.totaltimesquared,
+        QuestionStats.lastasked,
+    ]
+
+    result_models = get_result_models()
+    with db.atomic():
+        QuestionStats.delete().execute()
+        for result_model in result_models:
+            # a question's results can be split between the result table and the archive, so later totals are added on
+            (QuestionStats
+             .insert_from(question_totals_query(result_model), fields)
+             .on_conflict(
+                 conflict_target=[QuestionStats.questionid],
+                 update={
+                     QuestionStats.attempts: QuestionStats.attempts + EXCLUDED.attempts,
+                     QuestionStats.correctcount: QuestionStats.correctcount + EXCLUDED.correctcount,
+                     QuestionStats.totaltime: QuestionStats.totaltime + EXCLUDED.totaltime,
+                     QuestionStats.totaltimesquared: QuestionStats.totaltimesquared + EXCLUDED.totaltimesquared,
+                     QuestionStats.lastasked: fn.MAX(QuestionStats.lastasked, EXCLUDED.lastasked),
+                 })
+             .execute())
+        question_count = QuestionStats.select().count()
+
+    return question_count
+
+
+def question_stats_by_category_query(category):
+    """Query for the stats of every asked question in a category, with the question joined in."""
+    return (QuestionStats
+            .select(QuestionStats, Question)
+            .join(Question)
+            .where(Question.category == category, QuestionStats.attempts > 0))
+
+
+def get_most_missed_questions(category, limit=10):
+    """Returns the question stats with the highest share of wrong answers in a category, most attempted first on ties."""
+    # cast so SQLite divides as real numbers, not integers
+    miss_rate = Cast(QuestionStats.attempts - QuestionStats.correctcount, 'REAL') / QuestionStats.attempts
+    query = question_stats_by_category_query(category).order_by(miss_rate.desc(), QuestionStats.attempts.desc()).limit(limit)
+    return list(query)
+
+
+def get_slowest_questions(category, limit=10):
+    """Returns the question stats with the longest mean answer time in a category."""
+    mean_time = Cast(QuestionStats.totaltime, 'REAL') / QuestionStats.attempts
+    query = question_stats_by_category_query(category).order_by(mean_time.desc(), QuestionStats.attempts.desc()).limit(limit)
+    return list(query)
+
+
+def get_never_asked_questions(category, limit=10):
+    """Returns questions in a category that have never been answered."""
+    query = (Question
+             .select()
+             .join(QuestionStats, JOIN.LEFT_OUTER)
+             .where(Question.category == category, QuestionStats.questionid.is_null())
+             .order_by(Question.id)
+             .limit(limit))
+    return list(query)
+
+
+def build_search_query(search_text):
+    """Turns text typed by a person into an FTS5 query that matches questions containing every word.
+    Each word is quoted, so punctuation and FTS5 keywords like OR or NOT are searched for as plain text,
+    and the last word also matches longer words starting with it, so a half typed word still finds results.
+    Returns None if the text has no words in it."""
+    words = re.findall(r'\w+', search_text)
+    if not words:
+        return None
+
+    quoted_words = [f'"{word}"' for word in words]
+    quoted_words[-1] += ' *'
+    return ' '.join(quoted_words)
+
+
+def search_questions(search_text, category=None, limit=20):
+    """Returns up to limit questions whose question or answer text contains every word in search_text, best match first.
+    Matches are ranked by bm25 using SEARCH_COLUMN_WEIGHTS, and can be narrowed to one category.
+    Each question has a rank attribute, where lower is a better match."""
+    search_query = build_search_query(search_text)
+    if search_query is None:
+        return []
+
+    rank = QuestionSearch.bm25(*SEARCH_COLUMN_WEIGHTS)
+    query = (Question
+             .select(Question, rank.alias('rank'))
+             .join(QuestionSearch, on=(QuestionSearch.rowid == Question.id))
+             .where(QuestionSearch.match(search_query)))
+    if category is not None:
+        # filter on the search index's copy of the category, so SQLite starts from the matches instead of the whole category
+        query = query.where(QuestionSearch.category == category)
+
+    return list(query.order_by(rank).limit(limit))
+
+
+def leaderboard_ranking():
+    """Returns the ORDER BY for leaderboards: best percentage, then best score, then fastest time."""
+    return [LeaderboardEntry.percentage.desc(), LeaderboardEntry.score.desc(), LeaderboardEntry.totaltime]
+
+
+def record_completed_session(session_id):
+    """Mark a finished quiz session completed and add it to the leaderboard, from its session summary.
+    Called once a session has answered every question."""
+    summary = get_session_summary(session_id)
+    with db.atomic():
+        Session.update(completed=1).where(Session.sessionid == summary.sessionid).execute()
+        if not summary.availablepoints:
+            return
+
+        percentage = quizrunner.calculate_score_percentage(summary.score, summary.availablepoints)
+        (LeaderboardEntry
+         .replace(sessionid=summary.sessionid, category=summary.category, percentage=percentage,
+                  score=summary.score, totaltime=summary.totaltime, completedat=summary.timestampend)
+         .execute())
+
+
+def record_completed_sessions(session_ids):
+    """Mark many finished quiz sessions completed and add them to the leaderboard at once, like record_completed_session(),
+    with their summaries read in bulk and the entries written with one executemany. Sessions with no summary are skipped."""
+    fields = [LeaderboardEntry.sessionid, LeaderboardEntry.category, LeaderboardEntry.percentage, LeaderboardEntry.score, LeaderboardEntry.totaltime, LeaderboardEntry.completedat]
+    session_ids = [SessionSummary.sessionid.db_value(session_id) for session_id in session_ids]
+    rows = []
+    # keep each IN (...) well under SQLite's limit on bound parameters
+    for batch in chunked(session_ids, 500):
+        summaries = (SessionSummary
+                     .select(SessionSummary.sessionid, SessionSummary.category, SessionSummary.score, SessionSummary.availablepoints, SessionSummary.totaltime, SessionSummary.timestampend)
+                     .where(SessionSummary.sessionid.in_(batch), SessionSummary.availablepoints > 0)
+                     .tuples())
+        for session_id, category, score, available_points, total_time, timestamp_end in summaries:
+            percentage = quizrunner.calculate_score_percentage(score, available_points)
+            rows.append((session_id, category, percentage, score, total_time, timestamp_end))
+
+    with db.atomic():
+        for batch in chunked(session_ids, 500):
+            Session.update(completed=1).where(Session.sessionid.in_(batch)).execute()
+        bulk_insert(LeaderboardEntry, fields, rows, replace=True)
+
+
+def get_leaderboard(category=None, limit=100):
+    """Returns the best limit leaderboard entries, for one category or across every category.
+    Reads the top of a ranking index, so it costs the same however many sessions there are."""
+    query = LeaderboardEntry.select()
+    if category is not None:
+        query = query.where(LeaderboardEntry.category == category)
+    return list(query.order_by(*leaderboard_ranking()).limit(limit))
+
+
+def rebuild_leaderboard(chunk_size=10000):
+    """Throw away the leaderboard and rank every completed session in the session_summary table again.
+    Sessions left before their last question are never ranked, just like record_completed_session() skips them.
+    Returns the number of sessions on the leaderboard."""
+    fields = [LeaderboardEntry.sessionid, LeaderboardEntry.category, LeaderboardEntry.percentage, LeaderboardEntry.score, LeaderboardEntry.totaltime, LeaderboardEntry.completedat]
+    summaries = (SessionSummary
+                 .select(SessionSummary.sessionid, SessionSummary.category, SessionSummary.score, SessionSummary.availablepoints, SessionSummary.totaltime, SessionSummary.timestampend)
+                 .join(Session, on=(Session.sessionid == SessionSummary.sessionid))
+                 .where(SessionSummary.availablepoints > 0, Session.completed == 1)
+                 .tuples())
+
+    with db.atomic():
+        LeaderboardEntry.delete().execute()
+        rows = []
+        for session_id, category, score, available_points, total_time, timestamp_end in summaries.iterator():
+            percentage = quizrunner.calculate_score_percentage(score, available_points)
+            rows.append((session_id, category, percentage, score, total_time, timestamp_end))
+            if len(rows) >= chunk_size:
+                bulk_insert(LeaderboardEntry, fields, rows)
+                rows = []
+        bulk_insert(LeaderboardEntry, fields, rows)
+        entry_count = LeaderboardEntry.select().count()
+
+    return entry_count
\ No newline at end of file
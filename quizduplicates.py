@@ -0,0 +1,404 @@
+import collections
+import hashlib
+import itertools
+import logging
+import os
+import random
+import re
+import struct
+import unicodedata
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from peewee import JOIN
+from peewee import chunked
+from peewee import fn
+
+import quizdatabase
+from quizdatabase import Question
+from quizdatabase import QuestionBand
+from quizdatabase import QuestionSignature
+
+
+# questions are compared as sets of their words, leaving out these common ones,
+# so rewording or reordering a question still leaves most of the set the same
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'did', 'do', 'does', 'for', 'from', 'in', 'is', 'it', 'its', 'of', 'on', 'or',
+    'our', 's', 'that', 'the', 'their', 'these', 'this', 'those', 'to', 'was', 'were', 'what', 'which', 'who', 'with', 'your',
+}
+
+# MinHash values per question, split into BAND_COUNT bands for locality sensitive hashing.
+# two questions become candidates if every value in any one band is equal, which happens 99% of the time at
+# 70% similarity and under 10% of the time at 25%, and candidates are then checked against NEAR_DUPLICATE_THRESHOLD
+SIGNATURE_SIZE = 64
+BAND_COUNT = 16
+ROWS_PER_BAND = SIGNATURE_SIZE // BAND_COUNT
+NEAR_DUPLICATE_THRESHOLD = 0.7
+
+# the MinHash hash functions are (a * shingle + b) mod 2**32 with odd a, which is a permutation of 32 bit numbers.
+# the seed is fixed so signatures stored by different runs and processes can be compared
+HASH_MASK = 0xFFFFFFFF
+_parameter_generator = random.Random(2905)
+HASH_PARAMETERS = [(_parameter_generator.randrange(1, 2 ** 32) | 1, _parameter_generator.randrange(2 ** 32)) for _ in range(SIGNATURE_SIZE)]
+MINHASH_FORMAT = struct.Struct(f'<{SIGNATURE_SIZE}I')
+
+# the same words turn up in question after question, so their hashed values are kept, packed,
+# and the cache is simply emptied when it reaches this many shingles
+SHINGLE_CACHE_SIZE = 50000
+_shingle_cache = {}
+
+# MinHash estimates are off by a few percent, so the batch job only drops candidate pairs estimated this far below the threshold
+# before working out their exact similarity
+MINHASH_SLACK = 0.15
+
+# a band shared by more than this many questions says they follow a template, like 'In which year did ... happen?',
+# rather than that they are duplicates, and comparing every pair in it would take time quadratic in its size.
+# such buckets are skipped, and logged, and a question is compared with at most MAX_CANDIDATES others at a time
+MAX_BUCKET_SIZE = 200
+MAX_CANDIDATES = 50
+
+logger = logging.getLogger(__name__)
+
+# what sign_question() works out for a question. words is the set of words compared to other questions
+QuestionFingerprint = collections.namedtuple('QuestionFingerprint', ['text_hash', 'words', 'minhash', 'band_keys'])
+
+# a question that is a duplicate of another. similarity is the share of their words in common, 1.0 for exact duplicates
+DuplicateMatch = collections.namedtuple('DuplicateMatch', ['question_id', 'duplicate_id', 'similarity'])
+
+
+def normalize_text(text):
+    """Lower case the text, strip accents and punctuation and squeeze the spaces, so small differences in writing don't count."""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(character for character in text if not unicodedata.combining(character))
+    return ' '.join(re.findall(r'\w+', text.casefold()))
+
+
+def hash_to_integer(data):
+    """Returns a stable signed 64 bit hash of some bytes, which fits in a SQLite INTEGER."""
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big', signed=True)
+
+
+def get_words(normalized_text):
+    """Returns the set of words in the text that aren't STOP_WORDS.
+    Text made only of stop words uses all of its words, so every question has at least one word."""
+    words = normalized_text.split()
+    return frozenset([word for word in words if word not in STOP_WORDS] or words or [normalized_text])
+
+
+def get_shingles(words):
+    """Returns the crc32 hash of each word, which is what the MinHash functions are applied to."""
+    return {zlib.crc32(word.encode()) for word in words}
+
+
+def hash_shingle(shingle):
+    """Returns the shingle's value under every MinHash hash function, packed into bytes, using the shingle cache."""
+    packed_values = _shingle_cache.get(shingle)
+    if packed_values is None:
+        if len(_shingle_cache) >= SHINGLE_CACHE_SIZE:
+            _shingle_cache.clear()
+        packed_values = MINHASH_FORMAT.pack(*[(a * shingle + b) & HASH_MASK for a, b in HASH_PARAMETERS])
+        _shingle_cache[shingle] = packed_values
+    return packed_values
+
+
+def compute_minhash(shingles):
+    """Returns the MinHash signature of a set of shingles: the smallest value of any shingle under each hash function.
+    The share of values two signatures have in common estimates the share of shingles the texts have in common."""
+    shingle_values = [MINHASH_FORMAT.unpack(hash_shingle(shingle)) for shingle in shingles]
+    return list(map(min, zip(*shingle_values)))
+
+
+def get_band_keys(minhash):
+    """Returns one key per band of the signature, different for each band number, for the question_band table."""
+    band_keys = []
+    for band in range(BAND_COUNT):
+        band_values = minhash[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        band_keys.append(hash_to_integer(struct.pack(f'<{ROWS_PER_BAND + 1}I', band, *band_values)))
+    return band_keys
+
+
+def get_similarity(words, other_words):
+    """Returns the Jaccard similarity of two word sets: the share of all their words that they have in common."""
+    return len(words & other_words) / len(words | other_words)
+
+
+def estimate_similarity(minhash, other_minhash):
+    """Returns the share of MinHash values two signatures have in common, from 0 to 1."""
+    return sum(1 for value, other_value in zip(minhash, other_minhash) if value == other_value) / SIGNATURE_SIZE
+
+
+def sign_question(question_text, correct_answer):
+    """Returns the QuestionFingerprint of a question. The question and its correct answer are used together,
+    so the same wording with a different answer, like 'Which of these is a fruit?', isn't a duplicate."""
+    normalized_text = normalize_text(f'{question_text} {correct_answer}')
+    words = get_words(normalized_text)
+    minhash = compute_minhash(get_shingles(words))
+    return QuestionFingerprint(hash_to_integer(normalized_text.encode()), words, minhash, get_band_keys(minhash))
+
+
+def sign_question_rows(rows):
+    """Returns (question id, QuestionFingerprint) for each (question id, question text, correct answer) row.
+    Runs in the batch job's worker processes."""
+    return [(question_id, sign_question(question_text, correct_answer)) for question_id, question_text, correct_answer in rows]
+
+
+def save_fingerprints(question_ids, fingerprints):
+    """Store the fingerprints of questions already in the question table. Call inside a transaction."""
+    signature_rows = [(question_id, fingerprint.text_hash, MINHASH_FORMAT.pack(*fingerprint.minhash))
+                      for question_id, fingerprint in zip(question_ids, fingerprints)]
+    band_rows = [(band_key, question_id) for question_id, fingerprint in zip(question_ids, fingerprints) for band_key in fingerprint.band_keys]
+
+    quizdatabase.bulk_insert(QuestionSignature, [QuestionSignature.questionid, QuestionSignature.texthash, QuestionSignature.minhash], signature_rows)
+    quizdatabase.bulk_insert(QuestionBand, [QuestionBand.bandkey, QuestionBand.questionid], band_rows)
+
+
+def get_minhashes(question_ids):
+    """Returns a dict of question id to stored MinHash signature for the given questions that have one."""
+    minhashes = {}
+    for batch in chunked(question_ids, 500):
+        query = QuestionSignature.select(QuestionSignature.questionid, QuestionSignature.minhash).where(QuestionSignature.questionid.in_(batch))
+        for question_id, packed_minhash in query.tuples():
+            minhashes[question_id] = MINHASH_FORMAT.unpack(packed_minhash)
+    return minhashes
+
+
+def get_question_words(question_ids):
+    """Returns a dict of question id to the word set of each of the given questions, worked out from their text."""
+    question_words = {}
+    for batch in chunked(question_ids, 500):
+        query = Question.select(Question.id, Question.question, Question.answercorrect).where(Question.id.in_(batch))
+        for question_id, question_text, correct_answer in query.tuples():
+            question_words[question_id] = get_words(normalize_text(f'{question_text} {correct_answer}'))
+    return question_words
+
+
+def get_candidates(band_keys, ids_by_band_key):
+    """Returns the candidates in the buckets of a question's band keys, at most MAX_CANDIDATES of them,
+    those sharing the most bands with the question first, as they are the likeliest to be similar."""
+    shared_band_counts = collections.Counter(candidate for band_key in band_keys for candidate in ids_by_band_key.get(band_key, []))
+    return [candidate for candidate, _ in shared_band_counts.most_common(MAX_CANDIDATES)]
+
+
+def find_saved_duplicates(fingerprints, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """For each fingerprint, returns the saved question it duplicates best and the similarity, or None.
+    The whole list is looked up with a few IN (...) queries on the texthash and bandkey indexes,
+    so the cost depends on the number of fingerprints and candidates, not on the size of the question bank.
+    Buckets of more than MAX_BUCKET_SIZE saved questions are skipped, and each fingerprint has at most MAX_CANDIDATES candidates.
+    Candidates are checked with their exact similarity, as short questions make MinHash estimates rough."""
+    fingerprints = list(fingerprints)
+    ids_by_text_hash = {}
+    for batch in chunked({fingerprint.text_hash for fingerprint in fingerprints}, 500):
+        query = QuestionSignature.select(QuestionSignature.texthash, QuestionSignature.questionid).where(QuestionSignature.texthash.in_(batch))
+        for text_hash, question_id in query.tuples():
+            ids_by_text_hash.setdefault(text_hash, question_id)
+
+    ids_by_band_key = collections.defaultdict(list)
+    skipped_count = 0
+    for batch in chunked({band_key for fingerprint in fingerprints for band_key in fingerprint.band_keys}, 500):
+        size_query = (QuestionBand
+                      .select(QuestionBand.bandkey, fn.COUNT(QuestionBand.questionid))
+                      .where(QuestionBand.bandkey.in_(batch))
+                      .group_by(QuestionBand.bandkey))
+        band_keys = []
+        for band_key, bucket_size in size_query.tuples():
+            if bucket_size > MAX_BUCKET_SIZE:
+                skipped_count += 1
+            else:
+                band_keys.append(band_key)
+        if band_keys:
+            query = QuestionBand.select(QuestionBand.bandkey, QuestionBand.questionid).where(QuestionBand.bandkey.in_(band_keys))
+            for band_key, question_id in query.tuples():
+                ids_by_band_key[band_key].append(question_id)
+    if skipped_count:
+        logger.warning('Skipped %d LSH buckets of more than %d saved questions while looking for duplicates.', skipped_count, MAX_BUCKET_SIZE)
+
+    candidates = [get_candidates(fingerprint.band_keys, ids_by_band_key) for fingerprint in fingerprints]
+    question_words = get_question_words(list({question_id for question_ids in candidates for question_id in question_ids}))
+
+    matches = []
+    for fingerprint, candidate_ids in zip(fingerprints, candidates):
+        if fingerprint.text_hash in ids_by_text_hash:
+            matches.append((ids_by_text_hash[fingerprint.text_hash], 1.0))
+            continue
+
+        best_match = None
+        for question_id in candidate_ids:
+            if question_id not in question_words:
+                continue
+            similarity = get_similarity(fingerprint.words, question_words[question_id])
+            if similarity >= threshold and (best_match is None or similarity > best_match[1]):
+                best_match = (question_id, similarity)
+        matches.append(best_match)
+
+    return matches
+
+
+def find_duplicates_of(question_text, correct_answer, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """Returns (question id, similarity) for the saved question that best duplicates this one, or None.
+    Only signed questions are found, see find_duplicates()."""
+    return find_saved_duplicates([sign_question(question_text, correct_answer)], threshold)[0]
+
+
+class DuplicateChecker:
+    """Checks chunks of questions being imported against the questions already saved and against each other.
+    Use check_chunk() on each chunk before saving it, then save_chunk() with the new question ids once it is saved."""
+
+    def __init__(self, threshold=NEAR_DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self.pending_fingerprints = []
+
+    def check_chunk(self, questions):
+        """Takes a list of validated question dicts. Returns a reason for each question, like validate_question_row() does:
+        None for a question to keep, or why it is a duplicate. The kept questions' fingerprints wait for save_chunk()."""
+        fingerprints = [sign_question(question['question'], question['answercorrect']) for question in questions]
+        saved_matches = find_saved_duplicates(fingerprints, self.threshold)
+
+        # questions earlier in the same chunk aren't saved yet, so they are matched in memory the same way
+        kept_text_hashes = set()
+        kept_fingerprints = []
+        kept_by_band_key = collections.defaultdict(list)
+        reasons = []
+        self.pending_fingerprints = []
+        for fingerprint, saved_match in zip(fingerprints, saved_matches):
+            if saved_match is not None:
+                question_id, similarity = saved_match
+                reasons.append(f'duplicate of question {question_id} ({similarity * 100:.0f}% similar)')
+                continue
+
+            if fingerprint.text_hash in kept_text_hashes:
+                reasons.append('duplicate of an earlier row (100% similar)')
+                continue
+
+            similarity = max([get_similarity(fingerprint.words, kept_fingerprints[kept_index].words)
+                              for kept_index in get_candidates(fingerprint.band_keys, kept_by_band_key)], default=0.0)
+            if similarity >= self.threshold:
+                reasons.append(f'duplicate of an earlier row ({similarity * 100:.0f}% similar)')
+                continue
+
+            reasons.append(None)
+            kept_text_hashes.add(fingerprint.text_hash)
+            for band_key in fingerprint.band_keys:
+                # a full bucket stops growing, so template-like rows aren't each compared with every earlier one
+                if len(kept_by_band_key[band_key]) < MAX_BUCKET_SIZE:
+                    kept_by_band_key[band_key].append(len(kept_fingerprints))
+            kept_fingerprints.append(fingerprint)
+            self.pending_fingerprints.append(fingerprint)
+
+        full_count = sum(1 for kept_indexes in kept_by_band_key.values() if len(kept_indexes) >= MAX_BUCKET_SIZE)
+        if full_count:
+            logger.warning('%d LSH buckets reached %d rows in one chunk, later rows were only compared with the first %d.',
+                           full_count, MAX_BUCKET_SIZE, MAX_BUCKET_SIZE)
+        return reasons
+
+    def save_chunk(self, question_ids):
+        """Store the fingerprints of the questions kept by the last check_chunk(), now saved with question_ids."""
+        with quizdatabase.db.atomic():
+            save_fingerprints(question_ids, self.pending_fingerprints)
+        self.pending_fingerprints = []
+
+
+def get_unsigned_rows(after_id, limit):
+    """Returns up to limit (question id, question text, correct answer) rows for questions without a stored signature, after after_id."""
+    query = (Question
+             .select(Question.id, Question.question, Question.answercorrect)
+             .join(QuestionSignature, JOIN.LEFT_OUTER, on=(QuestionSignature.questionid == Question.id))
+             .where(Question.id > after_id, QuestionSignature.questionid.is_null())
+             .order_by(Question.id)
+             .limit(limit))
+    return list(query.tuples())
+
+
+def sign_unsigned_questions(processes=None, chunk_size=5000):
+    """Fingerprint every question without a stored signature, on a pool of processes, or in this process if processes is 1.
+    The main process reads the questions a chunk at a time and saves the fingerprints, with a few chunks in flight,
+    so memory use doesn't grow with the size of the question bank. Returns the number of questions signed."""
+    def save_signed_rows(signed_rows):
+        with quizdatabase.db.atomic():
+            save_fingerprints([question_id for question_id, fingerprint in signed_rows], [fingerprint for question_id, fingerprint in signed_rows])
+        return len(signed_rows)
+
+    signed_count = 0
+    last_id = 0
+    if processes == 1:
+        while True:
+            rows = get_unsigned_rows(last_id, chunk_size)
+            if not rows:
+                return signed_count
+            last_id = rows[-1][0]
+            signed_count += save_signed_rows(sign_question_rows(rows))
+
+    # enough chunks in flight to keep every worker busy while the main process saves
+    max_in_flight = (processes or os.cpu_count() or 1) * 2
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        in_flight = collections.deque()
+        while True:
+            rows = get_unsigned_rows(last_id, chunk_size)
+            if rows:
+                last_id = rows[-1][0]
+                in_flight.append(executor.submit(sign_question_rows, rows))
+            if in_flight and (not rows or len(in_flight) >= max_in_flight):
+                signed_count += save_signed_rows(in_flight.popleft().result())
+            elif not rows:
+                break
+
+    return signed_count
+
+
+def find_duplicates(processes=None, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """The batch job: sign any unsigned questions in parallel, then list every duplicate pair in the question table.
+    Exact duplicates come from grouping on texthash, near duplicates from questions sharing an LSH band,
+    so questions are only compared with their candidates, never pairwise across the whole table.
+    Buckets of more than MAX_BUCKET_SIZE questions are skipped, so template-like questions can't make the job quadratic.
+    Returns a list of DuplicateMatch, with duplicate_id the newer question of each pair, most similar first."""
+    sign_unsigned_questions(processes)
+
+    pairs = {}
+    exact_query = (QuestionSignature
+                   .select(fn.GROUP_CONCAT(QuestionSignature.questionid))
+                   .group_by(QuestionSignature.texthash)
+                   .having(fn.COUNT(QuestionSignature.questionid) > 1)
+                   .tuples())
+    for (question_ids,) in exact_query:
+        question_ids = sorted(int(question_id) for question_id in question_ids.split(','))
+        for duplicate_id in question_ids[1:]:
+            pairs[(question_ids[0], duplicate_id)] = 1.0
+
+    # few buckets can be oversized, each holds more than MAX_BUCKET_SIZE of the questions
+    oversized_band_keys = set(QuestionBand
+                              .select(QuestionBand.bandkey)
+                              .group_by(QuestionBand.bandkey)
+                              .having(fn.COUNT(QuestionBand.questionid) > MAX_BUCKET_SIZE)
+                              .scalars())
+    if oversized_band_keys:
+        logger.warning('Skipped %d LSH buckets of more than %d questions while looking for duplicates.', len(oversized_band_keys), MAX_BUCKET_SIZE)
+    band_query = (QuestionBand
+                  .select(QuestionBand.bandkey, fn.GROUP_CONCAT(QuestionBand.questionid))
+                  .group_by(QuestionBand.bandkey)
+                  .having(fn.COUNT(QuestionBand.questionid).between(2, MAX_BUCKET_SIZE))
+                  .tuples())
+
+    # buckets are worked through a batch at a time, and only the signatures and words of the batch's questions are held.
+    # a pair sharing several bands is only checked in the bucket with the smallest of their shared band keys,
+    # worked out from the signatures, so no set of checked pairs has to be kept across batches
+    for buckets in chunked(band_query, 500):
+        buckets = [(band_key, sorted(int(question_id) for question_id in question_ids.split(','))) for band_key, question_ids in buckets]
+        minhashes = get_minhashes(list({question_id for _, question_ids in buckets for question_id in question_ids}))
+        band_keys = {question_id: set(get_band_keys(minhash)) - oversized_band_keys for question_id, minhash in minhashes.items()}
+
+        # the stored signatures rule out most candidates cheaply, and the rest are checked exactly
+        likely_pairs = []
+        for band_key, question_ids in buckets:
+            for question_id, other_id in itertools.combinations(question_ids, 2):
+                if (question_id, other_id) in pairs or min(band_keys[question_id] & band_keys[other_id]) != band_key:
+                    continue
+                if estimate_similarity(minhashes[question_id], minhashes[other_id]) >= threshold - MINHASH_SLACK:
+                    likely_pairs.append((question_id, other_id))
+
+        question_words = get_question_words(list({question_id for pair in likely_pairs for question_id in pair}))
+        for question_id, other_id in likely_pairs:
+            similarity = get_similarity(question_words[question_id], question_words[other_id])
+            if similarity >= threshold:
+                pairs[(question_id, other_id)] = similarity
+
+    matches = [DuplicateMatch(question_id, duplicate_id, similarity) for (question_id, duplicate_id), similarity in pairs.items()]
+    return sorted(matches, key=lambda match: (-match.similarity, match.question_id, match.duplicate_id))
@@ -0,0 +1,156 @@
+import collections
+import uuid
+
+import quizbank
+import quizdatabase
+import quizrunner
+
+
+# what happened when a question was answered
+GradedAnswer = collections.namedtuple('GradedAnswer', ['question', 'user_answer', 'correct_answer', 'is_correct'])
+
+
+class QuizSessionError(Exception):
+    """Raised when a QuizSession is used out of order, like answering before a question has been asked."""
+    pass
+
+
+class AdaptiveQuestions:
+    """The questions for an adaptive quiz, picked one at a time while the quiz runs.
+    The first question has start_difficulty, then each question is one difficulty harder after a correct answer
+    and one easier after an incorrect one. Questions come from the category's cached difficulty pools,
+    and if a difficulty has run out the nearest difficulty that still has questions is used.
+    Pass it to a QuizSession in place of a list of questions.
+    question_source is the quizdatabase module or a question bank, quizbank.get_question_source() if not given."""
+
+    def __init__(self, category, number_of_questions, start_difficulty=3, question_source=None):
+        self.question_source = question_source if question_source is not None else quizbank.get_question_source()
+        question_count = self.question_source.count_questions_by_category(category)
+        if not (0 < number_of_questions <= question_count):
+            raise quizdatabase.QuizDBError(f'Error: Cannot pick {number_of_questions} questions from {question_count} in category: {category}.')
+
+        self.category = category
+        self.number_of_questions = number_of_questions
+        self.difficulty = start_difficulty
+        self.asked_ids = set()
+
+    def __len__(self):
+        return self.number_of_questions
+
+    def pick_next(self, previous_answer):
+        """Returns the next question, chosen from how previous_answer (a GradedAnswer, or None for the first question) went."""
+        if previous_answer is not None:
+            self.difficulty = quizrunner.next_adaptive_difficulty(self.difficulty, previous_answer.is_correct)
+
+        # try the wanted difficulty, then one away from it either side, then two away, and so on
+        difficulties = sorted(range(quizrunner.MIN_DIFFICULTY, quizrunner.MAX_DIFFICULTY + 1), key=lambda difficulty: abs(difficulty - self.difficulty))
+        for difficulty in difficulties:
+            question_id = self.question_source.get_random_question_id_by_difficulty(self.category, difficulty, self.asked_ids)
+            if question_id is not None:
+                self.asked_ids.add(question_id)
+                return self.question_source.get_question_by_id(question_id)
+
+        raise QuizSessionError(f'Error: There are no questions left to ask in category: {self.category}.')
+
+
+class QuizSession:
+    """Runs one quiz without any input() or print(), so it can be driven by the console, the quiz server or a program.
+    Call next_question() to get a question and its shuffled answers, then answer() with the index of the chosen answer.
+    Results are saved through a ResultWriter. Call finish(), or use the session as a context manager, to save the last batch.
+    questions is a list of questions, or an AdaptiveQuestions that picks each question after the previous one is answered."""
+
+    def __init__(self, questions, session_id=None, result_writer=None, autoflush=True):
+        self.questions = questions if isinstance(questions, AdaptiveQuestions) else list(questions)
+        self.session_id = session_id if session_id is not None else uuid.uuid1()
+        self.result_writer = result_writer if result_writer is not None else quizdatabase.ResultWriter(self.session_id)
+        self.autoflush = autoflush
+        self.position = 0
+        self.current_question = None
+        self.current_answers = None
+        self.current_answer_codes = None
+        self.current_correct_answer = None
+        self.current_start_time = None
+        self.current_shown_time = None
+        self.last_graded_answer = None
+
+    def next_question(self):
+        """Returns (question, shuffled answer list) for the next question, or None once every question has been asked.
+        The question's timer starts here, unless question_shown() restarts it once the question is on screen."""
+        if self.current_question is not None:
+            raise QuizSessionError('Error: The current question has not been answered yet.')
+        if self.is_finished():
+            return None
+
+        if isinstance(self.questions, AdaptiveQuestions):
+            question = self.questions.pick_next(self.last_graded_answer)
+        else:
+            question = self.questions[self.position]
+        answer_list = quizrunner.create_answer_list(question)
+
+        # in an unshuffled answer list, position 0 always contains the correct answer.
+        # the answer codes are shuffled instead of the answers, so each answer's code is known when it's picked
+        self.current_correct_answer = answer_list[0]
+        self.current_answer_codes = quizrunner.shuffle_list(list(range(len(answer_list))))
+        self.current_answers = [answer_list[answer_code] for answer_code in self.current_answer_codes]
+        self.current_question = question
+        self.current_start_time = quizrunner.get_timestamp()
+        self.current_shown_time = quizrunner.get_monotonic_time()
+
+        return question, self.current_answers
+
+    def question_shown(self):
+        """Restart the current question's response timer. Call it once the question has been displayed,
+        so the time spent formatting and sending it isn't counted as the quiz taker's answer time."""
+        if self.current_question is None:
+            raise QuizSessionError('Error: There is no question waiting for an answer.')
+        self.current_shown_time = quizrunner.get_monotonic_time()
+
+    def answer(self, answer_index):
+        """Grade the answer at answer_index in the shuffled answer list and queue its result. Returns a GradedAnswer.
+        The response time is taken before grading, so only the quiz taker's time is counted."""
+        if self.current_question is None:
+            raise QuizSessionError('Error: There is no question waiting for an answer.')
+        if not (0 <= answer_index < len(self.current_answers)):
+            raise QuizSessionError(f'Error: {answer_index} is not the index of an answer to the current question.')
+
+        response_time = quizrunner.calculate_response_time(self.current_shown_time, quizrunner.get_monotonic_time())
+        end_time = quizrunner.get_timestamp()
+        question = self.current_question
+        user_answer = self.current_answers[answer_index]
+        is_correct = quizrunner.is_answer_correct(self.current_correct_answer, user_answer)
+
+        self.result_writer.add(self.current_start_time, end_time, user_answer, question.points, is_correct, question.id, response_time,
+                               self.current_answer_codes[answer_index], autoflush=self.autoflush)
+
+        self.current_question = None
+        self.position += 1
+        self.last_graded_answer = GradedAnswer(question, user_answer, self.current_correct_answer, is_correct)
+
+        return self.last_graded_answer
+
+    def is_flush_due(self):
+        """With autoflush=False, returns True when the caller should run flush()."""
+        return self.result_writer.is_flush_due()
+
+    def flush(self):
+        self.result_writer.flush()
+
+    def is_finished(self):
+        return self.position >= len(self.questions)
+
+    def finish(self):
+        """Save any results still waiting to be written.
+        If every question was answered, the session is also added to the leaderboard."""
+        self.result_writer.close()
+        if self.is_finished() and self.questions:
+            quizdatabase.record_completed_session(self.session_id)
+
+    def get_summary(self):
+        """Returns the session_summary row for this session. Call after finish()."""
+        return quizdatabase.get_session_summary(self.session_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.finish()
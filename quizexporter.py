@@ -0,0 +1,173 @@
+import csv
+import datetime
+import json
+import sys
+
+from peewee import Case
+from peewee import JOIN
+from peewee import Tuple
+
+import quizdatabase
+from quizdatabase import Question
+from quizdatabase import QuizDBError
+from quizdatabase import Result
+from quizdatabase import Session
+
+
+FILE_FORMATS = ['csv', 'jsonl', 'columns']
+
+# the answer and session are written as text, looked up from the answer code and session key that are stored
+RESULT_COLUMNS = ['id', 'timestampstart', 'timestampend', 'responsetime', 'useranswer', 'points', 'iscorrect', 'sessionid', 'questionid']
+
+QUESTION_COLUMNS = [Question.category, Question.difficulty]
+
+
+def to_timestamp(value):
+    """Turns a date, datetime or number of seconds into the timestamp stored in Result.timestampend."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    if isinstance(value, datetime.date):
+        return datetime.datetime(value.year, value.month, value.day).timestamp()
+    raise QuizDBError(f'Error: Cannot use {value} as an export start or end time.')
+
+
+def get_column_names(with_question=False):
+    """Returns the names of the exported columns, in the order they are written."""
+    return RESULT_COLUMNS + ([column.name for column in QUESTION_COLUMNS] if with_question else [])
+
+
+def get_result_columns(result_model):
+    """Returns the expressions for RESULT_COLUMNS from a result model, Result or ArchivedResult, which have the same fields.
+    They need the session and question tables joined."""
+    answer_options = [Question.answercorrect, Question.answerincorrecta, Question.answerincorrectb, Question.answerincorrectc]
+    user_answer = Case(result_model.answercode, list(enumerate(answer_options)), result_model.useranswer)
+    columns = {
+        'useranswer': user_answer.alias('useranswer'),
+        'sessionid': Session.sessionid,
+    }
+    return [columns[name] if name in columns else getattr(result_model, name) for name in RESULT_COLUMNS]
+
+
+def iter_result_pages(page_size=10000, with_question=False, start=None, end=None, after_id=0, result_model=Result):
+    """Yields lists of result tuples, page_size at a time, using keyset pagination so every page is an index seek
+    and only one page is ever held in memory.
+    start and end limit results to timestampend in [start, end). Without a date range pages walk the primary key,
+    with one they walk the result(timestampend) index.
+    after_id skips results already exported, for incremental exports.
+    result_model is Result, or quizdatabase.ArchivedResult to read the archive."""
+    start = to_timestamp(start)
+    end = to_timestamp(end)
+    use_time_order = start is not None or end is not None
+
+    columns = get_result_columns(result_model) + (QUESTION_COLUMNS if with_question else [])
+    base_query = (result_model
+                  .select(*columns)
+                  .join(Session, on=(result_model.session == Session.id))
+                  .join_from(result_model, Question, JOIN.LEFT_OUTER, on=(result_model.questionid == Question.id)))
+    if after_id:
+        base_query = base_query.where(result_model.id > after_id)
+    if start is not None:
+        base_query = base_query.where(result_model.timestampend >= start)
+    if end is not None:
+        base_query = base_query.where(result_model.timestampend < end)
+
+    if use_time_order:
+        base_query = base_query.order_by(result_model.timestampend, result_model.id)
+    else:
+        base_query = base_query.order_by(result_model.id)
+
+    # RESULT_COLUMNS starts with id then timestampstart, timestampend, so the keyset can be read back out of the last row
+    last_row = None
+    while True:
+        query = base_query
+        if last_row is not None:
+            if use_time_order:
+                query = query.where(Tuple(result_model.timestampend, result_model.id) > Tuple(last_row[2], last_row[0]))
+            else:
+                query = query.where(result_model.id > last_row[0])
+
+        page = list(query.limit(page_size).tuples().iterator())
+        if not page:
+            return
+
+        yield page
+        last_row = page[-1]
+
+
+class CsvResultWriter:
+
+    def __init__(self, output_file, column_names):
+        self.writer = csv.writer(output_file)
+        self.writer.writerow(column_names)
+
+    def write_page(self, page):
+        self.writer.writerows(page)
+
+
+class JsonLinesResultWriter:
+
+    def __init__(self, output_file, column_names):
+        self.output_file = output_file
+        self.column_names = column_names
+
+    def write_page(self, page):
+        for row in page:
+            self.output_file.write(json.dumps(dict(zip(self.column_names, row))) + '\n')
+
+
+class ColumnsResultWriter:
+    """Writes each page as one JSON line of column arrays, like a Parquet row group,
+    so analytics tools can load a column at a time."""
+
+    def __init__(self, output_file, column_names):
+        self.output_file = output_file
+        self.column_names = column_names
+
+    def write_page(self, page):
+        columns = {name: list(values) for name, values in zip(self.column_names, zip(*page))}
+        self.output_file.write(json.dumps(columns) + '\n')
+
+
+RESULT_WRITERS = {
+    'csv': CsvResultWriter,
+    'jsonl': JsonLinesResultWriter,
+    'columns': ColumnsResultWriter,
+}
+
+
+def export_results(output_file, file_format='csv', page_size=10000, with_question=False, start=None, end=None, checkpoint_name=None, include_archive=False):
+    """Write results to an open text file as CSV, JSON lines or column chunks.
+    Results can be joined to their question category and difficulty, and limited to a timestampend range.
+    With checkpoint_name, only results newer than the last export under that name are written,
+    and the checkpoint is moved forward once the export finishes.
+    With include_archive, archived results are written first, then the results still in the result table.
+    Returns the number of results written."""
+    if file_format not in RESULT_WRITERS:
+        raise QuizDBError(f'Error: Unknown export format {file_format}, expected one of {FILE_FORMATS}.')
+
+    after_id = quizdatabase.get_export_checkpoint(checkpoint_name) if checkpoint_name else 0
+    writer = RESULT_WRITERS[file_format](output_file, get_column_names(with_question))
+
+    exported_count = 0
+    last_result_id = after_id
+    for result_model in reversed(quizdatabase.get_result_models(include_archive)):
+        for page in iter_result_pages(page_size, with_question, start, end, after_id, result_model):
+            writer.write_page(page)
+            exported_count += len(page)
+            last_result_id = max(last_result_id, max(row[0] for row in page))
+
+    if checkpoint_name and exported_count:
+        quizdatabase.save_export_checkpoint(checkpoint_name, last_result_id)
+
+    return exported_count
+
+
+def export_results_to_path(path, **export_options):
+    """Export results to a file path, or to standard output when path is '-'."""
+    if path == '-':
+        return export_results(sys.stdout, **export_options)
+
+    with open(path, 'w', newline='', encoding='utf-8') as output_file:
+        return export_results(output_file, **export_options)
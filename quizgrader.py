@@ -0,0 +1,207 @@
+import datetime
+
+from peewee import chunked
+
+import quizdatabase
+import quizimporter
+from quizdatabase import Question
+from quizdatabase import Session
+
+
+# columns every answer sheet row must have. responsetime, in milliseconds, is optional
+SHEET_FIELDS = ['sessionid', 'questionid', 'useranswer', 'timestampstart', 'timestampend']
+
+
+class GradingReport(quizimporter.ImportReport):
+    """An ImportReport for grading answer sheets, where each imported row is a graded answer."""
+
+    def __init__(self):
+        super().__init__()
+        self.correct_count = 0
+        self.session_count = 0
+
+    @property
+    def graded_count(self):
+        return self.imported_count
+
+    @graded_count.setter
+    def graded_count(self, graded_count):
+        self.imported_count = graded_count
+
+    def __str__(self):
+        return (f'Graded {self.graded_count} answers ({self.correct_count} correct) from {self.session_count} sessions, '
+                f'rejected {self.rejected_count}, in {self.elapsed_seconds():.2f} seconds ({self.rows_per_second():.0f} rows per second).')
+
+
+def to_timestamp(value):
+    """Turns a number of seconds, or an ISO 8601 date and time, into a timestamp like quizrunner.get_timestamp() makes."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return datetime.datetime.fromisoformat(str(value)).timestamp()
+
+
+def validate_sheet_row(row):
+    """Checks one answer sheet row. Returns (answer dict, None) for a good row, or (None, reason) for a bad one."""
+    if not isinstance(row, dict):
+        return None, 'row is not a JSON object'
+
+    answer = {}
+    for field_name in SHEET_FIELDS:
+        value = row.get(field_name)
+        if value is None or str(value).strip() == '':
+            return None, f'missing {field_name}'
+        answer[field_name] = value
+
+    try:
+        answer['questionid'] = int(answer['questionid'])
+    except (TypeError, ValueError):
+        return None, 'questionid is not a whole number'
+
+    for field_name in ['timestampstart', 'timestampend']:
+        try:
+            answer[field_name] = to_timestamp(answer[field_name])
+        except ValueError:
+            return None, f'{field_name} is not a number of seconds or an ISO 8601 date and time'
+    if answer['timestampend'] < answer['timestampstart']:
+        return None, 'timestampend is before timestampstart'
+
+    answer['responsetime'] = None
+    if row.get('responsetime') not in (None, ''):
+        try:
+            answer['responsetime'] = int(row['responsetime'])
+        except (TypeError, ValueError):
+            return None, 'responsetime is not a whole number of milliseconds'
+
+    answer['sessionid'] = str(answer['sessionid'])
+    answer['useranswer'] = str(answer['useranswer'])
+    return answer, None
+
+
+def load_answer_keys(question_ids):
+    """Returns {question id: (points, {answer text: answer code})} for the given question ids, read in bulk.
+    Answer codes are places in quizrunner.create_answer_list(), so code 0 is the correct answer.
+    When two options have the same text the first one's code is kept, so an answer matching the correct answer always grades as correct."""
+    answer_keys = {}
+    # keep each IN (...) well under SQLite's limit on bound parameters
+    for batch in chunked(question_ids, 500):
+        query = (Question
+                 .select(Question.id, Question.points, Question.answercorrect, Question.answerincorrecta, Question.answerincorrectb, Question.answerincorrectc)
+                 .where(Question.id.in_(batch)))
+        for question_id, points, *answer_list in quizdatabase.db.execute(query):
+            answer_codes = {}
+            for answer_code, answer_text in enumerate(answer_list):
+                answer_codes.setdefault(answer_text, answer_code)
+            answer_keys[question_id] = (points, answer_codes)
+    return answer_keys
+
+
+def get_graded_pairs(session_ids):
+    """Returns the set of (session id, question id) already saved for the given sessions, in the result table or the archive."""
+    graded_pairs = set()
+    for result_model in quizdatabase.get_result_models():
+        for batch in chunked(session_ids, 500):
+            query = (result_model
+                     .select(Session.sessionid, result_model.questionid)
+                     .join(Session, on=(result_model.session == Session.id))
+                     .where(Session.sessionid.in_(batch)))
+            graded_pairs.update(query.tuples())
+    return graded_pairs
+
+
+def grade_chunk(answers, answer_keys):
+    """Grade a chunk of validated answers against the answer keys in one pass, with no database access.
+    Returns (result rows for quizdatabase.save_results(), reasons), with a reason for each answer in order:
+    None if it was graded, or why it was rejected if its question doesn't exist.
+    An answer that isn't one of its question's options is graded incorrect and saved with its text."""
+    result_rows = []
+    reasons = []
+    for answer in answers:
+        answer_key = answer_keys.get(answer['questionid'])
+        if answer_key is None:
+            reasons.append(f'no question with id {answer["questionid"]}')
+            continue
+        reasons.append(None)
+
+        points, answer_codes = answer_key
+        answer_code = answer_codes.get(answer['useranswer'])
+        result_rows.append(quizdatabase.build_result_row(answer['timestampstart'], answer['timestampend'], answer['useranswer'], points,
+                                                         answer_code == 0, answer['sessionid'], answer['questionid'], answer['responsetime'], answer_code))
+    return result_rows, reasons
+
+
+def grade_answer_sheets(paths, file_format=None, chunk_size=10000, rejected_path=None, progress=None):
+    """Stream answer sheets from CSV or JSON lines files, grade them and save the results.
+    Each row is one answer: SHEET_FIELDS, and optionally responsetime in milliseconds. Timestamps are seconds or ISO 8601.
+    Rows are read chunk_size at a time. Each chunk's questions are read in one bulk lookup, or reused from earlier chunks,
+    the chunk is graded in one pass, and its results, session summaries and question stats are saved in one transaction.
+    Every graded session is added to the leaderboard at the end.
+    Grading is idempotent: an answer to a question its session already has a result for, saved by an earlier run or earlier in this one,
+    is rejected, so grading the same sheet twice doesn't count any answer twice.
+    Rejected rows are written to rejected_path as JSON lines with the reason they were rejected, and their file and line.
+    progress, if given, is called with the GradingReport after every chunk.
+    Returns a GradingReport."""
+    report = GradingReport()
+    answer_keys = {}
+    session_ids = set()
+    rejected_file = open(rejected_path, 'w', encoding='utf-8') if rejected_path else None
+
+    def save_pending(pending):
+        """Grade and save a chunk of (line, row, answer)."""
+        # earlier chunks are saved already, so the database covers them and only this chunk is tracked here
+        graded_pairs = get_graded_pairs(list({answer['sessionid'] for _, _, answer in pending}))
+        new_pending = []
+        for line, row, answer in pending:
+            graded_pair = (answer['sessionid'], answer['questionid'])
+            if graded_pair in graded_pairs:
+                report.rejected_count += 1
+                quizimporter.write_rejected_row(rejected_file, line, f'question {answer["questionid"]} is already graded for this session', row)
+                continue
+            graded_pairs.add(graded_pair)
+            new_pending.append((line, row, answer))
+        pending = new_pending
+
+        new_question_ids = list({answer['questionid'] for _, _, answer in pending if answer['questionid'] not in answer_keys})
+        answer_keys.update(load_answer_keys(new_question_ids))
+
+        result_rows, reasons = grade_chunk([answer for _, _, answer in pending], answer_keys)
+        for (line, row, _), reason in zip(pending, reasons):
+            if reason is not None:
+                report.rejected_count += 1
+                quizimporter.write_rejected_row(rejected_file, line, reason, row)
+
+        quizdatabase.save_results(result_rows)
+        session_ids.update(result_row[quizdatabase.Result.session] for result_row in result_rows)
+        report.graded_count += len(result_rows)
+        report.correct_count += sum(result_row[quizdatabase.Result.iscorrect] for result_row in result_rows)
+
+    try:
+        for path in paths:
+            pending = []
+            for line_number, row in quizimporter.read_file_rows(path, file_format or quizimporter.guess_file_format(path)):
+                # rows can come from many sheets, so rejected rows are found by file and line
+                line = f'{path}:{line_number}'
+                answer, reason = validate_sheet_row(row)
+
+                if answer is None:
+                    report.rejected_count += 1
+                    quizimporter.write_rejected_row(rejected_file, line, reason, row)
+                    continue
+
+                pending.append((line, row, answer))
+                if len(pending) >= chunk_size:
+                    save_pending(pending)
+                    pending = []
+                    if progress:
+                        progress(report)
+
+            save_pending(pending)
+    finally:
+        if rejected_file:
+            rejected_file.close()
+
+    # answer sheets hold finished quizzes
+    quizdatabase.record_completed_sessions(session_ids)
+    report.session_count = len(session_ids)
+    report.finish()
+    return report
@@ -0,0 +1,188 @@
+import csv
+import json
+import os
+import time
+
+import quizdatabase
+import quizduplicates
+from quizdatabase import Question
+from quizdatabase import QuizDBError
+
+
+# columns every imported question must have, named the same as the Question fields
+QUESTION_FIELDS = ['question', 'answercorrect', 'answerincorrecta', 'answerincorrectb', 'answerincorrectc', 'difficulty', 'points', 'category']
+
+FILE_FORMATS = ['csv', 'jsonl']
+
+
+class ImportReport:
+    """Counts of what happened during an import, and how fast it went."""
+
+    def __init__(self):
+        self.imported_count = 0
+        self.rejected_count = 0
+        self.start_time = time.monotonic()
+        self.end_time = None
+
+    def finish(self):
+        self.end_time = time.monotonic()
+
+    def elapsed_seconds(self):
+        end_time = self.end_time if self.end_time is not None else time.monotonic()
+        return end_time - self.start_time
+
+    def rows_per_second(self):
+        elapsed_seconds = self.elapsed_seconds()
+        if elapsed_seconds <= 0:
+            return 0.0
+        return (self.imported_count + self.rejected_count) / elapsed_seconds
+
+    def __str__(self):
+        return (f'Imported {self.imported_count} questions, rejected {self.rejected_count}, '
+                f'in {self.elapsed_seconds():.2f} seconds ({self.rows_per_second():.0f} rows per second).')
+
+
+def guess_file_format(path):
+    """Returns the file format from the file extension."""
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension == 'json':
+        extension = 'jsonl'
+    if extension not in FILE_FORMATS:
+        raise QuizDBError(f'Error: Cannot tell the format of {path}, expected one of {FILE_FORMATS}.')
+    return extension
+
+
+def read_file_rows(path, file_format):
+    """Yields (line number, row dict) for each row in a CSV or JSON lines file, one at a time.
+    A JSON line that can't be parsed is yielded as None so it can be rejected."""
+    with open(path, newline='', encoding='utf-8') as question_file:
+        if file_format == 'csv':
+            reader = csv.DictReader(question_file)
+            for row in reader:
+                yield reader.line_num, row
+        elif file_format == 'jsonl':
+            for line_number, line in enumerate(question_file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    row = None
+                yield line_number, row
+        else:
+            raise QuizDBError(f'Error: Unknown file format {file_format}, expected one of {FILE_FORMATS}.')
+
+
+def validate_question_row(row):
+    """Checks a row against the Question table rules before it is inserted,
+    including the difficulty and points CHECK constraints.
+    Returns (question dict, None) for a good row, or (None, reason) for a bad one."""
+    if not isinstance(row, dict):
+        return None, 'row is not a JSON object'
+
+    question = {}
+    for field_name in QUESTION_FIELDS:
+        value = row.get(field_name)
+        if value is None or str(value).strip() == '':
+            return None, f'missing {field_name}'
+        question[field_name] = value
+
+    for field_name in ['difficulty', 'points']:
+        try:
+            question[field_name] = int(question[field_name])
+        except (TypeError, ValueError):
+            return None, f'{field_name} is not a whole number'
+
+    # same rules as the CHECK constraints on the Question model
+    if not (0 < question['difficulty'] < 6):
+        return None, 'difficulty must be between 1 and 5'
+    if not (0 < question['points'] < 101):
+        return None, 'points must be between 1 and 100'
+
+    for field_name in QUESTION_FIELDS:
+        if field_name not in ['difficulty', 'points']:
+            question[field_name] = str(question[field_name])
+
+    return question, None
+
+
+def save_question_chunk(questions):
+    """Insert a chunk of validated questions, and add them to the search index, in one transaction.
+    Returns the new question ids."""
+    fields = [getattr(Question, field_name) for field_name in QUESTION_FIELDS]
+    rows = [[question[field_name] for field_name in QUESTION_FIELDS] for question in questions]
+
+    return quizdatabase.bulk_insert_questions(fields, rows)
+
+
+def write_rejected_row(rejected_file, line_number, reason, row):
+    if rejected_file:
+        rejected_file.write(json.dumps({'line': line_number, 'reason': reason, 'row': row}) + '\n')
+
+
+def import_questions(path, file_format=None, chunk_size=5000, rejected_path=None, rebuild_indexes=False, progress=None, allow_duplicates=False):
+    """Stream questions from a CSV or JSON lines file into the Question table.
+    Rows are checked before insert and written chunk_size at a time, each chunk in its own transaction,
+    so memory use doesn't grow with the size of the file.
+    Rejected rows are written to rejected_path as JSON lines with the reason they were rejected.
+    Unless allow_duplicates is True, rows that duplicate or nearly duplicate a saved question, or an earlier row, are rejected too.
+    For very large loads, rebuild_indexes drops the question indexes first and builds them once at the end.
+    progress, if given, is called with the ImportReport after every chunk.
+    Returns an ImportReport."""
+    if file_format is None:
+        file_format = guess_file_format(path)
+
+    report = ImportReport()
+    duplicate_checker = None if allow_duplicates else quizduplicates.DuplicateChecker()
+    rejected_file = open(rejected_path, 'w', encoding='utf-8') if rejected_path else None
+
+    if rebuild_indexes:
+        quizdatabase.drop_question_indexes()
+
+    def save_pending(pending):
+        """Save a chunk of (line number, row, question), rejecting duplicates first if they are checked for."""
+        if duplicate_checker is None:
+            save_question_chunk([question for line_number, row, question in pending])
+            report.imported_count += len(pending)
+            return
+
+        questions = []
+        reasons = duplicate_checker.check_chunk([question for line_number, row, question in pending])
+        for (line_number, row, question), reason in zip(pending, reasons):
+            if reason is None:
+                questions.append(question)
+            else:
+                report.rejected_count += 1
+                write_rejected_row(rejected_file, line_number, reason, row)
+
+        duplicate_checker.save_chunk(save_question_chunk(questions))
+        report.imported_count += len(questions)
+
+    try:
+        pending = []
+        for line_number, row in read_file_rows(path, file_format):
+            question, reason = validate_question_row(row)
+
+            if question is None:
+                report.rejected_count += 1
+                write_rejected_row(rejected_file, line_number, reason, row)
+                continue
+
+            pending.append((line_number, row, question))
+            if len(pending) >= chunk_size:
+                save_pending(pending)
+                pending = []
+                if progress:
+                    progress(report)
+
+        save_pending(pending)
+    finally:
+        if rebuild_indexes:
+            quizdatabase.create_question_indexes()
+        if rejected_file:
+            rejected_file.close()
+        if report.imported_count:
+            quizdatabase.notify_questions_changed()
+
+    report.finish()
+    return report
@@ -0,0 +1,185 @@
+import argparse
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+
+from peewee import OperationalError
+
+import db_config
+import quizbank
+import quizdatabase
+import quizengine
+from quizdatabase import Question
+
+
+RUN_MODES = ['thread', 'process']
+
+
+def seed_questions(question_count, category_count=10, chunk_size=10000):
+    """Add question_count made up questions, spread over category_count categories and every difficulty in each category."""
+    fields = [Question.question, Question.answercorrect, Question.answerincorrecta, Question.answerincorrectb, Question.answerincorrectc, Question.difficulty, Question.points, Question.category]
+    for chunk_start in range(0, question_count, chunk_size):
+        rows = []
+        for number in range(chunk_start, min(chunk_start + chunk_size, question_count)):
+            rows.append((f'Load test question {number}', f'Right {number}', f'Wrong A {number}', f'Wrong B {number}', f'Wrong C {number}',
+                         (number // category_count) % 5 + 1, number % 100 + 1, f'Load Test Category {number % category_count}'))
+        quizdatabase.bulk_insert_questions(fields, rows)
+    quizdatabase.notify_questions_changed()
+
+
+def percentile(sorted_values, fraction):
+    """Returns the value at a fraction (0 to 1) of the way through a sorted list, using the nearest rank."""
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def choose_answer_index(random_generator, question, answer_list, accuracy):
+    """Picks the correct answer with probability accuracy, otherwise one of the wrong ones."""
+    correct_index = answer_list.index(question.answercorrect)
+    if random_generator.random() < accuracy:
+        return correct_index
+    wrong_indexes = [index for index in range(len(answer_list)) if index != correct_index]
+    return random_generator.choice(wrong_indexes)
+
+
+def run_player(session_count, questions_per_session, accuracy, think_time):
+    """One simulated player taking session_count quizzes through a QuizSession, as fast as think_time allows.
+    Think times are random with a mean of think_time seconds.
+    Returns a dict of the player's timings."""
+    random_generator = random.Random()
+    player_stats = {
+        'answer_latencies': [],
+        'finish_latencies': [],
+        'lock_wait_seconds': 0.0,
+        'flush_count': 0,
+        'sessions': 0,
+        'errors': 0,
+    }
+
+    catalog = quizbank.get_question_source().get_category_catalog()
+    categories = list(catalog)
+
+    for _ in range(session_count):
+        category = random_generator.choice(categories)
+        number_of_questions = min(questions_per_session, catalog[category])
+        try:
+            questions = quizbank.get_question_source().get_random_questions_by_category(category, number_of_questions)
+            quiz_session = quizengine.QuizSession(questions)
+
+            while True:
+                next_question = quiz_session.next_question()
+                if next_question is None:
+                    break
+                question, answer_list = next_question
+
+                if think_time:
+                    time.sleep(random_generator.expovariate(1 / think_time))
+
+                answer_index = choose_answer_index(random_generator, question, answer_list, accuracy)
+                answer_start = time.perf_counter()
+                quiz_session.answer(answer_index)
+                player_stats['answer_latencies'].append(time.perf_counter() - answer_start)
+
+            finish_start = time.perf_counter()
+            quiz_session.finish()
+            player_stats['finish_latencies'].append(time.perf_counter() - finish_start)
+
+            player_stats['lock_wait_seconds'] += quiz_session.result_writer.lock_wait_seconds
+            player_stats['flush_count'] += quiz_session.result_writer.flush_count
+            player_stats['sessions'] += 1
+        except OperationalError:
+            # most likely 'database is locked' after busy_timeout ran out
+            player_stats['errors'] += 1
+
+    return player_stats
+
+
+def run_load_test(player_count, session_count, questions_per_session, accuracy=0.7, think_time=0.0, mode='thread', database_path=None):
+    """Run player_count simulated players at the same time, in threads or in separate processes,
+    against the configured database. Returns a dict report of throughput, latency and lock wait time."""
+    if mode not in RUN_MODES:
+        raise quizdatabase.QuizDBError(f'Error: Unknown load test mode {mode}, expected one of {RUN_MODES}.')
+
+    player_args = (session_count, questions_per_session, accuracy, think_time)
+    start_time = time.perf_counter()
+
+    if mode == 'thread':
+        with ThreadPoolExecutor(max_workers=player_count) as executor:
+            futures = [executor.submit(run_player, *player_args) for _ in range(player_count)]
+            all_player_stats = [future.result() for future in futures]
+    else:
+        # every process opens its own connection to the same database file
+        database_path = database_path if database_path is not None else quizdatabase.db.database
+        with ProcessPoolExecutor(max_workers=player_count, initializer=quizdatabase.configure_database, initargs=(database_path,)) as executor:
+            futures = [executor.submit(run_player, *player_args) for _ in range(player_count)]
+            all_player_stats = [future.result() for future in futures]
+
+    elapsed_seconds = time.perf_counter() - start_time
+    return build_report(all_player_stats, elapsed_seconds)
+
+
+def build_report(all_player_stats, elapsed_seconds):
+    """Combine every player's timings into one report."""
+    answer_latencies = sorted(latency for player_stats in all_player_stats for latency in player_stats['answer_latencies'])
+    finish_latencies = sorted(latency for player_stats in all_player_stats for latency in player_stats['finish_latencies'])
+    lock_wait_seconds = sum(player_stats['lock_wait_seconds'] for player_stats in all_player_stats)
+    flush_count = sum(player_stats['flush_count'] for player_stats in all_player_stats)
+
+    return {
+        'players': len(all_player_stats),
+        'sessions': sum(player_stats['sessions'] for player_stats in all_player_stats),
+        'answers': len(answer_latencies),
+        'errors': sum(player_stats['errors'] for player_stats in all_player_stats),
+        'elapsed_seconds': elapsed_seconds,
+        'answers_per_second': len(answer_latencies) / elapsed_seconds if elapsed_seconds else 0.0,
+        'answer_p50_ms': percentile(answer_latencies, 0.50) * 1000,
+        'answer_p99_ms': percentile(answer_latencies, 0.99) * 1000,
+        'finish_p50_ms': percentile(finish_latencies, 0.50) * 1000,
+        'finish_p99_ms': percentile(finish_latencies, 0.99) * 1000,
+        'flushes': flush_count,
+        'lock_wait_seconds': lock_wait_seconds,
+        'lock_wait_per_flush_ms': lock_wait_seconds / flush_count * 1000 if flush_count else 0.0,
+    }
+
+
+def format_report(report):
+    return (f"{report['players']} players finished {report['sessions']} quizzes and {report['answers']} answers "
+            f"in {report['elapsed_seconds']:.2f} seconds, with {report['errors']} errors.\n"
+            f"Throughput: {report['answers_per_second']:.0f} answers per second.\n"
+            f"Answer latency: p50 {report['answer_p50_ms']:.2f} ms, p99 {report['answer_p99_ms']:.2f} ms.\n"
+            f"End of quiz save: p50 {report['finish_p50_ms']:.2f} ms, p99 {report['finish_p99_ms']:.2f} ms.\n"
+            f"SQLite write lock wait: {report['lock_wait_seconds']:.3f} seconds over {report['flushes']} flushes "
+            f"({report['lock_wait_per_flush_ms']:.2f} ms per flush).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run simulated players against the quiz database and report throughput and latency.')
+    parser.add_argument('--database', help='database file to use, db_config.database_path if not given')
+    parser.add_argument('--players', type=int, default=20, help='simulated players running at the same time')
+    parser.add_argument('--sessions', type=int, default=5, help='quizzes each player takes')
+    parser.add_argument('--questions', type=int, default=10, help='questions per quiz')
+    parser.add_argument('--accuracy', type=float, default=0.7, help='chance, 0 to 1, that a player answers correctly')
+    parser.add_argument('--think-time', type=float, default=0.0, help='mean seconds a player thinks before answering')
+    parser.add_argument('--mode', choices=RUN_MODES, default='thread', help='run players as threads or as processes')
+    parser.add_argument('--seed-questions', type=int, default=0, help='add this many made up questions before starting')
+    parser.add_argument('--question-bank', action='store_true', help='build quizzes from the in-memory question bank')
+    args = parser.parse_args()
+
+    if args.question_bank:
+        db_config.question_bank = True
+
+    if args.database:
+        quizdatabase.configure_database(args.database)
+    quizdatabase.create_table()
+    if args.seed_questions:
+        seed_questions(args.seed_questions)
+
+    report = run_load_test(args.players, args.sessions, args.questions, args.accuracy, args.think_time, args.mode, args.database)
+    print(format_report(report))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,18 @@
 
 from random import shuffle
 import datetime
+import time
+
+
+# names a quiz taker can use in a difficulty profile, and the question difficulties each one covers
+DIFFICULTY_LEVELS = {
+    'easy': (1, 2),
+    'medium': (3,),
+    'hard': (4, 5),
+}
+
+MIN_DIFFICULTY = 1
+MAX_DIFFICULTY = 5
 
 
 def shuffle_list(shuffle_list):
@@ -30,20 +42,35 @@ def grade_question(correct_answer, user_answer):
     """Returns whether or not question correct.
     Returns True for correct.
     Returns False for incorrect."""
-    if (correct_answer == user_answer):
-        print(f'You selected {user_answer}.\nThat\'s Correct!\n')
-        return True
+    is_correct = is_answer_correct(correct_answer, user_answer)
+    print(format_grade_message(correct_answer, user_answer, is_correct))
+    return is_correct
+
+
+def is_answer_correct(correct_answer, user_answer):
+    """Returns True if the user's answer is the correct answer, without printing anything."""
+    return correct_answer == user_answer
+
+
+def format_grade_message(correct_answer, user_answer, is_correct):
+    """Returns the message telling the user whether their answer was correct."""
+    if is_correct:
+        return f'You selected {user_answer}.\nThat\'s Correct!\n'
     else:
-        print(f'You selected {user_answer}.\nThat is incorrect, sorry!\nThe correct answer is {correct_answer}.\n')
-        return False
+        return f'You selected {user_answer}.\nThat is incorrect, sorry!\nThe correct answer is {correct_answer}.\n'
+
+
+def calculate_earned_points(is_correct, points):
+    """Returns the points earned for a result: the question's points if it was answered correctly, otherwise none.
+    Works on single numbers, or element by element on NumPy arrays of results."""
+    return points * (is_correct == 1)
 
 
 def calculate_total_score(results):
     """Returns total score for a session based on results from that session and whether or not result was correct."""
     total_score = 0
     for result in results:
-        if (result.iscorrect == 1):
-            total_score += result.points
+        total_score += calculate_earned_points(result.iscorrect, result.points)
     return total_score
 
 
@@ -62,16 +89,31 @@ def calculate_score_percentage(total_score, available_points):
     return percentage
 
 
+MILLISECONDS_PER_SECOND = 1000
+
+
 def get_timestamp():
-    """Returns a current timestamp."""
-    time = datetime.datetime.now()
-    timestamp = time.timestamp()
+    """Returns a current wall clock timestamp, for recording when a question was asked.
+    It jumps when the system clock is changed, so it isn't used to time answers."""
+    now = datetime.datetime.now()
+    timestamp = now.timestamp()
     return timestamp
 
 
+def get_monotonic_time():
+    """Returns a reading of the monotonic clock in nanoseconds, for timing answers.
+    Only the difference between two readings means anything."""
+    return time.monotonic_ns()
+
+
+def calculate_response_time(monotonic_start, monotonic_end):
+    """Returns the whole number of milliseconds between two get_monotonic_time() readings."""
+    return round((monotonic_end - monotonic_start) / 1_000_000)
+
+
 def calculate_total_question_time(result):
     """Returns the total time in seconds for a single quiz result."""
-    total_time = result.timestampend - result.timestampstart
+    total_time = result.responsetime / MILLISECONDS_PER_SECOND
     return total_time
 
 
@@ -83,9 +125,48 @@ def calculate_total_quiz_time(results):
     return total_time
 
 
+def convert_milliseconds_to_minutes(milliseconds):
+    """Puts milliseconds, like a session summary's total time, into minutes."""
+    return convert_to_minutes(milliseconds / MILLISECONDS_PER_SECOND)
+
+
 def convert_to_minutes(timestamp):
     """Puts seconds into minutes."""
     minutes = timestamp / 60
     return minutes
 
 
+def parse_difficulty_profile(profile_string):
+    """Takes a difficulty profile like '2 easy, 5 medium, 3 hard' and returns a list of (number of questions, difficulties).
+    A difficulty can also be a single level from 1 to 5, like '2 easy, 1 5'.
+    Raises ValueError if the profile can't be read, or uses a difficulty more than once."""
+    difficulty_profile = []
+    used_difficulties = set()
+    for part in profile_string.split(','):
+        words = part.split()
+        if len(words) != 2 or not words[0].isnumeric() or int(words[0]) < 1:
+            raise ValueError(f'"{part.strip()}" should be a number of questions and a difficulty, like "3 easy".')
+
+        level = words[1].lower()
+        if level in DIFFICULTY_LEVELS:
+            difficulties = DIFFICULTY_LEVELS[level]
+        elif level.isnumeric() and MIN_DIFFICULTY <= int(level) <= MAX_DIFFICULTY:
+            difficulties = (int(level),)
+        else:
+            raise ValueError(f'"{words[1]}" is not a difficulty, use easy, medium, hard or {MIN_DIFFICULTY} to {MAX_DIFFICULTY}.')
+
+        if used_difficulties.intersection(difficulties):
+            raise ValueError(f'"{words[1]}" uses a difficulty that is already in the profile.')
+        used_difficulties.update(difficulties)
+        difficulty_profile.append((int(words[0]), difficulties))
+
+    return difficulty_profile
+
+
+def next_adaptive_difficulty(difficulty, is_correct):
+    """Returns the difficulty for the next question of an adaptive quiz: one harder after a correct answer,
+    one easier after an incorrect one, kept between MIN_DIFFICULTY and MAX_DIFFICULTY."""
+    if is_correct:
+        return min(difficulty + 1, MAX_DIFFICULTY)
+    else:
+        return max(difficulty - 1, MIN_DIFFICULTY)
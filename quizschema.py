@@ -0,0 +1,27 @@
+import os
+import sqlite3
+
+
+# bump this and add a step to quizdatabase.MIGRATIONS whenever the schema changes.
+# the version is stored in the database file itself with PRAGMA user_version.
+# it lives here, away from quizdatabase, so startup can check it without importing peewee
+SCHEMA_VERSION = 12
+
+
+def read_schema_version(database_path):
+    """Returns the schema version stored in a database file with one pragma read, using only the standard library.
+    A missing file, or a database that was never migrated, is version 0."""
+    if not os.path.exists(database_path):
+        return 0
+
+    connection = sqlite3.connect(database_path)
+    try:
+        (schema_version,) = connection.execute('PRAGMA user_version').fetchone()
+    finally:
+        connection.close()
+    return schema_version
+
+
+def is_schema_current(database_path):
+    """Returns True if the database file is already at SCHEMA_VERSION, so no tables need creating or migrating."""
+    return read_schema_version(database_path) == SCHEMA_VERSION
@@ -0,0 +1,295 @@
+import argparse
+import asyncio
+import functools
+import random
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import db_config
+import quizbank
+import quizdatabase
+import quizengine
+import quizrunner
+import ui
+import validation
+
+
+# every line the client has to answer starts with this, so a program can tell prompts from other output
+PROMPT_MARKER = '? '
+
+CATEGORY_PROMPT = 'Type the number of the category you want to be quizzed on:'
+NUMBER_OF_QUESTIONS_PROMPT = 'Type in the number of questions you want to be quizzed on:'
+ANSWER_PROMPT = 'Type the number of your chosen answer:'
+
+
+class ClientDisconnected(Exception):
+    """Raised when a quiz taker's connection closes before the quiz is over."""
+    pass
+
+
+class QuizServer:
+    """Runs many quiz sessions at once over a line based TCP protocol.
+    Each connection is one quiz taker. The server writes text, then a prompt line starting with PROMPT_MARKER,
+    and the client answers every prompt with one line.
+    Blocking SQLite calls run on a small, bounded thread pool so they never stall the event loop."""
+
+    def __init__(self, max_sessions=5000, db_workers=8):
+        self.max_sessions = max_sessions
+        self.executor = ThreadPoolExecutor(max_workers=db_workers, thread_name_prefix='quizdb')
+        self.session_slots = None
+        self.active_sessions = 0
+        self.peak_sessions = 0
+        self.completed_sessions = 0
+        # session id: the loop's timer for flushing that session's queued results, and the flushes it has started
+        self.flush_handles = {}
+        self.flush_tasks = set()
+
+    async def run_db(self, function, *args):
+        """Run a blocking quizdatabase call on the database thread pool and wait for its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(function, *args))
+
+    async def send(self, writer, text):
+        writer.write(text.encode())
+        await writer.drain()
+
+    async def ask(self, reader, writer, prompt):
+        """Send a prompt and return the client's answer, without the line ending."""
+        await self.send(writer, f'{PROMPT_MARKER}{prompt}\n')
+        line = await reader.readline()
+        if not line:
+            raise ClientDisconnected()
+        return line.decode().strip()
+
+    async def ask_for_number(self, reader, writer, prompt, count, out_of_range_message):
+        """Keep asking until the client types a number from 1 to count. Returns the number."""
+        while True:
+            answer = await self.ask(reader, writer, prompt)
+            if validation.is_number(answer) == False:
+                await self.send(writer, '\nPlease enter a numeric value.\n\n')
+            elif validation.is_within_count(answer, count) == False:
+                await self.send(writer, f'\n{out_of_range_message}\n\n')
+            else:
+                return int(answer)
+
+    async def handle_client(self, reader, writer):
+        """Take one quiz taker through choosing a category, answering the quiz and seeing their results."""
+        if self.session_slots.locked():
+            await self.send(writer, 'The quiz server is full, please try again later.\n')
+            writer.close()
+            return
+
+        async with self.session_slots:
+            self.active_sessions += 1
+            self.peak_sessions = max(self.peak_sessions, self.active_sessions)
+            try:
+                await self.run_session(reader, writer)
+                self.completed_sessions += 1
+            except (ClientDisconnected, ConnectionError):
+                pass
+            except quizdatabase.QuizDBError as error:
+                # like an empty category, tell the quiz taker instead of leaving an unhandled task error
+                try:
+                    await self.send(writer, f'\n{error}\n')
+                except ConnectionError:
+                    pass
+            finally:
+                self.active_sessions -= 1
+                writer.close()
+
+    async def run_session(self, reader, writer):
+        # a question bank may need to reload from the database, so getting it runs on a database thread too
+        question_source = await self.run_db(quizbank.get_question_source)
+        category_list = await self.run_db(question_source.get_category_list)
+        await self.send(writer, ui.format_list(category_list))
+        category_number = await self.ask_for_number(reader, writer, CATEGORY_PROMPT, len(category_list), 'Please select a category in the category list, by number.')
+        category = category_list[category_number - 1]
+
+        question_count = await self.run_db(question_source.count_questions_by_category, category)
+        await self.send(writer, f'{question_count} questions available in {category}.\n')
+        number_of_questions = await self.ask_for_number(reader, writer, NUMBER_OF_QUESTIONS_PROMPT, question_count, f'Please enter a number within the range provided for {category}.')
+
+        questions = await self.run_db(question_source.get_random_questions_by_category, category, number_of_questions)
+        session_id = uuid.uuid1()
+        await self.run_quiz(reader, writer, questions, session_id)
+
+        results = await self.run_db(get_session_results, session_id)
+        await self.send(writer, results + 'Thanks for using this program!\n')
+
+    async def run_quiz(self, reader, writer, questions, session_id):
+        """Ask each question, grade it and queue the result. The results are saved even if the client leaves early."""
+        # queue results on the event loop, and only hand the flushes to a database thread.
+        # the time based flushes are scheduled on the loop too, so no writer starts a thread or connection of its own
+        result_writer = quizdatabase.ResultWriter(session_id, background_flush=False)
+        quiz_session = quizengine.QuizSession(questions, session_id, result_writer, autoflush=False)
+        try:
+            while True:
+                next_question = quiz_session.next_question()
+                if next_question is None:
+                    break
+
+                question, answer_list_shuffled = next_question
+                await self.send(writer, ui.format_quiz_question(question) + ui.format_list(answer_list_shuffled))
+                quiz_session.question_shown()
+                user_answer_number = await self.ask_for_number(reader, writer, ANSWER_PROMPT, len(answer_list_shuffled), 'Please select an answer in the answers list, by number.')
+
+                graded_answer = quiz_session.answer(user_answer_number - 1)
+                await self.send(writer, quizrunner.format_grade_message(graded_answer.correct_answer, graded_answer.user_answer, graded_answer.is_correct))
+
+                if quiz_session.is_flush_due():
+                    await self.run_db(quiz_session.flush)
+                elif session_id not in self.flush_handles:
+                    self.schedule_flush(quiz_session)
+        finally:
+            flush_handle = self.flush_handles.pop(session_id, None)
+            if flush_handle is not None:
+                flush_handle.cancel()
+            await self.run_db(quiz_session.finish)
+
+    def schedule_flush(self, quiz_session):
+        """Call flush_if_due() on the loop when the session's queued results will have waited flush_seconds."""
+        result_writer = quiz_session.result_writer
+        delay = result_writer.last_flush_time + result_writer.flush_seconds - time.monotonic()
+        self.flush_handles[quiz_session.session_id] = asyncio.get_running_loop().call_later(max(delay, 0), self.flush_if_due, quiz_session)
+
+    def flush_if_due(self, quiz_session):
+        """Hand the session's queued results to the database threads if they have waited flush_seconds,
+        or check again later if a flush since the timer was set restarted the wait."""
+        self.flush_handles.pop(quiz_session.session_id, None)
+        if not quiz_session.result_writer.pending_rows:
+            return
+        if not quiz_session.is_flush_due():
+            self.schedule_flush(quiz_session)
+            return
+
+        flush_task = asyncio.ensure_future(self.run_db(quiz_session.flush))
+        self.flush_tasks.add(flush_task)
+        flush_task.add_done_callback(self.flush_tasks.discard)
+
+    async def start(self, host, port):
+        """Start listening for quiz takers. Returns the asyncio server."""
+        self.session_slots = asyncio.Semaphore(self.max_sessions)
+        await self.run_db(quizdatabase.create_table)
+        return await asyncio.start_server(self.handle_client, host, port, backlog=self.max_sessions)
+
+    async def serve(self, host, port):
+        """Accept quiz takers until cancelled."""
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def get_session_results(session_id):
+    """Returns the formatted results for one session, from the session summary table."""
+    summary = quizdatabase.get_session_summary(session_id)
+    percentage = quizrunner.calculate_score_percentage(summary.score, summary.availablepoints)
+    total_quiz_time_minutes = quizrunner.convert_milliseconds_to_minutes(summary.totaltime)
+    return ui.display_results(summary.category, summary.score, summary.availablepoints, percentage, total_quiz_time_minutes)
+
+
+async def run_simulated_client(host, port, number_of_questions, answer_times):
+    """Connect as one quiz taker who picks a random category and random answers.
+    Appends the time from sending each answer to receiving the next prompt, or the results, to answer_times.
+    Returns True if the quiz finished."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        category_count = 0
+        available_questions = number_of_questions
+        answer_sent_time = None
+        while True:
+            line = await reader.readline()
+            if not line:
+                return True
+            text = line.decode()
+
+            if not text.startswith(PROMPT_MARKER):
+                # count the numbered category list so a valid category can be picked
+                if category_count is not None and text[:1].isdigit():
+                    category_count += 1
+                if ' questions available in ' in text:
+                    available_questions = int(text.split()[0])
+                if answer_sent_time is not None and text.startswith('For the most recent quiz session'):
+                    answer_times.append(time.perf_counter() - answer_sent_time)
+                    answer_sent_time = None
+                continue
+
+            if answer_sent_time is not None:
+                answer_times.append(time.perf_counter() - answer_sent_time)
+                answer_sent_time = None
+
+            prompt = text[len(PROMPT_MARKER):].strip()
+            if prompt == CATEGORY_PROMPT:
+                answer = random.randint(1, max(category_count, 1))
+                category_count = None
+            elif prompt == NUMBER_OF_QUESTIONS_PROMPT:
+                answer = min(number_of_questions, available_questions)
+            else:
+                answer = random.randint(1, 4)
+            writer.write(f'{answer}\n'.encode())
+            await writer.drain()
+
+            if prompt == ANSWER_PROMPT:
+                answer_sent_time = time.perf_counter()
+    except ConnectionError:
+        return False
+    finally:
+        writer.close()
+
+
+async def run_simulated_clients(host, port, client_count, number_of_questions):
+    """Run client_count simulated quiz takers against a running server at the same time, and print how it went."""
+    answer_times = []
+    start_time = time.perf_counter()
+    clients = [run_simulated_client(host, port, number_of_questions, answer_times) for _ in range(client_count)]
+    finished = await asyncio.gather(*clients, return_exceptions=True)
+    elapsed_seconds = time.perf_counter() - start_time
+
+    completed_count = sum(1 for result in finished if result is True)
+    print(f'{completed_count} of {client_count} simulated quiz takers finished in {elapsed_seconds:.2f} seconds.')
+    if answer_times:
+        answer_times.sort()
+        p99_time = answer_times[min(len(answer_times) - 1, int(len(answer_times) * 0.99))]
+        print(f'{len(answer_times) / elapsed_seconds:.0f} answers per second, '
+              f'median answer round trip {statistics.median(answer_times) * 1000:.1f} ms, p99 {p99_time * 1000:.1f} ms.')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve quizzes to many quiz takers at once over TCP.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='run the quiz server')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8765)
+    serve_parser.add_argument('--max-sessions', type=int, default=5000, help='quiz sessions allowed at the same time')
+    serve_parser.add_argument('--db-workers', type=int, default=8, help='threads running database calls')
+    serve_parser.add_argument('--question-bank', action='store_true', help='build quizzes from the in-memory question bank')
+
+    bench_parser = subparsers.add_parser('bench', help='connect many simulated quiz takers to a running server')
+    bench_parser.add_argument('--host', default='127.0.0.1')
+    bench_parser.add_argument('--port', type=int, default=8765)
+    bench_parser.add_argument('--clients', type=int, default=1000, help='simulated quiz takers connected at the same time')
+    bench_parser.add_argument('--questions', type=int, default=5, help='questions each simulated quiz taker asks for')
+
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        if args.question_bank:
+            db_config.question_bank = True
+        quiz_server = QuizServer(max_sessions=args.max_sessions, db_workers=args.db_workers)
+        try:
+            asyncio.run(quiz_server.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            quiz_server.close()
+    else:
+        asyncio.run(run_simulated_clients(args.host, args.port, args.clients, args.questions))
+
+
+if __name__ == '__main__':
+    main()
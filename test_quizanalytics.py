@@ -0,0 +1,128 @@
+import datetime
+import unittest
+from unittest import TestCase
+
+from peewee import *
+
+import db_config
+test_db_path = 'test_quiz.db'
+db_config.database_path = test_db_path
+
+import quizanalytics
+import quizdatabase
+from quizdatabase import Question
+
+
+DAY_ONE = datetime.datetime(2024, 3, 1, 12, tzinfo=datetime.timezone.utc).timestamp()
+DAY_TWO = DAY_ONE + quizanalytics.SECONDS_PER_DAY
+
+
+class TestQuizAnalytics(TestCase):
+
+    def setUp(self):
+        '''Clear and remake the tables for the test database, then add questions and results over two days.'''
+        self.db = SqliteDatabase(test_db_path)
+        self.db.drop_tables(quizdatabase.MODELS)
+        self.db.create_tables(quizdatabase.MODELS)
+        quizdatabase.notify_questions_changed()
+
+        easy_question = Question(question='Easy Question', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=2, category='Category One')
+        easy_question.save()
+        hard_question = Question(question='Hard Question', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=5, points=6, category='Category One')
+        hard_question.save()
+        other_question = Question(question='Other Question', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=3, points=4, category='Category Two')
+        other_question.save()
+
+        quizdatabase.create_question_result(DAY_ONE, DAY_ONE + 2, 'Yes', 2, True, 'Session One', easy_question.id, 2000)
+        quizdatabase.create_question_result(DAY_ONE, DAY_ONE + 4, 'No', 6, False, 'Session One', hard_question.id, 4000)
+        quizdatabase.create_question_result(DAY_TWO, DAY_TWO + 1, 'Yes', 2, True, 'Session Two', easy_question.id, 1000)
+        quizdatabase.create_question_result(DAY_TWO, DAY_TWO + 3, 'Yes', 6, True, 'Session Two', hard_question.id, 3000)
+        quizdatabase.create_question_result(DAY_TWO, DAY_TWO + 5, 'No', 4, False, 'Session Three', other_question.id, 5000)
+
+        self.questions = quizanalytics.load_question_columns()
+        self.results = quizanalytics.load_result_columns(fetch_size=2)
+
+
+    def test_load_result_columns(self):
+        self.assertEqual([1, 2, 1, 2, 3], self.results.question_ids.tolist())
+        self.assertEqual([1, 0, 1, 1, 0], self.results.is_correct.tolist())
+        self.assertEqual(['Category One', 'Category Two'], self.questions.categories)
+
+
+    def test_load_result_columns_with_date_range(self):
+        results = quizanalytics.load_result_columns(start=DAY_TWO)
+
+        self.assertEqual([1000, 3000, 5000], results.response_times.tolist())
+
+
+    def test_load_result_columns_fills_arrays_sized_from_the_count(self):
+        results = quizanalytics.load_result_columns(end=DAY_TWO, fetch_size=1)
+
+        self.assertEqual([2, 2, 2, 2, 2], [len(column) for column in results])
+        self.assertEqual([DAY_ONE + 2, DAY_ONE + 4], results.timestamps.tolist())
+        self.assertEqual(['int64', 'float64', 'int64', 'int64', 'int64'], [column.dtype.name for column in results])
+
+
+    def test_category_day_stats(self):
+        expected = [
+            quizanalytics.CategoryDayStats('Category One', datetime.date(2024, 3, 1), 2, 0.5, 25.0, 3000.0),
+            quizanalytics.CategoryDayStats('Category One', datetime.date(2024, 3, 2), 2, 1.0, 100.0, 2000.0),
+            quizanalytics.CategoryDayStats('Category Two', datetime.date(2024, 3, 2), 1, 0.0, 0.0, 5000.0),
+        ]
+
+        stats = quizanalytics.get_category_day_stats(self.results, self.questions)
+
+        self.assertEqual(expected, stats)
+
+
+    def test_difficulty_accuracy_curves(self):
+        curves = quizanalytics.get_difficulty_accuracy(self.results, self.questions)
+
+        category_one_curve = [(curve.difficulty, curve.accuracy) for curve in curves if curve.category == 'Category One']
+
+        self.assertEqual([(1, 1.0), (2, None), (3, None), (4, None), (5, 0.5)], category_one_curve)
+        self.assertEqual(10, len(curves))
+
+
+    def test_results_for_deleted_questions_are_left_out(self):
+        Question.delete().where(Question.category == 'Category Two').execute()
+        questions = quizanalytics.load_question_columns()
+
+        stats = quizanalytics.get_category_day_stats(self.results, questions)
+
+        self.assertEqual(['Category One', 'Category One'], [category_day_stats.category for category_day_stats in stats])
+
+
+    def test_score_distribution(self):
+        # Session One scored 25%, Session Two 100% and Session Three 0%
+        expected = [quizanalytics.ScoreBin(0.0, 50.0, 2), quizanalytics.ScoreBin(50.0, 100.0, 1)]
+
+        score_bins = quizanalytics.get_score_distribution(bin_count=2)
+
+        self.assertEqual(expected, score_bins)
+        self.assertEqual([1, 1], [score_bin.sessions for score_bin in quizanalytics.get_score_distribution(bin_count=2, category='Category One')])
+
+
+    def test_score_distribution_between_start_and_end(self):
+        # Session One ended on day one, Sessions Two and Three on day two
+        day_one_bins = quizanalytics.get_score_distribution(bin_count=2, end=DAY_TWO)
+        day_two_bins = quizanalytics.get_score_distribution(bin_count=2, start=DAY_TWO)
+
+        self.assertEqual([1, 0], [score_bin.sessions for score_bin in day_one_bins])
+        self.assertEqual([1, 1], [score_bin.sessions for score_bin in day_two_bins])
+
+
+    def test_empty_database(self):
+        self.db.drop_tables(quizdatabase.MODELS)
+        self.db.create_tables(quizdatabase.MODELS)
+
+        questions = quizanalytics.load_question_columns()
+        results = quizanalytics.load_result_columns()
+
+        self.assertEqual([], quizanalytics.get_category_day_stats(results, questions))
+        self.assertEqual([], quizanalytics.get_difficulty_accuracy(results, questions))
+        self.assertEqual(0, sum(score_bin.sessions for score_bin in quizanalytics.get_score_distribution()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+import io
+import json
+import os
+import unittest
+from unittest import TestCase
+
+from peewee import *
+
+import db_config
+test_db_path = 'test_quiz.db'
+db_config.database_path = test_db_path
+
+import quizanalytics
+import quizarchive
+import quizdatabase
+import quizexporter
+from quizdatabase import ArchivedResult
+from quizdatabase import Question
+from quizdatabase import Result
+from quizdatabase import Session
+
+
+OLD_TIMESTAMP = quizarchive.get_retention_cutoff(400)
+NEW_TIMESTAMP = quizarchive.get_retention_cutoff(1)
+
+
+class TestQuizArchive(TestCase):
+
+    def setUp(self):
+        '''Clear and remake the tables for the test database, with no archive, then add two old sessions and a new one.'''
+        quizdatabase.detach_archive()
+        if os.path.exists(quizdatabase.get_archive_path()):
+            os.remove(quizdatabase.get_archive_path())
+
+        self.db = SqliteDatabase(test_db_path)
+        self.db.drop_tables(quizdatabase.MODELS)
+        self.db.create_tables(quizdatabase.MODELS)
+        quizdatabase.notify_questions_changed()
+
+        sample_question_one = Question(question='Test Question One', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=3, category='Category One')
+        sample_question_one.save()
+
+        for session_id, timestamp in [('Old Session One', OLD_TIMESTAMP), ('Old Session Two', OLD_TIMESTAMP + 10), ('New Session', NEW_TIMESTAMP)]:
+            quizdatabase.create_question_result(timestamp, timestamp + 1, 'Yes', 3, True, session_id, sample_question_one.id)
+            quizdatabase.create_question_result(timestamp + 1, timestamp + 3, 'No', 3, False, session_id, sample_question_one.id)
+
+
+    def tearDown(self):
+        quizdatabase.detach_archive()
+        os.remove(quizdatabase.get_archive_path())
+
+
+    def test_archive_moves_old_sessions_in_batches(self):
+        reports = []
+
+        report = quizarchive.archive_old_sessions(retention_days=365, batch_size=1, progress=reports.append)
+
+        hot_sessions = {result.session.sessionid for result in Result.select(Result, Session).join(Session)}
+        archived_query = ArchivedResult.select(Session.sessionid).join(Session, on=(ArchivedResult.session == Session.id))
+        archived_sessions = {session_id for (session_id,) in archived_query.tuples()}
+
+        self.assertEqual(quizarchive.ArchiveReport(2, 4), report)
+        self.assertEqual({'New Session'}, hot_sessions)
+        self.assertEqual({'Old Session One', 'Old Session Two'}, archived_sessions)
+        self.assertEqual([quizarchive.ArchiveReport(1, 2), quizarchive.ArchiveReport(2, 4)], reports)
+        self.assertEqual(3, quizdatabase.get_session_summary('Old Session One').score)
+
+
+    def test_session_still_in_progress_at_cutoff_is_not_archived(self):
+        quizdatabase.create_question_result(NEW_TIMESTAMP, NEW_TIMESTAMP + 1, 'Yes', 3, True, 'Old Session Two', 1)
+
+        report = quizarchive.archive_old_sessions(retention_days=365)
+
+        self.assertEqual(quizarchive.ArchiveReport(1, 2), report)
+        self.assertEqual(3, Result.select().join(Session).where(Session.sessionid == 'Old Session Two').count())
+
+
+    def test_archived_results_keep_their_ids_and_are_not_copied_twice(self):
+        expected = [1, 2, 3, 4]
+        quizdatabase.attach_archive(create=True)
+        # as if an earlier run committed to the archive but not to the main database
+        ArchivedResult.insert(id=1, timestampstart=OLD_TIMESTAMP, timestampend=OLD_TIMESTAMP + 1, responsetime=1000, answercode=0,
+                              points=3, iscorrect=1, session=quizdatabase.get_session_keys(['Old Session One'])['Old Session One'], questionid=1).execute()
+
+        quizarchive.archive_old_sessions(retention_days=365)
+
+        archived_ids = [result.id for result in ArchivedResult.select().order_by(ArchivedResult.id)]
+
+        self.assertEqual(expected, archived_ids)
+
+
+    def test_results_written_after_an_archive_get_new_ids_and_are_archived_too(self):
+        quizarchive.archive_old_sessions(retention_days=0)
+        quizdatabase.create_question_result(NEW_TIMESTAMP, NEW_TIMESTAMP + 1, 'Yes', 3, True, 'Later Session', 1)
+        later_result_id = Result.get().id
+
+        report = quizarchive.archive_old_sessions(retention_days=0)
+
+        archived_ids = [result.id for result in ArchivedResult.select().order_by(ArchivedResult.id)]
+
+        self.assertEqual(7, later_result_id)
+        self.assertEqual(quizarchive.ArchiveReport(1, 1), report)
+        self.assertEqual([1, 2, 3, 4, 5, 6, 7], archived_ids)
+        self.assertEqual(0, Result.select().count())
+
+
+    def test_migration_gives_result_ids_autoincrement_past_the_archive(self):
+        quizarchive.archive_old_sessions(retention_days=0)
+        # a version 10 database, whose result table has a plain INTEGER PRIMARY KEY and has handed out ids up to 6
+        (table_sql,) = quizdatabase.db.execute_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'result'").fetchone()
+        quizdatabase.db.execute_sql('DROP TABLE result')
+        quizdatabase.db.execute_sql(table_sql.replace('AUTOINCREMENT', ''))
+        quizdatabase.db.pragma('user_version', 10)
+
+        quizdatabase.create_table()
+        quizdatabase.create_question_result(NEW_TIMESTAMP, NEW_TIMESTAMP + 1, 'Yes', 3, True, 'Later Session', 1)
+
+        (table_sql,) = quizdatabase.db.execute_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'result'").fetchone()
+
+        self.assertIn('AUTOINCREMENT', table_sql)
+        self.assertEqual(7, Result.get().id)
+
+
+    def test_move_sessions_refuses_to_delete_results_it_could_not_archive(self):
+        quizdatabase.attach_archive(create=True)
+        # an archived result with the id of a hot result from another session
+        ArchivedResult.insert(id=5, timestampstart=OLD_TIMESTAMP, timestampend=OLD_TIMESTAMP + 1, responsetime=1000, answercode=0,
+                              points=3, iscorrect=1, session=99, questionid=1).execute()
+        new_session_key = quizdatabase.get_session_keys(['New Session'])['New Session']
+
+        with self.assertRaises(quizdatabase.QuizDBError):
+            with quizdatabase.db.atomic():
+                quizarchive.move_sessions([new_session_key])
+
+        self.assertEqual(6, Result.select().count())
+        self.assertEqual(1, ArchivedResult.select().count())
+
+
+    def test_export_reads_the_archive_when_asked(self):
+        quizarchive.archive_old_sessions(retention_days=365)
+
+        output_file = io.StringIO()
+        exported_count = quizexporter.export_results(output_file, file_format='jsonl', with_question=True, include_archive=True)
+        rows = [json.loads(line) for line in output_file.getvalue().splitlines()]
+
+        self.assertEqual(2, quizexporter.export_results(io.StringIO()))
+        self.assertEqual(6, exported_count)
+        self.assertEqual([1, 2, 3, 4, 5, 6], [row['id'] for row in rows])
+        self.assertEqual({'Category One'}, {row['category'] for row in rows})
+
+
+    def test_analytics_reads_the_archive_when_asked(self):
+        quizarchive.archive_old_sessions(retention_days=365)
+
+        results = quizanalytics.load_result_columns()
+        all_results = quizanalytics.load_result_columns(include_archive=True)
+
+        self.assertEqual(2, len(results.question_ids))
+        self.assertEqual(6, len(all_results.question_ids))
+
+
+    def test_rebuilds_include_archived_results(self):
+        quizarchive.archive_old_sessions(retention_days=365)
+
+        session_count = quizdatabase.rebuild_session_summaries()
+        question_count = quizdatabase.rebuild_question_stats()
+        question_stats = quizdatabase.QuestionStats.get_by_id(1)
+
+        self.assertEqual(3, session_count)
+        self.assertEqual(1, question_count)
+        self.assertEqual(6, question_stats.attempts)
+        self.assertEqual(3, question_stats.correctcount)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import unittest
+from unittest import TestCase
+
+from peewee import *
+
+import db_config
+test_db_path = 'test_quiz.db'
+db_config.database_path = test_db_path
+
+import quizbank
+import quizdatabase
+import quizengine
+from quizdatabase import Question
+from quizdatabase import QuizDBError
+from quizdatabase import Result
+
+
+class TestQuizBank(TestCase):
+
+    def setUp(self):
+        '''Clear and remake the tables, with the question_version triggers, then add three questions.'''
+        self.db = SqliteDatabase(test_db_path)
+        self.db.drop_tables(quizdatabase.MODELS)
+        self.db.create_tables(quizdatabase.MODELS)
+        quizdatabase.db.pragma('user_version', 0)
+        quizdatabase.create_table()
+        quizdatabase.notify_questions_changed()
+
+        for number, (difficulty, category) in enumerate([(1, 'Category One'), (3, 'Category One'), (5, 'Category Two')]):
+            Question(question=f'Test Question {number}', answercorrect='True', answerincorrecta='False', answerincorrectb='Maybe', answerincorrectc='Never', difficulty=difficulty, points=2, category=category).save()
+
+        self.question_bank = quizbank.QuestionBank(check_seconds=0)
+
+
+    def tearDown(self):
+        db_config.question_bank = False
+
+
+    def test_bank_matches_database(self):
+        self.question_bank.reload_if_changed()
+
+        question = self.question_bank.get_question_by_id(2)
+
+        self.assertEqual(quizdatabase.get_category_catalog(), self.question_bank.get_category_catalog())
+        self.assertEqual(quizdatabase.count_questions_by_difficulty('Category One'), self.question_bank.count_questions_by_difficulty('Category One'))
+        self.assertEqual(('Test Question 1', 'True', 3, 2, 'Category One'), (question.question, question.answercorrect, question.difficulty, question.points, question.category))
+
+
+    def test_bank_questions_are_compact_and_share_strings(self):
+        self.question_bank.reload_if_changed()
+
+        first, second = self.question_bank.get_questions_by_ids([1, 2])
+
+        self.assertFalse(hasattr(first, '__dict__'))
+        self.assertIs(first.answercorrect, second.answercorrect)
+        self.assertIs(first.category, second.category)
+
+
+    def test_random_questions_by_category(self):
+        self.question_bank.reload_if_changed()
+
+        questions = self.question_bank.get_random_questions_by_category('Category One', 2)
+
+        self.assertCountEqual([1, 2], [question.id for question in questions])
+        with self.assertRaises(QuizDBError):
+            self.question_bank.get_random_questions_by_category('Category One', 3)
+
+
+    def test_category_ids_are_kept_until_a_question_changes(self):
+        quizbank.question_bank.reload_if_changed()
+        category_ids = quizbank.question_bank.category_ids['Category One']
+
+        quizbank.question_bank.get_random_questions_by_category('Category One', 2)
+        quizbank.question_bank.reload_if_changed()
+
+        self.assertIs(category_ids, quizbank.question_bank.category_ids['Category One'])
+
+        Question(question='New Question', answercorrect='True', answerincorrecta='False', answerincorrectb='Maybe', answerincorrectc='Never', difficulty=2, points=2, category='Category One').save()
+        quizbank.question_bank.reload_if_changed()
+
+        self.assertEqual(3, len(quizbank.question_bank.category_ids['Category One']))
+        self.assertEqual(3, len(quizbank.question_bank.get_random_questions_by_category('Category One', 3)))
+
+
+    def test_unknown_category_raises_QuizDBError(self):
+        self.question_bank.reload_if_changed()
+
+        with self.assertRaises(QuizDBError):
+            self.question_bank.count_questions_by_category('Not A Category')
+
+
+    def test_bank_reloads_after_question_change_in_this_process(self):
+        quizbank.question_bank.reload_if_changed()
+        load_count = quizbank.question_bank.load_count
+
+        Question(question='New Question', answercorrect='True', answerincorrecta='False', answerincorrectb='Maybe', answerincorrectc='Never', difficulty=2, points=2, category='Category Three').save()
+        quizbank.question_bank.reload_if_changed()
+
+        self.assertEqual(load_count + 1, quizbank.question_bank.load_count)
+        self.assertEqual(1, quizbank.question_bank.count_questions_by_category('Category Three'))
+
+
+    def test_bank_reloads_after_question_change_by_another_connection(self):
+        self.question_bank.reload_if_changed()
+        load_count = self.question_bank.load_count
+
+        # a separate connection, like another program, doesn't run this process's question change hooks
+        self.db.execute_sql("UPDATE question SET category = 'Category Two' WHERE id = 1")
+        self.question_bank.reload_if_changed()
+
+        self.assertEqual(load_count + 1, self.question_bank.load_count)
+        self.assertEqual(2, self.question_bank.count_questions_by_category('Category Two'))
+
+
+    def test_bank_does_not_reload_when_nothing_changed(self):
+        self.question_bank.reload_if_changed()
+        load_count = self.question_bank.load_count
+
+        quizdatabase.create_question_result(0, 1, 'True', 2, True, 'Session One', 1)
+        self.question_bank.reload_if_changed()
+
+        self.assertEqual(load_count, self.question_bank.load_count)
+
+
+    def test_get_question_source(self):
+        self.assertIs(quizdatabase, quizbank.get_question_source())
+
+        db_config.question_bank = True
+
+        self.assertIs(quizbank.question_bank, quizbank.get_question_source())
+
+
+    def test_quiz_session_with_bank_questions_saves_results(self):
+        self.question_bank.reload_if_changed()
+        questions = self.question_bank.get_random_questions_by_category('Category One', 2)
+
+        with quizengine.QuizSession(questions, 'Session One') as quiz_session:
+            for _ in questions:
+                question, answer_list = quiz_session.next_question()
+                quiz_session.answer(answer_list.index('True'))
+
+        self.assertEqual(2, Result.select().count())
+        self.assertEqual(4, quiz_session.get_summary().score)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+from unittest import TestCase
+from unittest.mock import patch
+
+import quizbenchmark
+
+
+class TestQuizBenchmark(TestCase):
+
+
+    def test_compare_to_baseline_flags_slower_benchmark(self):
+        baseline = {'timings': {'fast': {'median_ms': 1.0}, 'slow': {'median_ms': 1.0}}}
+        report = {'timings': {'fast': {'median_ms': 1.1}, 'slow': {'median_ms': 2.0}}}
+
+        regressions = quizbenchmark.compare_to_baseline(report, baseline, tolerance=0.25)
+
+        self.assertEqual([('slow', 1.0, 2.0)], regressions)
+
+
+    def test_compare_to_baseline_ignores_noise_on_tiny_timings(self):
+        baseline = {'timings': {'tiny': {'median_ms': 0.001}}}
+        report = {'timings': {'tiny': {'median_ms': 0.01}}}
+
+        regressions = quizbenchmark.compare_to_baseline(report, baseline, tolerance=0.25)
+
+        self.assertEqual([], regressions)
+
+
+    def test_compare_to_baseline_skips_benchmarks_not_in_baseline(self):
+        baseline = {'timings': {}}
+        report = {'timings': {'new': {'median_ms': 5.0}}}
+
+        regressions = quizbenchmark.compare_to_baseline(report, baseline)
+
+        self.assertEqual([], regressions)
+
+
+    def test_time_function_stops_at_max_runs(self):
+        calls = []
+
+        timing = quizbenchmark.time_function(lambda: calls.append(1), min_seconds=10, max_runs=5)
+
+        self.assertEqual(5, timing['runs'])
+        self.assertEqual(5, len(calls))
+
+
+    @patch('quizanalytics.load_result_columns')
+    @patch('quizanalytics.load_question_columns')
+    def test_analytics_columns_only_loaded_when_selected(self, mock_load_question_columns, mock_load_result_columns):
+        self.assertEqual([], quizbenchmark.get_analytics_benchmarks(only=['get_category_list']))
+
+        benchmarks = quizbenchmark.get_analytics_benchmarks(only=['analytics.get_score_distribution'])
+
+        self.assertEqual(['analytics.get_score_distribution'], [name for name, function, max_runs in benchmarks])
+        mock_load_question_columns.assert_not_called()
+        mock_load_result_columns.assert_not_called()
+
+        quizbenchmark.get_analytics_benchmarks(only=['analytics.get_difficulty_accuracy'])
+
+        mock_load_question_columns.assert_called_once()
+        mock_load_result_columns.assert_called_once()
+
+
+    def test_main_starts_without_importing_peewee(self):
+        import_times = quizbenchmark.get_startup_import_times('main')
+        imported_modules = [module_name for module_name, import_ms in import_times]
+
+        self.assertIn('main', imported_modules)
+        self.assertNotIn('peewee', imported_modules)
+        self.assertNotIn('quizdatabase', imported_modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
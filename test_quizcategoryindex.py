@@ -0,0 +1,41 @@
+import unittest
+from unittest import TestCase
+
+import quizcategoryindex
+
+
+class TestCategoryIndex(TestCase):
+
+    def setUp(self):
+        self.category_index = quizcategoryindex.CategoryIndex(['Science', 'history', 'Sports', 'Art', 'science fiction', 'Spanish'])
+
+
+    def test_categories_are_sorted_ignoring_case(self):
+        expected = ['Art', 'history', 'Science', 'science fiction', 'Spanish', 'Sports']
+
+        self.assertEqual(expected, self.category_index.categories)
+
+
+    def test_count_prefix_ignores_case(self):
+        self.assertEqual(4, self.category_index.count_prefix('s'))
+        self.assertEqual(2, self.category_index.count_prefix('SCIENCE'))
+        self.assertEqual(0, self.category_index.count_prefix('Zoology'))
+        self.assertEqual(6, self.category_index.count_prefix(''))
+
+
+    def test_get_page_of_prefix_matches(self):
+        expected = ['Spanish', 'Sports']
+
+        page = self.category_index.get_page('s', 1, 2)
+
+        self.assertEqual(expected, page)
+        self.assertEqual(2, self.category_index.page_count('s', 2))
+
+
+    def test_get_page_past_the_matches_is_empty(self):
+        self.assertEqual([], self.category_index.get_page('art', 1, 2))
+        self.assertEqual(1, self.category_index.page_count('Zoology', 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
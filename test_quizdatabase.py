@@ -1,4 +1,5 @@
 
+import time
 import unittest 
 from unittest import TestCase
 from unittest.mock import patch
@@ -9,10 +10,24 @@ test_db_path = 'test_quiz.db'
 db_config.database_path = test_db_path 
 
 import quizdatabase
+import quizschema
 from quizdatabase import Question
 from quizdatabase import Result
+from quizdatabase import SessionSummary
 from quizdatabase import QuizDBError
 
+
+def make_old_result_table(with_response_time=True):
+    """Swap the result table for one in the layout from before session keys and answer codes, version 9 or, without response times, 8."""
+    quizdatabase.db.execute_sql('DROP TABLE result')
+    response_time_column = 'responsetime INTEGER NOT NULL DEFAULT 0, ' if with_response_time else ''
+    quizdatabase.db.execute_sql('CREATE TABLE result (id INTEGER NOT NULL PRIMARY KEY, timestampstart INTEGER NOT NULL, timestampend INTEGER NOT NULL, '
+                                f'{response_time_column}useranswer VARCHAR(255) NOT NULL, points INTEGER NOT NULL, iscorrect INTEGER NOT NULL, '
+                                'sessionid VARCHAR(255) NOT NULL, questionid_id INTEGER NOT NULL)')
+    quizdatabase.db.execute_sql('CREATE INDEX result_timestampend ON result (timestampend)')
+    quizdatabase.db.execute_sql('CREATE INDEX result_sessionid ON result (sessionid)')
+
+
 class TestQuiz(TestCase):
 
     test_db_url = 'test_quiz.db'
@@ -25,8 +40,10 @@ class TestQuiz(TestCase):
     def setUp(self):
         '''Clear and remake Question and Result tables for test database.'''
         self.db = SqliteDatabase(test_db_path)
-        self.db.drop_tables([Question, Result])
-        self.db.create_tables([Question, Result])
+        self.db.drop_tables(quizdatabase.MODELS)
+        self.db.create_tables(quizdatabase.MODELS)
+        quizdatabase.db.pragma('user_version', 0)
+        quizdatabase.notify_questions_changed()
 
 
     def test_get_all_questions_with_questions_in_db(self):
@@ -58,6 +75,73 @@ class TestQuiz(TestCase):
         self.assertCountEqual(categories, expected)
 
 
+    def test_get_category_catalog_counts_questions_per_category(self):
+        sample_question_one = Question(question='Test Question One', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category One')
+        sample_question_two = Question(question='Test Question Two', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=2, points=1, category='Category One')
+        sample_question_three = Question(question='Test Question Three', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category Two')
+        sample_question_one.save()
+        sample_question_two.save()
+        sample_question_three.save()
+
+        expected = {'Category One': 2, 'Category Two': 1}
+
+        catalog = quizdatabase.get_category_catalog()
+
+        self.assertEqual(catalog, expected)
+
+
+    def test_get_category_catalog_is_invalidated_when_question_saved(self):
+        sample_question_one = Question(question='Test Question One', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category One')
+        sample_question_one.save()
+        quizdatabase.get_category_catalog()
+
+        sample_question_two = Question(question='Test Question Two', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category Two')
+        sample_question_two.save()
+
+        expected = {'Category One': 1, 'Category Two': 1}
+
+        catalog = quizdatabase.get_category_catalog()
+
+        self.assertEqual(catalog, expected)
+
+
+    def test_get_category_catalog_is_invalidated_when_question_deleted(self):
+        sample_question_one = Question(question='Test Question One', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category One')
+        sample_question_two = Question(question='Test Question Two', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category Two')
+        sample_question_one.save()
+        sample_question_two.save()
+        quizdatabase.get_category_catalog()
+
+        sample_question_two.delete_instance()
+
+        expected = {'Category One': 1}
+
+        catalog = quizdatabase.get_category_catalog()
+
+        self.assertEqual(catalog, expected)
+
+
+    @patch('db_config.question_version_check_seconds', 0)
+    def test_get_category_catalog_sees_questions_added_by_another_connection(self):
+        quizdatabase.create_table()
+        sample_question_one = Question(question='Test Question One', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category One')
+        sample_question_one.save()
+        quizdatabase.get_category_catalog()
+        quizdatabase.get_question_ids_by_category('Category One')
+
+        # another program's insert runs none of this process's hooks, only the question_version trigger
+        self.db.execute_sql("INSERT INTO question (question, answercorrect, answerincorrecta, answerincorrectb, answerincorrectc, difficulty, points, category) "
+                            "VALUES ('Test Question Two', 'Yes', 'No', 'No', 'No', 1, 1, 'Category One')")
+
+        self.assertEqual({'Category One': 2}, quizdatabase.get_category_catalog())
+        self.assertEqual(2, len(quizdatabase.get_question_ids_by_category('Category One')))
+
+
+    def test_get_category_list_no_questions_in_db_raises_QuizDBError(self):
+        with self.assertRaises(QuizDBError):
+            categories = quizdatabase.get_category_list()
+
+
     def test_get_all_questions_no_questions_in_db_raises_QuizDBError(self):
         with self.assertRaises(QuizDBError):
             questions = quizdatabase.get_all_questions()
@@ -86,6 +170,59 @@ class TestQuiz(TestCase):
             questions = quizdatabase.get_questions_by_category(category)
 
 
+    def test_count_questions_by_category(self):
+        sample_question_one = Question(question='Test Question One', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category One')
+        sample_question_two = Question(question='Test Question Two', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category One')
+        sample_question_three = Question(question='Test Question Three', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category Two')
+        sample_question_one.save()
+        sample_question_two.save()
+        sample_question_three.save()
+
+        question_count = quizdatabase.count_questions_by_category('Category One')
+
+        self.assertEqual(2, question_count)
+
+
+    def test_count_questions_by_category_invalid_category_raises_QuizDBError(self):
+        with self.assertRaises(QuizDBError):
+            question_count = quizdatabase.count_questions_by_category('Category One')
+
+
+    def test_get_random_questions_by_category_returns_requested_number_from_category(self):
+        for number in range(10):
+            Question(question=f'Test Question {number}', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category One').save()
+        Question(question='Other Question', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category Two').save()
+
+        questions = quizdatabase.get_random_questions_by_category('Category One', 4)
+        question_ids = {question.id for question in questions}
+        categories = {question.category for question in questions}
+
+        self.assertEqual(4, len(question_ids))
+        self.assertEqual({'Category One'}, categories)
+
+
+    def test_get_random_questions_by_category_more_than_available_raises_QuizDBError(self):
+        Question(question='Test Question One', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category One').save()
+
+        with self.assertRaises(QuizDBError):
+            questions = quizdatabase.get_random_questions_by_category('Category One', 2)
+
+
+    def test_get_questions_by_ids_keeps_order_of_ids(self):
+        for number in range(3):
+            Question(question=f'Test Question {number}', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category One').save()
+
+        questions = quizdatabase.get_questions_by_ids([3, 1, 2])
+        question_ids = [question.id for question in questions]
+
+        self.assertEqual([3, 1, 2], question_ids)
+
+
+    def test_get_questions_by_ids_missing_id_raises_QuizDBError(self):
+        with self.assertRaises(QuizDBError):
+            questions = quizdatabase.get_questions_by_ids([1])
+
+
     def test_get_question_by_id_valid_id(self):
         sample_question_one = Question(question='Test Question One', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category')
         sample_question_two = Question(question='Test Question Two', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category')
@@ -97,6 +234,58 @@ class TestQuiz(TestCase):
         self.assertIsNotNone(questions)
 
 
+    def test_repeated_category_lookups_are_served_from_the_question_caches(self):
+        for number in range(2):
+            Question(question=f'Test Question {number}', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category One').save()
+        stats_before = quizdatabase.get_question_cache_stats()
+
+        first_questions = quizdatabase.get_questions_by_category('Category One')
+        second_questions = quizdatabase.get_questions_by_category('Category One')
+        stats_after = quizdatabase.get_question_cache_stats()
+
+        self.assertEqual(first_questions, second_questions)
+        self.assertEqual((1, 1), (stats_after['category_ids'].hits - stats_before['category_ids'].hits, stats_after['category_ids'].misses - stats_before['category_ids'].misses))
+        self.assertEqual((2, 2), (stats_after['questions'].hits - stats_before['questions'].hits, stats_after['questions'].misses - stats_before['questions'].misses))
+
+
+    def test_saving_or_deleting_a_question_clears_the_question_caches(self):
+        sample_question_one = Question(question='Test Question One', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category One')
+        sample_question_one.save()
+        quizdatabase.get_question_by_id(sample_question_one.id)
+        quizdatabase.get_question_ids_by_category('Category One')
+
+        Question.get_by_id(sample_question_one.id).delete_instance()
+
+        with self.assertRaises(QuizDBError):
+            quizdatabase.get_question_by_id(sample_question_one.id)
+        self.assertEqual([], quizdatabase.get_question_ids_by_category('Category One'))
+
+
+    def test_lru_cache_evicts_least_recently_used_and_expires_old_entries(self):
+        lru_cache = quizdatabase.LRUCache(max_size=2, ttl_seconds=10)
+        with patch('time.monotonic', return_value=100):
+            lru_cache.store({1: 'one', 2: 'two'}, 0)
+            lru_cache.lookup([1])
+            lru_cache.store({3: 'three'}, 0)
+            found, generation = lru_cache.lookup([1, 2, 3])
+        with patch('time.monotonic', return_value=111):
+            expired, _ = lru_cache.lookup([1, 3])
+
+        self.assertEqual({1: 'one', 3: 'three'}, found)
+        self.assertEqual({}, expired)
+        self.assertEqual(quizdatabase.CacheStats(3, 3, 0), lru_cache.get_stats())
+
+
+    def test_lru_cache_ignores_values_loaded_before_clear(self):
+        lru_cache = quizdatabase.LRUCache(max_size=2, ttl_seconds=10)
+        _, generation = lru_cache.lookup([1])
+
+        lru_cache.clear()
+        lru_cache.store({1: 'stale'}, generation)
+
+        self.assertEqual(0, lru_cache.get_stats().size)
+
+
     def test_get_question_by_id_not_in_database_raises_QuizDBError(self):
         with self.assertRaises(QuizDBError):
             questions = quizdatabase.get_question_by_id(2)
@@ -180,6 +369,87 @@ class TestQuiz(TestCase):
         self.assertIsNotNone(result)
 
 
+    def test_results_store_session_keys_and_answer_codes(self):
+        sample_question_one = Question(question='Test Question One', answercorrect='Yes', answerincorrecta='Maybe', answerincorrectb='No', answerincorrectc='Never', difficulty=1, points=3, category='Category One')
+        sample_question_one.save()
+
+        quizdatabase.create_question_result(1, 2, 'No', 3, False, 1234, sample_question_one.id)
+        quizdatabase.create_question_result(2, 3, 'Not an option', 3, False, 1234, sample_question_one.id)
+        quizdatabase.create_question_result(3, 4, 'Yes', 3, True, 'Session Two', sample_question_one.id)
+
+        results = list(Result.select().order_by(Result.id))
+
+        self.assertEqual([2, None, 0], [result.answercode for result in results])
+        self.assertEqual([None, 'Not an option', None], [result.useranswer for result in results])
+        self.assertEqual(['No', 'Not an option'], [result.get_user_answer() for result in quizdatabase.get_results_by_session(1234)])
+        self.assertEqual(2, quizdatabase.Session.select().count())
+        self.assertEqual('Session Two', quizdatabase.get_last_session_id())
+
+
+    def test_result_writer_waits_for_batch_size_before_saving(self):
+        result_writer = quizdatabase.ResultWriter('Session One', batch_size=3, flush_seconds=60)
+
+        result_writer.add(1, 2, 'This is an answer', 3, True, 1)
+        result_writer.add(2, 3, 'This is an answer', 3, False, 1)
+
+        self.assertEqual(0, Result.select().count())
+
+        result_writer.add(3, 4, 'This is an answer', 3, True, 1)
+
+        self.assertEqual(3, Result.select().count())
+
+
+    def test_result_writer_saves_when_flush_time_has_passed(self):
+        result_writer = quizdatabase.ResultWriter('Session One', batch_size=100, flush_seconds=0)
+
+        result_writer.add(1, 2, 'This is an answer', 3, True, 1)
+
+        self.assertEqual(1, Result.select().count())
+
+
+    def test_result_writer_saves_waiting_results_in_the_background(self):
+        result_writer = quizdatabase.ResultWriter('Session One', batch_size=100, flush_seconds=0.1)
+
+        result_writer.add(1, 2, 'This is an answer', 3, True, 1)
+
+        self.assertEqual(0, Result.select().count())
+
+        deadline = time.monotonic() + 5
+        while result_writer.flush_count == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(1, Result.select().count())
+        self.assertNotIn(result_writer, quizdatabase.result_flusher.writers)
+
+
+    def test_result_writer_without_background_flush_waits_for_the_caller(self):
+        result_writer = quizdatabase.ResultWriter('Session One', batch_size=100, flush_seconds=0.05, background_flush=False)
+
+        result_writer.add(1, 2, 'This is an answer', 3, True, 1, autoflush=False)
+        time.sleep(0.2)
+
+        self.assertEqual(0, Result.select().count())
+        self.assertTrue(result_writer.is_flush_due())
+
+
+    def test_result_writer_saves_remaining_results_when_closed(self):
+        with quizdatabase.ResultWriter('Session One', batch_size=100, flush_seconds=60) as result_writer:
+            result_writer.add(1, 2, 'This is an answer', 3, True, 1)
+            result_writer.add(2, 3, 'This is an answer', 3, False, 1)
+
+        results = quizdatabase.get_results_by_session('Session One')
+
+        self.assertEqual(2, len(results))
+        self.assertNotIn(result_writer, quizdatabase.result_flusher.writers)
+
+
+    def test_result_writer_invalid_is_correct_raises_QuizDBError(self):
+        result_writer = quizdatabase.ResultWriter('Session One')
+
+        with self.assertRaises(QuizDBError):
+            result_writer.add(1, 2, 'This is an answer', 3, 'maybe', 1)
+
+
     def test_get_last_session_id(self):
         timestamp_start = 1
         user_answer = 'This is an answer'
@@ -260,5 +530,482 @@ class TestQuiz(TestCase):
             results = quizdatabase.get_results_by_session(12345)
 
 
+    def test_create_table_migrates_old_database_to_current_schema_version(self):
+        quizdatabase.db.execute_sql('DROP INDEX IF EXISTS result_timestampend')
+        quizdatabase.db.execute_sql('DROP INDEX IF EXISTS result_sessionid')
+        quizdatabase.db.execute_sql('DROP INDEX IF EXISTS question_category_difficulty')
+
+        quizdatabase.create_table()
+
+        result_indexes = [index.name for index in quizdatabase.db.get_indexes('result')]
+        question_indexes = [index.name for index in quizdatabase.db.get_indexes('question')]
+
+        self.assertEqual(quizdatabase.SCHEMA_VERSION, quizdatabase.get_schema_version())
+        self.assertIn('result_timestampend', result_indexes)
+        self.assertIn('result_sessionid', result_indexes)
+        self.assertIn('question_category_difficulty', question_indexes)
+
+
+    def test_create_table_with_newer_schema_version_raises_QuizDBError(self):
+        quizdatabase.db.pragma('user_version', quizdatabase.SCHEMA_VERSION + 1)
+
+        with self.assertRaises(QuizDBError):
+            quizdatabase.create_table()
+
+
+    def test_create_table_at_current_schema_version_skips_ddl(self):
+        quizdatabase.create_table()
+        quizdatabase.db.execute_sql('DROP INDEX leaderboard_ranking')
+
+        quizdatabase.create_table()
+
+        leaderboard_indexes = [index.name for index in quizdatabase.db.get_indexes('leaderboard')]
+
+        self.assertEqual(quizdatabase.SCHEMA_VERSION, quizschema.read_schema_version(test_db_path))
+        self.assertNotIn('leaderboard_ranking', leaderboard_indexes)
+
+
+    def test_read_schema_version_of_missing_file_is_zero(self):
+        self.assertEqual(0, quizschema.read_schema_version('no_such_quiz.db'))
+        self.assertFalse(quizschema.is_schema_current('no_such_quiz.db'))
+
+
+    def test_hot_queries_use_lookup_indexes(self):
+        quizdatabase.create_table()
+
+        plans = quizdatabase.get_hot_query_plans()
+
+        self.assertIn('question_category_difficulty', ' '.join(plans['category_catalog']))
+        self.assertIn('result_timestampend', ' '.join(plans['last_session']))
+        self.assertIn('result_sessionid', ' '.join(plans['results_by_session']))
+        self.assertIn('question_category_difficulty', ' '.join(plans['questions_by_category']))
+
+
+    def test_session_summary_is_updated_as_results_are_saved(self):
+        sample_question_one = Question(question='Test Question One', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=3, category='Category One')
+        sample_question_one.save()
+
+        quizdatabase.create_question_result(10, 15, 'Yes', 3, True, 'Session One', sample_question_one.id)
+        quizdatabase.create_question_result(15, 25, 'No', 4, False, 'Session One', sample_question_one.id)
+        quizdatabase.create_question_result(30, 31, 'Yes', 5, True, 'Session Two', sample_question_one.id)
+
+        summary = quizdatabase.get_session_summary('Session One')
+
+        self.assertEqual('Category One', summary.category)
+        self.assertEqual(3, summary.score)
+        self.assertEqual(7, summary.availablepoints)
+        self.assertEqual(15000, summary.totaltime)
+        self.assertEqual(2, summary.questioncount)
+        self.assertEqual(10, summary.timestampstart)
+        self.assertEqual(25, summary.timestampend)
+
+
+    def test_session_summary_is_updated_by_result_writer_batches(self):
+        with quizdatabase.ResultWriter('Session One', batch_size=2, flush_seconds=60) as result_writer:
+            result_writer.add(1, 2, 'This is an answer', 3, True, 1)
+            result_writer.add(2, 4, 'This is an answer', 3, False, 1)
+            result_writer.add(4, 7, 'This is an answer', 3, True, 1)
+
+        summary = quizdatabase.get_session_summary('Session One')
+
+        self.assertEqual(6, summary.score)
+        self.assertEqual(9, summary.availablepoints)
+        self.assertEqual(6000, summary.totaltime)
+        self.assertEqual(3, summary.questioncount)
+
+
+    def test_rebuild_session_summaries_matches_incremental_summaries(self):
+        sample_question_one = Question(question='Test Question One', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=3, category='Category One')
+        sample_question_one.save()
+
+        quizdatabase.create_question_result(10, 15, 'Yes', 3, True, 'Session One', sample_question_one.id)
+        quizdatabase.create_question_result(15, 25, 'No', 4, False, 'Session One', sample_question_one.id)
+        quizdatabase.create_question_result(30, 31, 'Yes', 5, True, 'Session Two', sample_question_one.id)
+        expected = [str(summary) for summary in SessionSummary.select().order_by(SessionSummary.sessionid)]
+
+        session_count = quizdatabase.rebuild_session_summaries()
+        rebuilt = [str(summary) for summary in SessionSummary.select().order_by(SessionSummary.sessionid)]
+
+        self.assertEqual(2, session_count)
+        self.assertEqual(expected, rebuilt)
+
+
+    def test_get_session_summary_invalid_session_raises_QuizDBError(self):
+        with self.assertRaises(QuizDBError):
+            summary = quizdatabase.get_session_summary('This is an invalid session')
+
+
+    def test_database_is_bound_to_configured_path_with_pragmas(self):
+        database_name = quizdatabase.db.database
+        journal_mode = quizdatabase.db.pragma('journal_mode')
+        synchronous = quizdatabase.db.pragma('synchronous')
+
+        self.assertEqual(test_db_path, database_name)
+        self.assertEqual('wal', journal_mode)
+        self.assertEqual(1, synchronous) # NORMAL
+
+
+    def test_configure_database_in_pool_mode(self):
+        try:
+            database = quizdatabase.configure_database(connection_mode='pool', cache_size=-1000)
+            cache_size = quizdatabase.db.pragma('cache_size')
+
+            self.assertIsInstance(database, quizdatabase.PooledSqliteDatabase)
+            self.assertEqual(-1000, cache_size)
+        finally:
+            quizdatabase.configure_database()
+
+
+    def test_configure_database_unknown_connection_mode_raises_QuizDBError(self):
+        with self.assertRaises(QuizDBError):
+            quizdatabase.configure_database(connection_mode='shared')
+
+
+    def test_question_stats_are_updated_as_results_are_saved(self):
+        sample_question_one = Question(question='Test Question One', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=3, category='Category One')
+        sample_question_one.save()
+
+        quizdatabase.create_question_result(10, 12, 'Yes', 3, True, 'Session One', sample_question_one.id)
+        with quizdatabase.ResultWriter('Session Two') as result_writer:
+            result_writer.add(20, 24, 'No', 3, False, sample_question_one.id)
+            result_writer.add(30, 36, 'No', 3, False, sample_question_one.id)
+
+        question_stats = quizdatabase.QuestionStats.get_by_id(sample_question_one.id)
+
+        self.assertEqual(3, question_stats.attempts)
+        self.assertEqual(1, question_stats.correctcount)
+        self.assertEqual(12000, question_stats.totaltime)
+        self.assertEqual(56000000, question_stats.totaltimesquared)
+        self.assertEqual(36, question_stats.lastasked)
+        self.assertAlmostEqual(4000.0, question_stats.mean_time())
+
+
+    def test_rebuild_question_stats_matches_incremental_stats(self):
+        sample_question_one = Question(question='Test Question One', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=3, category='Category One')
+        sample_question_one.save()
+        quizdatabase.create_question_result(10, 12, 'Yes', 3, True, 'Session One', sample_question_one.id)
+        quizdatabase.create_question_result(20, 24, 'No', 3, False, 'Session Two', sample_question_one.id)
+        expected = str(quizdatabase.QuestionStats.get_by_id(sample_question_one.id))
+
+        question_count = quizdatabase.rebuild_question_stats()
+        rebuilt = str(quizdatabase.QuestionStats.get_by_id(sample_question_one.id))
+
+        self.assertEqual(1, question_count)
+        self.assertEqual(expected, rebuilt)
+
+
+    def test_question_reports_by_category(self):
+        easy_question = Question(question='Easy Question', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=3, category='Category One')
+        hard_question = Question(question='Hard Question', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=5, points=3, category='Category One')
+        unused_question = Question(question='Unused Question', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=3, points=3, category='Category One')
+        easy_question.save()
+        hard_question.save()
+        unused_question.save()
+        quizdatabase.create_question_result(10, 11, 'Yes', 3, True, 'Session One', easy_question.id)
+        quizdatabase.create_question_result(20, 40, 'No', 3, False, 'Session One', hard_question.id)
+
+        most_missed = quizdatabase.get_most_missed_questions('Category One', limit=1)
+        slowest = quizdatabase.get_slowest_questions('Category One', limit=1)
+        never_asked = quizdatabase.get_never_asked_questions('Category One')
+
+        self.assertEqual('Hard Question', most_missed[0].questionid.question)
+        self.assertEqual('Hard Question', slowest[0].questionid.question)
+        self.assertEqual(['Unused Question'], [question.question for question in never_asked])
+
+
+    def test_get_most_missed_questions_compares_partial_miss_rates(self):
+        often_right = Question(question='Often Right', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=3, category='Category One')
+        often_wrong = Question(question='Often Wrong', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=3, category='Category One')
+        often_right.save()
+        often_wrong.save()
+        # often right is missed 1 in 3 times, often wrong 1 in 2 times
+        for is_correct in [True, True, False]:
+            quizdatabase.create_question_result(10, 11, 'Yes', 3, is_correct, 'Session One', often_right.id)
+        for is_correct in [True, False]:
+            quizdatabase.create_question_result(10, 11, 'Yes', 3, is_correct, 'Session One', often_wrong.id)
+
+        most_missed = quizdatabase.get_most_missed_questions('Category One')
+        questions = [question_stats.questionid.question for question_stats in most_missed]
+
+        self.assertEqual(['Often Wrong', 'Often Right'], questions)
+
+
+    def test_get_leaderboard_ranks_by_percentage_then_score_then_time(self):
+        sample_question_one = Question(question='Test Question One', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=3, category='Category One')
+        sample_question_one.save()
+        quizdatabase.create_question_result(0, 10, 'Yes', 3, True, 'Slow Perfect', sample_question_one.id)
+        quizdatabase.create_question_result(0, 5, 'Yes', 3, True, 'Fast Perfect', sample_question_one.id)
+        quizdatabase.create_question_result(0, 1, 'No', 3, False, 'Fast Wrong', sample_question_one.id)
+        quizdatabase.create_question_result(0, 5, 'Yes', 9, True, 'Big Perfect', sample_question_one.id)
+        for session_id in ['Slow Perfect', 'Fast Perfect', 'Fast Wrong', 'Big Perfect']:
+            quizdatabase.record_completed_session(session_id)
+
+        leaderboard = quizdatabase.get_leaderboard()
+        session_ids = [entry.sessionid for entry in leaderboard]
+
+        self.assertEqual(['Big Perfect', 'Fast Perfect', 'Slow Perfect', 'Fast Wrong'], session_ids)
+
+
+    def test_get_leaderboard_by_category_with_limit(self):
+        question_one = Question(question='Test Question One', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=3, category='Category One')
+        question_two = Question(question='Test Question Two', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=3, category='Category Two')
+        question_one.save()
+        question_two.save()
+        quizdatabase.create_question_result(0, 1, 'Yes', 3, True, 'Session One', question_one.id)
+        quizdatabase.create_question_result(0, 1, 'No', 3, False, 'Session Two', question_one.id)
+        quizdatabase.create_question_result(0, 1, 'Yes', 3, True, 'Session Three', question_two.id)
+        for session_id in ['Session One', 'Session Two', 'Session Three']:
+            quizdatabase.record_completed_session(session_id)
+
+        leaderboard = quizdatabase.get_leaderboard('Category One', limit=1)
+        session_ids = [entry.sessionid for entry in leaderboard]
+
+        self.assertEqual(['Session One'], session_ids)
+
+
+    def test_rebuild_leaderboard_from_session_summaries(self):
+        quizdatabase.create_question_result(0, 1, 'Yes', 3, True, 'Session One', 1)
+        quizdatabase.create_question_result(0, 1, 'No', 3, False, 'Session Two', 1)
+        for session_id in ['Session One', 'Session Two']:
+            quizdatabase.record_completed_session(session_id)
+
+        entry_count = quizdatabase.rebuild_leaderboard()
+        leaderboard = quizdatabase.get_leaderboard()
+        percentages = [entry.percentage for entry in leaderboard]
+
+        self.assertEqual(2, entry_count)
+        self.assertEqual([100.0, 0.0], percentages)
+
+
+    def test_rebuild_leaderboard_leaves_out_unfinished_sessions(self):
+        for is_correct in [True, True, False]:
+            quizdatabase.create_question_result(0, 1, 'Yes', 3, is_correct, 'Finished', 1)
+        quizdatabase.record_completed_session('Finished')
+        # left after one correct answer, so never recorded as completed
+        quizdatabase.create_question_result(0, 1, 'Yes', 3, True, 'Left Early', 1)
+        incremental_ids = [entry.sessionid for entry in quizdatabase.get_leaderboard()]
+
+        quizdatabase.rebuild_leaderboard()
+        rebuilt_ids = [entry.sessionid for entry in quizdatabase.get_leaderboard()]
+
+        self.assertEqual(['Finished'], incremental_ids)
+        self.assertEqual(['Finished'], rebuilt_ids)
+
+
+    def test_migration_marks_sessions_on_the_leaderboard_completed(self):
+        quizdatabase.create_question_result(0, 1, 'Yes', 3, True, 'Finished', 1)
+        quizdatabase.create_question_result(0, 1, 'Yes', 3, True, 'Left Early', 1)
+        quizdatabase.record_completed_session('Finished')
+        # a version 11 database, whose session table has no completed column
+        quizdatabase.db.execute_sql('CREATE TABLE session_new (id INTEGER NOT NULL PRIMARY KEY, sessionid VARCHAR(255) NOT NULL)')
+        quizdatabase.db.execute_sql('INSERT INTO session_new SELECT id, sessionid FROM session')
+        quizdatabase.db.execute_sql('DROP TABLE session')
+        quizdatabase.db.execute_sql('ALTER TABLE session_new RENAME TO session')
+        quizdatabase.db.execute_sql('CREATE UNIQUE INDEX session_sessionid ON session (sessionid)')
+        quizdatabase.db.pragma('user_version', 11)
+
+        quizdatabase.create_table()
+
+        leaderboard_ids = [entry.sessionid for entry in quizdatabase.get_leaderboard()]
+
+        self.assertEqual(['Finished'], leaderboard_ids)
+        self.assertEqual(1, quizdatabase.Session.get(quizdatabase.Session.sessionid == 'Finished').completed)
+
+
+    def test_get_leaderboard_uses_ranking_indexes(self):
+        quizdatabase.create_table()
+
+        global_plan = ' '.join(quizdatabase.explain_query_plan(quizdatabase.LeaderboardEntry.select().order_by(*quizdatabase.leaderboard_ranking()).limit(100)))
+        category_plan = ' '.join(quizdatabase.explain_query_plan(quizdatabase.LeaderboardEntry.select().where(quizdatabase.LeaderboardEntry.category == 'Category One').order_by(*quizdatabase.leaderboard_ranking()).limit(100)))
+
+        self.assertIn('leaderboard_ranking', global_plan)
+        self.assertNotIn('TEMP B-TREE', global_plan)
+        self.assertIn('leaderboard_category_ranking', category_plan)
+        self.assertNotIn('TEMP B-TREE', category_plan)
+
+
+    def test_get_random_questions_by_difficulty_profile(self):
+        for difficulty in [1, 2, 3, 3, 4, 5, 5]:
+            Question(question=f'Difficulty {difficulty}', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=difficulty, points=1, category='Category One').save()
+
+        expected = [1, 2, 3, 3, 4, 5]
+
+        questions = quizdatabase.get_random_questions_by_difficulty_profile('Category One', [(2, (1, 2)), (2, (3,)), (1, (4,)), (1, (5,))])
+        difficulties = [question.difficulty for question in questions]
+
+        self.assertEqual(expected, sorted(difficulties[:2]) + difficulties[2:])
+
+
+    def test_get_random_questions_by_difficulty_profile_too_many_raises_QuizDBError(self):
+        Question(question='Hard', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=5, points=1, category='Category One').save()
+
+        with self.assertRaises(QuizDBError):
+            quizdatabase.get_random_questions_by_difficulty_profile('Category One', [(2, (4, 5))])
+
+
+    def test_difficulty_pools_are_refreshed_when_questions_change(self):
+        Question(question='Easy', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category One').save()
+        counts_before = quizdatabase.count_questions_by_difficulty('Category One')
+        Question(question='Also easy', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category One').save()
+        counts_after = quizdatabase.count_questions_by_difficulty('Category One')
+
+        self.assertEqual({1: 1, 2: 0, 3: 0, 4: 0, 5: 0}, counts_before)
+        self.assertEqual({1: 2, 2: 0, 3: 0, 4: 0, 5: 0}, counts_after)
+
+
+    @patch('db_config.question_version_check_seconds', 0)
+    def test_difficulty_pools_see_questions_added_by_another_connection(self):
+        quizdatabase.create_table()
+        Question(question='Easy', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category One').save()
+        quizdatabase.count_questions_by_difficulty('Category One')
+
+        self.db.execute_sql("INSERT INTO question (question, answercorrect, answerincorrecta, answerincorrectb, answerincorrectc, difficulty, points, category) "
+                            "VALUES ('Hard', 'Yes', 'No', 'No', 'No', 5, 1, 'Category One')")
+
+        self.assertEqual({1: 1, 2: 0, 3: 0, 4: 0, 5: 1}, quizdatabase.count_questions_by_difficulty('Category One'))
+
+
+    @patch('quizdatabase.difficulty_pools_cache', quizdatabase.LRUCache(2, 60))
+    def test_difficulty_pools_cache_is_bounded(self):
+        for category in ['Category One', 'Category Two', 'Category Three']:
+            quizdatabase.get_difficulty_pools(category)
+
+        self.assertEqual(2, quizdatabase.get_question_cache_stats()['difficulty_pools'].size)
+
+
+    def test_get_random_question_id_by_difficulty_skips_excluded_ids(self):
+        first = Question(question='One', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=3, points=1, category='Category One')
+        second = Question(question='Two', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=3, points=1, category='Category One')
+        first.save()
+        second.save()
+
+        self.assertEqual(second.id, quizdatabase.get_random_question_id_by_difficulty('Category One', 3, {first.id}))
+        self.assertIsNone(quizdatabase.get_random_question_id_by_difficulty('Category One', 3, {first.id, second.id}))
+
+
+    def test_search_questions_ranks_question_wording_above_answers(self):
+        quizdatabase.create_table()
+        Question(question='Which city is the capital of France?', answercorrect='Paris', answerincorrecta='Lyon', answerincorrectb='Nice', answerincorrectc='Lille', difficulty=1, points=1, category='Geography').save()
+        Question(question='Which river flows through Paris?', answercorrect='Seine', answerincorrecta='Rhine', answerincorrectb='Loire', answerincorrectc='Danube', difficulty=1, points=1, category='Rivers').save()
+
+        expected = ['Which river flows through Paris?', 'Which city is the capital of France?']
+
+        questions = quizdatabase.search_questions('paris')
+
+        self.assertEqual(expected, [question.question for question in questions])
+
+
+    def test_search_questions_by_word_prefix_in_category(self):
+        quizdatabase.create_table()
+        Question(question='Which city is the capital of France?', answercorrect='Paris', answerincorrecta='Lyon', answerincorrectb='Nice', answerincorrectc='Lille', difficulty=1, points=1, category='Geography').save()
+        Question(question='Which river flows through Paris?', answercorrect='Seine', answerincorrecta='Rhine', answerincorrectb='Loire', answerincorrectc='Danube', difficulty=1, points=1, category='Rivers').save()
+
+        questions = quizdatabase.search_questions('par', category='Rivers')
+
+        self.assertEqual(['Rivers'], [question.category for question in questions])
+
+
+    def test_search_index_follows_question_updates_and_deletes(self):
+        quizdatabase.create_table()
+        question = Question(question='Which city is the capital of France?', answercorrect='Paris', answerincorrecta='Lyon', answerincorrectb='Nice', answerincorrectc='Lille', difficulty=1, points=1, category='Geography')
+        question.save()
+
+        question.answercorrect = 'Marseille'
+        question.save()
+        after_update = (len(quizdatabase.search_questions('paris')), len(quizdatabase.search_questions('marseille')))
+        question.delete_instance()
+        after_delete = len(quizdatabase.search_questions('capital'))
+
+        self.assertEqual((0, 1), after_update)
+        self.assertEqual(0, after_delete)
+
+
+    def test_bulk_insert_questions_adds_them_to_search_index(self):
+        quizdatabase.create_table()
+        fields = [Question.question, Question.answercorrect, Question.answerincorrecta, Question.answerincorrectb, Question.answerincorrectc, Question.difficulty, Question.points, Question.category]
+        rows = [(f'Bulk question {number}', 'Yes', 'No', 'No', 'No', 1, 1, 'Category One') for number in range(3)]
+
+        quizdatabase.bulk_insert_questions(fields, rows)
+        Question(question='Bulk question saved on its own', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category One').save()
+
+        self.assertEqual(4, len(quizdatabase.search_questions('bulk question')))
+        self.assertTrue(quizdatabase.has_question_search_triggers())
+
+
+    def test_build_search_query_quotes_words(self):
+        expected = '"capital" "OR" "it" "s" *'
+
+        search_query = quizdatabase.build_search_query('capital OR "it\'s')
+
+        self.assertEqual(expected, search_query)
+        self.assertIsNone(quizdatabase.build_search_query(' ?! '))
+
+
+
+    def test_migration_adds_response_times_and_rebuilds_totals_in_milliseconds(self):
+        sample_question_one = Question(question='Test Question One', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=3, category='Category One')
+        sample_question_one.save()
+        # a version 8 database, whose results only have wall clock timestamps
+        make_old_result_table(with_response_time=False)
+        quizdatabase.db.execute_sql('INSERT INTO result (timestampstart, timestampend, useranswer, points, iscorrect, sessionid, questionid_id) '
+                                    "VALUES (10.25, 12.5, 'Yes', 3, 1, 'Session One', ?), (20, 21, 'No', 3, 0, 'Session One', ?)",
+                                    (sample_question_one.id, sample_question_one.id))
+        quizdatabase.db.pragma('user_version', 8)
+
+        quizdatabase.create_table()
+
+        response_times = [result.responsetime for result in Result.select().order_by(Result.id)]
+
+        self.assertEqual([2250, 1000], response_times)
+        self.assertEqual(3250, quizdatabase.get_session_summary('Session One').totaltime)
+        self.assertEqual(3250, quizdatabase.QuestionStats.get_by_id(sample_question_one.id).totaltime)
+
+
+    def test_migration_stores_session_keys_and_answer_codes(self):
+        sample_question_one = Question(question='Test Question One', answercorrect='Yes', answerincorrecta='Maybe', answerincorrectb='No', answerincorrectc='Never', difficulty=1, points=3, category='Category One')
+        sample_question_one.save()
+        # a version 9 database, with the session id and answer text in every result. question 7 doesn't exist
+        make_old_result_table()
+        quizdatabase.db.execute_sql('INSERT INTO result (timestampstart, timestampend, responsetime, useranswer, points, iscorrect, sessionid, questionid_id) '
+                                    "VALUES (1, 2, 1000, 'Yes', 3, 1, 'Session One', 1), (2, 3, 1000, 'Never', 3, 0, 'Session One', 1), "
+                                    "(3, 4, 1000, 'Something else', 3, 0, '1234', 1), (4, 5, 1000, 'Yes', 3, 1, '1234', 7)")
+        quizdatabase.db.pragma('user_version', 9)
+
+        quizdatabase.create_table()
+
+        results = list(Result.select().order_by(Result.id))
+        result_indexes = [index.name for index in quizdatabase.db.get_indexes('result')]
+
+        self.assertEqual([0, 3, None, None], [result.answercode for result in results])
+        self.assertEqual([None, None, 'Something else', 'Yes'], [result.useranswer for result in results])
+        self.assertEqual([1, 1, 2, 2], [result.sessionid for result in results])
+        self.assertEqual(['Yes', 'Never'], [result.get_user_answer() for result in quizdatabase.get_results_by_session('Session One')])
+        self.assertEqual('1234', quizdatabase.get_last_session_id())
+        self.assertIn('result_sessionid', result_indexes)
+        self.assertEqual(quizdatabase.SCHEMA_VERSION, quizdatabase.get_schema_version())
+
+
+    def test_create_table_upgrades_a_database_from_before_the_first_migration(self):
+        # a version 0 database, with only the question and result tables and no response times
+        self.db.drop_tables(quizdatabase.MODELS)
+        Question.create_table()
+        sample_question_one = Question(question='Test Question One', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=3, category='Category One')
+        sample_question_one.save()
+        quizdatabase.db.execute_sql('CREATE TABLE result (id INTEGER NOT NULL PRIMARY KEY, timestampstart INTEGER NOT NULL, timestampend INTEGER NOT NULL, '
+                                    'useranswer VARCHAR(255) NOT NULL, points INTEGER NOT NULL, iscorrect INTEGER NOT NULL, '
+                                    'sessionid VARCHAR(255) NOT NULL, questionid_id INTEGER NOT NULL)')
+        quizdatabase.db.execute_sql('INSERT INTO result (timestampstart, timestampend, useranswer, points, iscorrect, sessionid, questionid_id) '
+                                    "VALUES (10, 12, 'Yes', 3, 1, 'Session One', ?)", (sample_question_one.id,))
+        quizdatabase.db.pragma('user_version', 0)
+
+        quizdatabase.create_table()
+
+        summary = quizdatabase.get_session_summary('Session One')
+
+        self.assertEqual(quizdatabase.SCHEMA_VERSION, quizdatabase.get_schema_version())
+        self.assertEqual((3, 2000), (summary.score, summary.totaltime))
+        # nothing from before the leaderboard says the session was finished, so it isn't ranked
+        self.assertEqual(0, len(quizdatabase.get_leaderboard()))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,140 @@
+import itertools
+import unittest
+from unittest import TestCase
+from unittest.mock import patch
+
+from peewee import *
+
+import db_config
+test_db_path = 'test_quiz.db'
+db_config.database_path = test_db_path
+
+import quizdatabase
+import quizduplicates
+from quizdatabase import Question
+from quizdatabase import QuestionBand
+from quizdatabase import QuestionSignature
+
+
+class TestQuizDuplicates(TestCase):
+
+    def setUp(self):
+        '''Clear and remake the tables, with the question_signature triggers, then add some questions.'''
+        self.db = SqliteDatabase(test_db_path)
+        self.db.drop_tables(quizdatabase.MODELS)
+        self.db.create_tables(quizdatabase.MODELS)
+        quizdatabase.db.pragma('user_version', 0)
+        quizdatabase.create_table()
+        quizdatabase.notify_questions_changed()
+
+        for question_text, correct_answer in [('What is the capital of France?', 'Paris'), ('Which planet is largest?', 'Jupiter'),
+                                              ('Which city is the capital of France?', 'Paris'), ('What is the capital of France', 'paris'),
+                                              ('Who wrote Hamlet?', 'Shakespeare')]:
+            Question(question=question_text, answercorrect=correct_answer, answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=1, points=1, category='Category One').save()
+
+
+    def test_normalize_text(self):
+        expected = 'cafe au lait 2 shots'
+
+        self.assertEqual(expected, quizduplicates.normalize_text('  Café au LAIT -- 2 shots!?'))
+
+
+    def test_sign_question_same_text_hash_after_normalizing(self):
+        fingerprint = quizduplicates.sign_question('What is the capital of France?', 'Paris')
+        other_fingerprint = quizduplicates.sign_question('what is the  capital of FRANCE', 'paris.')
+
+        self.assertEqual(fingerprint.text_hash, other_fingerprint.text_hash)
+        self.assertEqual(quizduplicates.SIGNATURE_SIZE, len(fingerprint.minhash))
+        self.assertEqual(quizduplicates.BAND_COUNT, len(fingerprint.band_keys))
+
+
+    def test_find_duplicates(self):
+        expected = [quizduplicates.DuplicateMatch(1, 4, 1.0), quizduplicates.DuplicateMatch(1, 3, 0.75), quizduplicates.DuplicateMatch(3, 4, 0.75)]
+
+        matches = quizduplicates.find_duplicates(processes=1)
+
+        self.assertEqual(expected, matches)
+        self.assertEqual(5, QuestionSignature.select().count())
+        self.assertEqual(5 * quizduplicates.BAND_COUNT, QuestionBand.select().count())
+
+
+    def test_find_duplicates_estimates_each_candidate_pair_once(self):
+        quizduplicates.sign_unsigned_questions(processes=1)
+        buckets = {}
+        for band_key, question_id in QuestionBand.select(QuestionBand.bandkey, QuestionBand.questionid).tuples():
+            buckets.setdefault(band_key, []).append(question_id)
+        # every pair sharing a band, less the exact duplicates 1 and 4, which are never estimated
+        candidate_pairs = {tuple(sorted(pair)) for question_ids in buckets.values() for pair in itertools.combinations(question_ids, 2)} - {(1, 4)}
+
+        with patch('quizduplicates.estimate_similarity', wraps=quizduplicates.estimate_similarity) as estimate_similarity:
+            quizduplicates.find_duplicates(processes=1)
+
+        self.assertEqual(len(candidate_pairs), estimate_similarity.call_count)
+
+
+    def test_find_duplicates_of(self):
+        quizduplicates.sign_unsigned_questions(processes=1)
+
+        self.assertEqual((2, 1.0), quizduplicates.find_duplicates_of('Which planet is LARGEST', 'Jupiter'))
+        self.assertEqual((5, 0.75), quizduplicates.find_duplicates_of('Who wrote the play Hamlet?', 'Shakespeare'))
+        self.assertIsNone(quizduplicates.find_duplicates_of('Who wrote Macbeth?', 'Shakespeare'))
+
+
+    def test_changing_a_question_drops_its_signature(self):
+        quizduplicates.sign_unsigned_questions(processes=1)
+
+        Question.update(question='Who painted the Mona Lisa?').where(Question.id == 2).execute()
+        Question.delete().where(Question.id == 5).execute()
+
+        self.assertEqual(3, QuestionSignature.select().count())
+        self.assertEqual(0, QuestionBand.select().where(QuestionBand.questionid.in_([2, 5])).count())
+        self.assertEqual(1, quizduplicates.sign_unsigned_questions(processes=1))
+
+
+    def test_duplicate_checker_checks_within_a_chunk(self):
+        questions = [{'question': 'How many legs does a spider have?', 'answercorrect': '8'},
+                     {'question': 'How many legs does a spider have in total?', 'answercorrect': '8'},
+                     {'question': 'How many legs does an ant have?', 'answercorrect': '6'}]
+        duplicate_checker = quizduplicates.DuplicateChecker()
+
+        reasons = duplicate_checker.check_chunk(questions)
+
+        self.assertEqual([None, 'duplicate of an earlier row (86% similar)', None], reasons)
+        self.assertEqual(2, len(duplicate_checker.pending_fingerprints))
+
+
+
+    def add_template_questions(self, count):
+        """Add questions that all follow one template, so they share LSH bands without being duplicates."""
+        rows = [(f'In which year did the great river flood number {number} happen?', str(1000 + number), 'No', 'No', 'No', 1, 1, 'Category One') for number in range(count)]
+        quizdatabase.bulk_insert(Question, [Question.question, Question.answercorrect, Question.answerincorrecta, Question.answerincorrectb,
+                                            Question.answerincorrectc, Question.difficulty, Question.points, Question.category], rows)
+
+
+    @patch('quizduplicates.MAX_BUCKET_SIZE', 20)
+    def test_find_duplicates_skips_large_buckets_of_template_questions(self):
+        self.add_template_questions(300)
+
+        with patch('quizduplicates.estimate_similarity', wraps=quizduplicates.estimate_similarity) as estimate_similarity:
+            with self.assertLogs('quizduplicates', 'WARNING'):
+                matches = quizduplicates.find_duplicates(processes=1)
+
+        # every pair compared comes from a bucket of at most 20 questions, instead of up to 300 * 299 / 2 pairs
+        self.assertLessEqual(estimate_similarity.call_count, quizduplicates.BAND_COUNT * 20 * 19 // 2)
+        self.assertEqual([(1, 4), (1, 3), (3, 4)], [(match.question_id, match.duplicate_id) for match in matches])
+
+
+    @patch('quizduplicates.MAX_CANDIDATES', 5)
+    def test_find_duplicates_of_compares_a_bounded_number_of_candidates(self):
+        self.add_template_questions(300)
+        quizduplicates.sign_unsigned_questions(processes=1)
+
+        with patch('quizduplicates.get_question_words', wraps=quizduplicates.get_question_words) as get_question_words:
+            match = quizduplicates.find_duplicates_of('In which year did the great river flood number 500 happen?', '1500')
+
+        self.assertIsNone(match)
+        self.assertLessEqual(len(get_question_words.call_args.args[0]), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import unittest
+from unittest import TestCase
+from unittest.mock import patch
+
+from peewee import *
+
+import db_config
+test_db_path = 'test_quiz.db'
+db_config.database_path = test_db_path 
+
+import quizdatabase
+import quizengine
+import quizloadtest
+from quizdatabase import Question
+from quizdatabase import Result
+from quizengine import QuizSessionError
+
+
+class TestQuizEngine(TestCase):
+
+    def setUp(self):
+        '''Clear and remake the tables for the test database, then add two questions.'''
+        self.db = SqliteDatabase(test_db_path)
+        self.db.drop_tables(quizdatabase.MODELS)
+        self.db.create_tables(quizdatabase.MODELS)
+        quizdatabase.notify_questions_changed()
+
+        self.questions = []
+        for number in range(2):
+            question = Question(question=f'Test Question {number}', answercorrect='Correct Answer', answerincorrecta='Incorrect A', answerincorrectb='Incorrect B', answerincorrectc='Incorrect C', difficulty=1, points=3, category='Category One')
+            question.save()
+            self.questions.append(question)
+
+
+    def test_next_question_returns_shuffled_answers_including_correct_answer(self):
+        quiz_session = quizengine.QuizSession(self.questions, 'Session One')
+
+        question, answer_list = quiz_session.next_question()
+
+        self.assertEqual(self.questions[0], question)
+        self.assertCountEqual(['Correct Answer', 'Incorrect A', 'Incorrect B', 'Incorrect C'], answer_list)
+
+
+    def test_answer_grades_and_saves_results_when_finished(self):
+        with quizengine.QuizSession(self.questions, 'Session One') as quiz_session:
+            question, answer_list = quiz_session.next_question()
+            correct = quiz_session.answer(answer_list.index('Correct Answer'))
+            question, answer_list = quiz_session.next_question()
+            incorrect = quiz_session.answer(answer_list.index('Incorrect B'))
+
+            self.assertIsNone(quiz_session.next_question())
+
+        summary = quiz_session.get_summary()
+
+        self.assertTrue(correct.is_correct)
+        self.assertFalse(incorrect.is_correct)
+        self.assertEqual('Incorrect B', incorrect.user_answer)
+        self.assertEqual(2, Result.select().count())
+        self.assertEqual(3, summary.score)
+        self.assertEqual(6, summary.availablepoints)
+
+
+    def test_finished_session_is_added_to_leaderboard(self):
+        with quizengine.QuizSession(self.questions, 'Session One') as quiz_session:
+            for _ in self.questions:
+                question, answer_list = quiz_session.next_question()
+                quiz_session.answer(answer_list.index('Correct Answer'))
+
+        leaderboard = quizdatabase.get_leaderboard('Category One')
+
+        self.assertEqual(['Session One'], [entry.sessionid for entry in leaderboard])
+
+
+    def test_unfinished_session_is_not_added_to_leaderboard(self):
+        with quizengine.QuizSession(self.questions, 'Session One') as quiz_session:
+            question, answer_list = quiz_session.next_question()
+            quiz_session.answer(0)
+
+        leaderboard = quizdatabase.get_leaderboard()
+
+        self.assertEqual([], leaderboard)
+
+
+    def test_answer_before_next_question_raises_QuizSessionError(self):
+        quiz_session = quizengine.QuizSession(self.questions, 'Session One')
+
+        with self.assertRaises(QuizSessionError):
+            quiz_session.answer(0)
+
+
+    def test_answer_out_of_range_raises_QuizSessionError(self):
+        quiz_session = quizengine.QuizSession(self.questions, 'Session One')
+        quiz_session.next_question()
+
+        with self.assertRaises(QuizSessionError):
+            quiz_session.answer(4)
+
+
+    def test_load_test_players_with_perfect_accuracy(self):
+        report = quizloadtest.run_load_test(player_count=3, session_count=2, questions_per_session=2, accuracy=1.0)
+
+        self.assertEqual(6, report['sessions'])
+        self.assertEqual(12, report['answers'])
+        self.assertEqual(0, report['errors'])
+        self.assertEqual(12, Result.select().where(Result.iscorrect == 1).count())
+
+
+    def test_adaptive_questions_get_harder_after_correct_answers_and_easier_after_incorrect(self):
+        for difficulty in [2, 3, 4, 5]:
+            Question(question=f'Difficulty {difficulty}', answercorrect='Correct Answer', answerincorrecta='Incorrect A', answerincorrectb='Incorrect B', answerincorrectc='Incorrect C', difficulty=difficulty, points=difficulty, category='Category Two').save()
+
+        expected = [3, 4, 5, 2]
+
+        adaptive_questions = quizengine.AdaptiveQuestions('Category Two', 4)
+        difficulties = []
+        with quizengine.QuizSession(adaptive_questions, 'Session One') as quiz_session:
+            for user_answer in ['Correct Answer', 'Correct Answer', 'Incorrect A', 'Incorrect A']:
+                question, answer_list = quiz_session.next_question()
+                difficulties.append(question.difficulty)
+                quiz_session.answer(answer_list.index(user_answer))
+
+            self.assertIsNone(quiz_session.next_question())
+
+        # after the wrong answer at difficulty 5, difficulties 4, 3 and 5 have all been asked so the nearest left is 2
+        self.assertEqual(expected, difficulties)
+        self.assertEqual(4, Result.select().count())
+
+
+    def test_adaptive_questions_more_than_category_raises_QuizDBError(self):
+        with self.assertRaises(quizdatabase.QuizDBError):
+            quizengine.AdaptiveQuestions('Category One', 3)
+
+
+
+    def test_response_time_is_timed_from_question_shown_on_the_monotonic_clock(self):
+        # the wall clock jumping back an hour while the question is up doesn't change the response time
+        monotonic_times = iter([1_000_000_000, 2_000_000_000, 3_500_000_000])
+        wall_clock_times = iter([1000.0, 1000.0 - 3600])
+        with patch('quizrunner.get_monotonic_time', side_effect=lambda: next(monotonic_times)), patch('quizrunner.get_timestamp', side_effect=lambda: next(wall_clock_times)):
+            with quizengine.QuizSession(self.questions[:1], 'Session One') as quiz_session:
+                question, answer_list = quiz_session.next_question()
+                quiz_session.question_shown()
+                quiz_session.answer(0)
+
+        result = Result.get()
+
+        self.assertEqual(1500, result.responsetime)
+        self.assertEqual(1000, result.timestampstart)
+        self.assertEqual(1500, quiz_session.get_summary().totaltime)
+
+
+    def test_answers_are_saved_as_their_place_in_the_unshuffled_answer_list(self):
+        with quizengine.QuizSession(self.questions, 'Session One') as quiz_session:
+            question, answer_list = quiz_session.next_question()
+            quiz_session.answer(answer_list.index('Incorrect B'))
+            question, answer_list = quiz_session.next_question()
+            quiz_session.answer(answer_list.index('Correct Answer'))
+
+        results = list(Result.select().order_by(Result.id))
+
+        self.assertEqual([2, 0], [result.answercode for result in results])
+        self.assertEqual(['Incorrect B', 'Correct Answer'], [result.get_user_answer() for result in results])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import csv
+import io
+import json
+import unittest
+from unittest import TestCase
+
+from peewee import *
+
+import db_config
+test_db_path = 'test_quiz.db'
+db_config.database_path = test_db_path 
+
+import quizdatabase
+import quizexporter
+from quizdatabase import Question
+from quizdatabase import QuizDBError
+
+
+class TestQuizExporter(TestCase):
+
+    def setUp(self):
+        '''Clear and remake the tables for the test database, then add one question and five results.'''
+        self.db = SqliteDatabase(test_db_path)
+        self.db.drop_tables(quizdatabase.MODELS)
+        self.db.create_tables(quizdatabase.MODELS)
+
+        sample_question_one = Question(question='Test Question One', answercorrect='Yes', answerincorrecta='No', answerincorrectb='No', answerincorrectc='No', difficulty=2, points=3, category='Category One')
+        sample_question_one.save()
+
+        for timestamp_end in [10, 20, 30, 40, 50]:
+            quizdatabase.create_question_result(timestamp_end - 5, timestamp_end, 'Yes', 3, True, 'Session One', sample_question_one.id)
+
+
+    def test_export_results_to_csv_across_pages(self):
+        output_file = io.StringIO()
+
+        exported_count = quizexporter.export_results(output_file, file_format='csv', page_size=2)
+
+        rows = list(csv.DictReader(io.StringIO(output_file.getvalue())))
+        result_ids = [int(row['id']) for row in rows]
+
+        self.assertEqual(5, exported_count)
+        self.assertEqual([1, 2, 3, 4, 5], result_ids)
+
+
+    def test_export_results_to_jsonl_with_question_columns(self):
+        output_file = io.StringIO()
+
+        quizexporter.export_results(output_file, file_format='jsonl', with_question=True)
+
+        rows = [json.loads(line) for line in output_file.getvalue().splitlines()]
+
+        self.assertEqual('Category One', rows[0]['category'])
+        self.assertEqual(2, rows[0]['difficulty'])
+
+
+    def test_export_results_to_columns_writes_one_line_per_page(self):
+        output_file = io.StringIO()
+
+        quizexporter.export_results(output_file, file_format='columns', page_size=2)
+
+        chunks = [json.loads(line) for line in output_file.getvalue().splitlines()]
+
+        self.assertEqual(3, len(chunks))
+        self.assertEqual([10, 20], chunks[0]['timestampend'])
+
+
+    def test_export_results_within_date_range(self):
+        output_file = io.StringIO()
+
+        exported_count = quizexporter.export_results(output_file, file_format='jsonl', page_size=1, start=20, end=40)
+
+        rows = [json.loads(line) for line in output_file.getvalue().splitlines()]
+        timestamps = [row['timestampend'] for row in rows]
+
+        self.assertEqual(2, exported_count)
+        self.assertEqual([20, 30], timestamps)
+
+
+    def test_export_results_since_last_export_only_writes_new_results(self):
+        quizexporter.export_results(io.StringIO(), checkpoint_name='nightly')
+        quizdatabase.create_question_result(55, 60, 'No', 3, False, 'Session Two', 1)
+        output_file = io.StringIO()
+
+        exported_count = quizexporter.export_results(output_file, file_format='jsonl', checkpoint_name='nightly')
+
+        rows = [json.loads(line) for line in output_file.getvalue().splitlines()]
+
+        self.assertEqual(1, exported_count)
+        self.assertEqual('Session Two', rows[0]['sessionid'])
+        self.assertEqual(6, quizdatabase.get_export_checkpoint('nightly'))
+
+
+    def test_export_results_unknown_format_raises_QuizDBError(self):
+        with self.assertRaises(QuizDBError):
+            exported_count = quizexporter.export_results(io.StringIO(), file_format='xml')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+
+from peewee import *
+
+import db_config
+test_db_path = 'test_quiz.db'
+db_config.database_path = test_db_path
+
+import quizdatabase
+import quizgrader
+from quizdatabase import Question
+from quizdatabase import Result
+
+
+class TestQuizGrader(TestCase):
+
+    def setUp(self):
+        '''Clear and remake the tables for the test database, add two questions, and make a folder for answer sheets.'''
+        self.db = SqliteDatabase(test_db_path)
+        self.db.drop_tables(quizdatabase.MODELS)
+        self.db.create_tables(quizdatabase.MODELS)
+        quizdatabase.notify_questions_changed()
+
+        Question(question='Test Question One', answercorrect='Yes', answerincorrecta='Maybe', answerincorrectb='No', answerincorrectc='Never', difficulty=1, points=2, category='Category One').save()
+        Question(question='Test Question Two', answercorrect='Red', answerincorrecta='Blue', answerincorrectb='Green', answerincorrectc='Pink', difficulty=1, points=4, category='Category One').save()
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+    def write_file(self, name, text):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, 'w', encoding='utf-8') as sheet_file:
+            sheet_file.write(text)
+        return path
+
+
+    def test_grade_answer_sheets_from_csv(self):
+        csv_text = ('sessionid,questionid,useranswer,timestampstart,timestampend\n'
+                    'Sheet One,1,Yes,100,102\n'
+                    'Sheet One,2,Green,102,105.5\n'
+                    'Sheet Two,2,Red,2024-03-01T12:00:00,2024-03-01T12:00:04\n')
+        path = self.write_file('sheets.csv', csv_text)
+
+        report = quizgrader.grade_answer_sheets([path])
+
+        summary = quizdatabase.get_session_summary('Sheet One')
+        results = list(Result.select().order_by(Result.id))
+
+        self.assertEqual((3, 2, 0, 2), (report.graded_count, report.correct_count, report.rejected_count, report.session_count))
+        self.assertEqual([0, 2, 0], [result.answercode for result in results])
+        self.assertEqual([2000, 3500, 4000], [result.responsetime for result in results])
+        self.assertEqual((2, 6, 5500), (summary.score, summary.availablepoints, summary.totaltime))
+        self.assertEqual(2, len(quizdatabase.get_leaderboard()))
+
+
+    def test_grade_answer_sheets_in_several_chunks_and_files(self):
+        paths = []
+        for sheet_number in range(2):
+            lines = [json.dumps({'sessionid': f'Sheet {sheet_number} {session_number}', 'questionid': question_id, 'useranswer': 'Yes', 'timestampstart': 1, 'timestampend': 2, 'responsetime': 900})
+                     for session_number in range(2) for question_id in [1, 2]]
+            paths.append(self.write_file(f'sheet_{sheet_number}.jsonl', '\n'.join(lines)))
+
+        report = quizgrader.grade_answer_sheets(paths, chunk_size=3)
+
+        self.assertEqual(8, report.graded_count)
+        self.assertEqual(4, report.correct_count)
+        self.assertEqual(8, Result.select().count())
+        self.assertEqual({900}, {result.responsetime for result in Result.select()})
+
+
+    def test_answer_not_among_the_options_is_incorrect_and_keeps_its_text(self):
+        path = self.write_file('sheets.jsonl', json.dumps({'sessionid': 'Sheet One', 'questionid': 1, 'useranswer': 'Perhaps', 'timestampstart': 1, 'timestampend': 2}))
+
+        report = quizgrader.grade_answer_sheets([path])
+
+        result = Result.get()
+
+        self.assertEqual(0, report.correct_count)
+        self.assertEqual((None, 'Perhaps', 0), (result.answercode, result.useranswer, result.iscorrect))
+
+
+    def test_grade_answer_sheets_writes_rejected_rows_with_reason(self):
+        csv_text = ('sessionid,questionid,useranswer,timestampstart,timestampend\n'
+                    'Sheet One,1,Yes,100,102\n'
+                    'Sheet One,99,Yes,100,102\n'
+                    'Sheet One,one,Yes,100,102\n'
+                    'Sheet One,1,,100,102\n'
+                    'Sheet One,1,Yes,102,100\n')
+        path = self.write_file('sheets.csv', csv_text)
+        rejected_path = os.path.join(self.temp_dir.name, 'rejected.jsonl')
+
+        report = quizgrader.grade_answer_sheets([path], rejected_path=rejected_path)
+
+        with open(rejected_path, encoding='utf-8') as rejected_file:
+            rejected_rows = [json.loads(line) for line in rejected_file]
+        rejected_lines = sorted(rejected_row['line'] for rejected_row in rejected_rows)
+
+        self.assertEqual(1, report.graded_count)
+        self.assertEqual(4, report.rejected_count)
+        self.assertEqual([f'{path}:{line_number}' for line_number in [3, 4, 5, 6]], rejected_lines)
+        self.assertIn('no question with id 99', [rejected_row['reason'] for rejected_row in rejected_rows])
+
+
+    def test_grading_the_same_sheet_twice_saves_each_answer_once(self):
+        csv_text = ('sessionid,questionid,useranswer,timestampstart,timestampend\n'
+                    'Sheet One,1,Yes,100,102\n'
+                    'Sheet One,2,Red,102,104\n'
+                    'Sheet One,2,Blue,104,106\n')
+        path = self.write_file('sheets.csv', csv_text)
+        rejected_path = os.path.join(self.temp_dir.name, 'rejected.jsonl')
+
+        report = quizgrader.grade_answer_sheets([path])
+        second_report = quizgrader.grade_answer_sheets([path], chunk_size=2, rejected_path=rejected_path)
+
+        summary = quizdatabase.get_session_summary('Sheet One')
+        with open(rejected_path, encoding='utf-8') as rejected_file:
+            rejected_reasons = [json.loads(line)['reason'] for line in rejected_file]
+
+        self.assertEqual((2, 1), (report.graded_count, report.rejected_count))
+        self.assertEqual((0, 3), (second_report.graded_count, second_report.rejected_count))
+        self.assertEqual(2, Result.select().count())
+        self.assertEqual((6, 6, 2), (summary.score, summary.availablepoints, summary.questioncount))
+        self.assertEqual('question 2 is already graded for this session', rejected_reasons[-1])
+
+
+    def test_grade_a_chunk_with_more_questions_than_one_lookup_holds(self):
+        rows = [(f'Bulk Question {number}', 'Yes', 'No', 'Maybe', 'Never', 1, 1, f'Bulk Category {number % 2}') for number in range(1200)]
+        quizdatabase.bulk_insert(Question, [Question.question, Question.answercorrect, Question.answerincorrecta, Question.answerincorrectb,
+                                            Question.answerincorrectc, Question.difficulty, Question.points, Question.category], rows)
+        # one session per question, so each session summary looks up a different question's category
+        csv_text = 'sessionid,questionid,useranswer,timestampstart,timestampend\n' + ''.join(f'Sheet {question_id},{question_id},Yes,1,2\n' for question_id in range(3, 1203))
+        path = self.write_file('sheets.csv', csv_text)
+
+        report = quizgrader.grade_answer_sheets([path])
+
+        SessionSummary = quizdatabase.SessionSummary
+        category_counts = dict(SessionSummary.select(SessionSummary.category, fn.COUNT(SessionSummary.sessionid)).group_by(SessionSummary.category).tuples())
+
+        self.assertEqual(1200, report.graded_count)
+        self.assertEqual({'Bulk Category 0': 600, 'Bulk Category 1': 600}, category_counts)
+
+
+    def test_load_answer_keys_keeps_correct_code_for_repeated_answer_text(self):
+        Question(question='Test Question Three', answercorrect='No', answerincorrecta='No', answerincorrectb='Yes', answerincorrectc='No', difficulty=1, points=1, category='Category One').save()
+
+        answer_keys = quizgrader.load_answer_keys([3])
+
+        self.assertEqual((1, {'No': 0, 'Yes': 2}), answer_keys[3])
+
+
+if __name__ == '__main__':
+    unittest.main()
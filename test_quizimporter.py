@@ -0,0 +1,162 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+
+from peewee import *
+
+import db_config
+test_db_path = 'test_quiz.db'
+db_config.database_path = test_db_path 
+
+import quizdatabase
+import quizimporter
+from quizdatabase import Question
+from quizdatabase import QuizDBError
+
+
+class TestQuizImporter(TestCase):
+
+    def setUp(self):
+        '''Clear and remake the tables for the test database, and make a folder for question files.'''
+        self.db = SqliteDatabase(test_db_path)
+        self.db.drop_tables(quizdatabase.MODELS)
+        self.db.create_tables(quizdatabase.MODELS)
+        quizdatabase.notify_questions_changed()
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+    def write_file(self, name, text):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, 'w', encoding='utf-8') as question_file:
+            question_file.write(text)
+        return path
+
+
+    def test_import_questions_from_csv(self):
+        csv_text = ('question,answercorrect,answerincorrecta,answerincorrectb,answerincorrectc,difficulty,points,category\n'
+                    'Test Question One,Yes,No,No,No,1,1,Category One\n'
+                    'Test Question Two,Yes,No,No,No,5,100,Category Two\n')
+        path = self.write_file('questions.csv', csv_text)
+
+        report = quizimporter.import_questions(path)
+
+        self.assertEqual(2, report.imported_count)
+        self.assertEqual(0, report.rejected_count)
+        self.assertEqual({'Category One': 1, 'Category Two': 1}, quizdatabase.get_category_catalog())
+
+
+    def test_import_questions_from_jsonl_in_several_chunks(self):
+        lines = []
+        for number in range(7):
+            lines.append(json.dumps({'question': f'Test Question {number}', 'answercorrect': 'Yes', 'answerincorrecta': 'No', 'answerincorrectb': 'No', 'answerincorrectc': 'No', 'difficulty': 2, 'points': 3, 'category': 'Category One'}))
+        path = self.write_file('questions.jsonl', '\n'.join(lines))
+
+        report = quizimporter.import_questions(path, chunk_size=3)
+
+        self.assertEqual(7, report.imported_count)
+        self.assertEqual(7, Question.select().count())
+
+
+    def test_import_questions_writes_rejected_rows_with_reason(self):
+        csv_text = ('question,answercorrect,answerincorrecta,answerincorrectb,answerincorrectc,difficulty,points,category\n'
+                    'Test Question One,Yes,No,No,No,1,1,Category One\n'
+                    'Too Hard,Yes,No,No,No,6,1,Category One\n'
+                    'Too Many Points,Yes,No,No,No,1,101,Category One\n'
+                    'No Category,Yes,No,No,No,1,1,\n')
+        path = self.write_file('questions.csv', csv_text)
+        rejected_path = os.path.join(self.temp_dir.name, 'rejected.jsonl')
+
+        report = quizimporter.import_questions(path, rejected_path=rejected_path)
+
+        with open(rejected_path, encoding='utf-8') as rejected_file:
+            rejected_rows = [json.loads(line) for line in rejected_file]
+        rejected_lines = [rejected_row['line'] for rejected_row in rejected_rows]
+
+        self.assertEqual(1, report.imported_count)
+        self.assertEqual(3, report.rejected_count)
+        self.assertEqual([3, 4, 5], rejected_lines)
+
+
+    def test_import_questions_with_rebuild_indexes_puts_indexes_back(self):
+        csv_text = ('question,answercorrect,answerincorrecta,answerincorrectb,answerincorrectc,difficulty,points,category\n'
+                    'Test Question One,Yes,No,No,No,1,1,Category One\n')
+        path = self.write_file('questions.csv', csv_text)
+
+        quizimporter.import_questions(path, rebuild_indexes=True)
+
+        question_indexes = [index.name for index in quizdatabase.db.get_indexes('question')]
+
+        self.assertIn('question_category_difficulty', question_indexes)
+
+
+    def test_validate_question_row_not_a_number_is_rejected(self):
+        row = {'question': 'Test Question One', 'answercorrect': 'Yes', 'answerincorrecta': 'No', 'answerincorrectb': 'No', 'answerincorrectc': 'No', 'difficulty': 'hard', 'points': 1, 'category': 'Category One'}
+
+        question, reason = quizimporter.validate_question_row(row)
+
+        self.assertIsNone(question)
+        self.assertEqual('difficulty is not a whole number', reason)
+
+
+    def test_import_questions_unknown_file_format_raises_QuizDBError(self):
+        path = self.write_file('questions.txt', '')
+
+        with self.assertRaises(QuizDBError):
+            report = quizimporter.import_questions(path)
+
+
+    def test_imported_questions_can_be_searched(self):
+        quizdatabase.db.pragma('user_version', 0)
+        quizdatabase.create_table()
+        csv_text = ('question,answercorrect,answerincorrecta,answerincorrectb,answerincorrectc,difficulty,points,category\n'
+                    'Which planet is largest?,Jupiter,Mars,Venus,Earth,1,1,Space\n')
+        path = self.write_file('questions.csv', csv_text)
+
+        quizimporter.import_questions(path)
+
+        self.assertEqual(['Which planet is largest?'], [question.question for question in quizdatabase.search_questions('jupiter')])
+
+
+    def test_import_questions_rejects_duplicates(self):
+        csv_text = ('question,answercorrect,answerincorrecta,answerincorrectb,answerincorrectc,difficulty,points,category\n'
+                    'What is the capital of France?,Paris,Lyon,Nice,Lille,1,1,Geography\n'
+                    'what is the CAPITAL of France,Paris,Rome,Nice,Lille,1,1,Geography\n'
+                    'Which city is the capital of France?,Paris,Lyon,Nice,Lille,1,1,Geography\n'
+                    'What is the capital of Spain?,Madrid,Lyon,Nice,Lille,1,1,Geography\n')
+        path = self.write_file('questions.csv', csv_text)
+        rejected_path = os.path.join(self.temp_dir.name, 'rejected.jsonl')
+
+        report = quizimporter.import_questions(path, rejected_path=rejected_path, chunk_size=2)
+        second_report = quizimporter.import_questions(path, rejected_path=rejected_path)
+
+        with open(rejected_path, encoding='utf-8') as rejected_file:
+            rejected_reasons = [json.loads(line)['reason'] for line in rejected_file]
+
+        self.assertEqual(2, report.imported_count)
+        self.assertEqual(2, report.rejected_count)
+        self.assertEqual(0, second_report.imported_count)
+        self.assertEqual(4, second_report.rejected_count)
+        self.assertEqual(['duplicate of question 1 (100% similar)', 'duplicate of question 1 (100% similar)', 'duplicate of question 1 (75% similar)',
+                          'duplicate of question 2 (100% similar)'], rejected_reasons)
+
+
+    def test_import_questions_allow_duplicates(self):
+        csv_text = ('question,answercorrect,answerincorrecta,answerincorrectb,answerincorrectc,difficulty,points,category\n'
+                    'Test Question One,Yes,No,No,No,1,1,Category One\n'
+                    'Test Question One,Yes,No,No,No,1,1,Category One\n')
+        path = self.write_file('questions.csv', csv_text)
+
+        report = quizimporter.import_questions(path, allow_duplicates=True)
+
+        self.assertEqual(2, report.imported_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
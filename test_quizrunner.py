@@ -97,5 +97,69 @@ class TestQuiz(TestCase):
 
 
 
+    def test_is_answer_correct_when_correct(self):
+        correct_answer = 'Correct Answer'
+        user_answer = 'Correct Answer'
+
+        returned = quizrunner.is_answer_correct(correct_answer, user_answer)
+
+        self.assertTrue(returned)
+
+
+    def test_is_answer_correct_when_not_correct(self):
+        correct_answer = 'Correct Answer'
+        user_answer = 'Incorrect B'
+
+        returned = quizrunner.is_answer_correct(correct_answer, user_answer)
+
+        self.assertFalse(returned)
+
+
+    def test_format_grade_message_when_not_correct_includes_correct_answer(self):
+        correct_answer = 'Correct Answer'
+        user_answer = 'Incorrect B'
+
+        message = quizrunner.format_grade_message(correct_answer, user_answer, False)
+
+        self.assertIn('The correct answer is Correct Answer.', message)
+
+
+    def test_parse_difficulty_profile(self):
+        expected = [(2, (1, 2)), (5, (3,)), (3, (4, 5))]
+
+        difficulty_profile = quizrunner.parse_difficulty_profile('2 easy, 5 Medium, 3 hard')
+
+        self.assertEqual(expected, difficulty_profile)
+
+
+    def test_parse_difficulty_profile_with_difficulty_numbers(self):
+        expected = [(4, (3,)), (1, (5,))]
+
+        difficulty_profile = quizrunner.parse_difficulty_profile('4 3, 1 5')
+
+        self.assertEqual(expected, difficulty_profile)
+
+
+    def test_parse_difficulty_profile_invalid_raises_ValueError(self):
+        for profile_string in ['', 'easy 2', '2 tricky', '0 easy', '2 easy, 1 1', '1 6']:
+            with self.assertRaises(ValueError):
+                quizrunner.parse_difficulty_profile(profile_string)
+
+
+    def test_next_adaptive_difficulty_stays_between_one_and_five(self):
+        self.assertEqual(4, quizrunner.next_adaptive_difficulty(3, True))
+        self.assertEqual(5, quizrunner.next_adaptive_difficulty(5, True))
+        self.assertEqual(2, quizrunner.next_adaptive_difficulty(3, False))
+        self.assertEqual(1, quizrunner.next_adaptive_difficulty(1, False))
+
+
+
+    def test_calculate_response_time_rounds_to_whole_milliseconds(self):
+        expected = 1235
+
+        response_time = quizrunner.calculate_response_time(5_000_000_000, 6_234_600_000)
+
+        self.assertEqual(expected, response_time)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
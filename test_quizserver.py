@@ -0,0 +1,118 @@
+import asyncio
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+from peewee import *
+
+import db_config
+test_db_path = 'test_quiz.db'
+db_config.database_path = test_db_path 
+
+import quizdatabase
+import quizserver
+from quizdatabase import Question
+from quizdatabase import Result
+from quizdatabase import SessionSummary
+
+
+class TestQuizServer(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        '''Clear and remake the tables for the test database, add some questions, and start a server on a free port.'''
+        self.db = SqliteDatabase(test_db_path)
+        self.db.drop_tables(quizdatabase.MODELS)
+        self.db.create_tables(quizdatabase.MODELS)
+        quizdatabase.notify_questions_changed()
+
+        for number in range(5):
+            Question(question=f'Test Question {number}', answercorrect='Yes', answerincorrecta='No', answerincorrectb='Maybe', answerincorrectc='Never', difficulty=1, points=2, category='Category One').save()
+
+        self.quiz_server = quizserver.QuizServer(max_sessions=100, db_workers=2)
+        self.server = await self.quiz_server.start('127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.quiz_server.close()
+
+
+    async def wait_for_sessions_to_end(self):
+        while self.quiz_server.active_sessions:
+            await asyncio.sleep(0.01)
+
+
+    async def test_many_simulated_quiz_takers_at_once(self):
+        answer_times = []
+        clients = [quizserver.run_simulated_client('127.0.0.1', self.port, 3, answer_times) for _ in range(20)]
+
+        finished = await asyncio.gather(*clients)
+        await self.wait_for_sessions_to_end()
+
+        question_counts = [summary.questioncount for summary in SessionSummary.select()]
+
+        self.assertEqual([True] * 20, finished)
+        self.assertEqual([3] * 20, question_counts)
+        self.assertEqual(60, len(answer_times))
+
+
+    async def test_answers_are_saved_when_quiz_taker_leaves_early(self):
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+        prompts_answered = 0
+        while prompts_answered < 3:
+            line = (await reader.readline()).decode()
+            if line.startswith(quizserver.PROMPT_MARKER):
+                # category 1, 2 questions, then answer the first question
+                answer = ['1', '2', '1'][prompts_answered]
+                writer.write(f'{answer}\n'.encode())
+                await writer.drain()
+                prompts_answered += 1
+        await reader.readline()
+        writer.close()
+
+        await asyncio.sleep(0.1)
+        await self.wait_for_sessions_to_end()
+
+        self.assertEqual(1, Result.select().count())
+        self.assertEqual(0, self.quiz_server.completed_sessions)
+
+
+
+    async def test_waiting_answers_are_flushed_from_the_loop(self):
+        flush_seconds = db_config.result_flush_seconds
+        db_config.result_flush_seconds = 0.1
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+            prompts_answered = 0
+            while prompts_answered < 3:
+                line = (await reader.readline()).decode()
+                if line.startswith(quizserver.PROMPT_MARKER):
+                    # category 1, 2 questions, then answer the first question and stop at the second
+                    writer.write(f'{["1", "2", "1"][prompts_answered]}\n'.encode())
+                    await writer.drain()
+                    prompts_answered += 1
+
+            await asyncio.sleep(0.5)
+
+            self.assertEqual(1, Result.select().count())
+            self.assertEqual(set(), quizdatabase.result_flusher.writers)
+            writer.close()
+            await self.wait_for_sessions_to_end()
+        finally:
+            db_config.result_flush_seconds = flush_seconds
+
+
+    async def test_database_error_is_sent_to_the_client(self):
+        Question.delete().execute()
+
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+        text = (await reader.read()).decode()
+        writer.close()
+        await self.wait_for_sessions_to_end()
+
+        self.assertIn('Error: There are no categories in the database.', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+from unittest import TestCase
+from unittest.mock import patch
+
+import quizcategoryindex
+import ui
+
+
+class TestUI(TestCase):
+
+    def test_format_list_numbers_duplicate_items_by_position(self):
+        expected = '1. True\n2. False\n3. True\n'
+
+        list_string = ui.format_list(['True', 'False', 'True'])
+
+        self.assertEqual(expected, list_string)
+
+
+    @patch('builtins.print')
+    def test_pick_category_searches_number_that_starts_a_category(self, mock_print):
+        category_index = quizcategoryindex.CategoryIndex(['2024 Events', 'Art', 'History'])
+
+        # 2024 is a search because a category starts with it, 2 is not so it picks from that page
+        with patch('builtins.input', side_effect=['2024', '2', '1']):
+            category = ui.pick_category(category_index, page_size=2)
+
+        self.assertEqual('2024 Events', category)
+
+
+    @patch('builtins.print')
+    def test_pick_category_repeated_number_search_picks(self, mock_print):
+        category_index = quizcategoryindex.CategoryIndex(['1 Direction', '1st Ladies', 'Art'])
+
+        # the first 1 searches, the second is already the search so it picks
+        with patch('builtins.input', side_effect=['1', '1']):
+            category = ui.pick_category(category_index, page_size=2)
+
+        self.assertEqual('1 Direction', category)
+
+
+    @patch('builtins.print')
+    def test_pick_category_by_search_and_page(self, mock_print):
+        category_index = quizcategoryindex.CategoryIndex(['Art', 'History', 'Science', 'Spanish', 'Sports'])
+
+        # search for s, go to the second page of two, then pick the first category on it
+        with patch('builtins.input', side_effect=['s', '>', '1']):
+            category = ui.pick_category(category_index, page_size=2)
+
+        self.assertEqual('Sports', category)
+
+
+    @patch('builtins.print')
+    def test_pick_category_ignores_search_with_no_matches(self, mock_print):
+        category_index = quizcategoryindex.CategoryIndex(['Art', 'History'])
+
+        with patch('builtins.input', side_effect=['Zoology', '9', '2']):
+            category = ui.pick_category(category_index, page_size=2)
+
+        self.assertEqual('History', category)
+
+
+if __name__ == '__main__':
+    unittest.main()
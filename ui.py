@@ -1,4 +1,5 @@
 
+import quizrunner
 import validation
 
 
@@ -14,20 +15,19 @@ def instructions():
 
 
 def format_list(unformatted_list):
-    """Take a list and display it as a numbered list using item index + 1."""
+    """Take a list and display it as a numbered list, numbered by position from 1."""
     list_string = ''
-    for item in unformatted_list:
-        index = unformatted_list.index(item)
-        index += 1
-        list_string += f'{index}. {item}\n'
+    for number, item in enumerate(unformatted_list, 1):
+        list_string += f'{number}. {item}\n'
 
     return(list_string)
 
 
 def select_category(category_list, category_string):
-    """Take the list of categories, and allow the user to select a category. Return that category."""
+    """Take the list of categories, and allow the user to select a category. Return that category.
+    The list is printed once, not again after every invalid choice."""
+    print(category_string)
     while True:
-        print(category_string)
         index = input('Type the number of the category you want to be quizzed on: ')
         if validation.is_number(index) == False:
             print('\nPlease enter a numeric value.\n')
@@ -38,20 +38,121 @@ def select_category(category_list, category_string):
             return category
 
 
-def select_number_of_questions(category, category_questions):
+def format_category_page(category_index, prefix, page_number, page_size):
+    """Returns one page of the category picker: where the page is, then its categories numbered from 1."""
+    match_count = category_index.count_prefix(prefix)
+    page_count = category_index.page_count(prefix, page_size)
+    search_string = f' starting with "{prefix}"' if prefix else ''
+    page = category_index.get_page(prefix, page_number, page_size)
+
+    page_string = f'\n{match_count} categories{search_string}, page {page_number + 1} of {page_count}:\n'
+    return page_string + format_list(page)
+
+
+def pick_category(category_index, page_size=20):
+    """Let the user page through a CategoryIndex, or narrow it down by typing the start of a category name,
+    then choose a category by its number on the page. Return that category.
+    A number is a search instead of a pick when some category names start with it (like "2024 Events"),
+    unless it is already the search; then it picks from the page that search shows.
+    Only the current page is ever printed, and only when the page or the search changes."""
+    picker_prompt = 'Type a number to choose, the start of a name to search, > or < to change page, or nothing to clear the search: '
+    prefix = ''
+    page_number = 0
+    page = category_index.get_page(prefix, page_number, page_size)
+    print(format_category_page(category_index, prefix, page_number, page_size))
+
+    while True:
+        user_input = input(picker_prompt).strip()
+        is_pick = validation.is_number(user_input) and (user_input == prefix or category_index.count_prefix(user_input) == 0)
+
+        if is_pick and validation.is_within_count(user_input, len(page)):
+            return page[int(user_input) - 1]
+        elif is_pick:
+            print('\nPlease select a category on this page, by number.\n')
+            continue
+        elif user_input in ['>', '<']:
+            new_page_number = page_number + 1 if user_input == '>' else page_number - 1
+            if not (0 <= new_page_number < category_index.page_count(prefix, page_size)):
+                print('\nThere are no more pages that way.\n')
+                continue
+            page_number = new_page_number
+        elif user_input != prefix:
+            if category_index.count_prefix(user_input) == 0:
+                print(f'\nNo categories start with "{user_input}".\n')
+                continue
+            prefix = user_input
+            page_number = 0
+        else:
+            continue
+
+        page = category_index.get_page(prefix, page_number, page_size)
+        print(format_category_page(category_index, prefix, page_number, page_size))
+
+
+def select_number_of_questions(category, question_count):
     """Return the number of questions desired by the user, making sure the number is within the correct range based on their selected category."""
     while True:
-        print(f'{len(category_questions)} questions available in {category}.')
+        print(f'{question_count} questions available in {category}.')
         number_of_questions_string = input(f'Type in the number of questions you want to be quizzed on: ')
         if validation.is_number(number_of_questions_string) == False:
             print('\nPlease enter a numeric value.\n')
-        elif validation.is_in_range(number_of_questions_string, category_questions) == False:
+        elif validation.is_within_count(number_of_questions_string, question_count) == False:
             print(f'\nPlease enter a number within the range provided for {category}.\n')
         else:
             number_of_questions = int(number_of_questions_string)
             return number_of_questions
 
 
+def select_quiz_mode():
+    """Returns how the user wants their quiz built: 'random', 'profile' or 'adaptive'."""
+    quiz_modes = ['random', 'profile', 'adaptive']
+    quiz_mode_text = """
+    1. Random questions
+    2. Choose how many easy, medium and hard questions
+    3. Adaptive - questions get harder after a correct answer and easier after an incorrect one
+    """
+    while True:
+        print(quiz_mode_text)
+        index = input('Type the number of the kind of quiz you want: ')
+        if validation.is_number(index) == False:
+            print('\nPlease enter a numeric value.\n')
+        elif validation.is_in_range(index, quiz_modes) == False:
+            print('\nPlease select a kind of quiz in the list, by number.\n')
+        else:
+            return quiz_modes[int(index) - 1]
+
+
+def format_difficulty_counts(difficulty_counts):
+    """Returns a line for each difficulty with the number of questions that have it."""
+    counts_string = ''
+    for difficulty, question_count in difficulty_counts.items():
+        counts_string += f'Difficulty {difficulty}: {question_count} questions\n'
+    return counts_string
+
+
+def select_difficulty_profile(category, difficulty_counts):
+    """Return the difficulty profile typed by the user, like '2 easy, 5 medium, 3 hard', as a list of (number of questions, difficulties).
+    Makes sure the category has enough questions for each part of the profile."""
+    while True:
+        print(f'Questions available in {category}:\n{format_difficulty_counts(difficulty_counts)}')
+        profile_string = input('Type how many questions you want at each difficulty, like "2 easy, 5 medium, 3 hard" or "4 3, 1 5": ')
+        try:
+            difficulty_profile = quizrunner.parse_difficulty_profile(profile_string)
+        except ValueError as e:
+            print(f'\n{e}\n')
+            continue
+
+        if validation.is_difficulty_profile_available(difficulty_profile, difficulty_counts) == False:
+            print(f'\nPlease ask for no more questions than {category} has at each difficulty.\n')
+        else:
+            return difficulty_profile
+
+
+def format_difficulty(difficulty):
+    """Returns the difficulty of a question, for adaptive quizzes."""
+    return f'Difficulty: {difficulty} of {quizrunner.MAX_DIFFICULTY}\n'
+
+
 def format_quiz_question(question):
     """Returns a formatted question for the user."""
     question_string = f'Question: {question.question}\n'
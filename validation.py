@@ -8,9 +8,20 @@ def is_number(user_input):
 
 
 def is_in_range(user_input, list):
+    return is_within_count(user_input, len(list))
+
+
+def is_within_count(user_input, count):
     index = int(user_input) - 1
-    upper_range = len(list)
-    if (0 <= index < upper_range):
+    if (0 <= index < count):
         return True
     else: 
-        return False
\ No newline at end of file
+        return False
+
+
+def is_difficulty_profile_available(difficulty_profile, difficulty_counts):
+    for number_of_questions, difficulties in difficulty_profile:
+        available = sum(difficulty_counts.get(difficulty, 0) for difficulty in difficulties)
+        if number_of_questions > available:
+            return False
+    return True
\ No newline at end of file